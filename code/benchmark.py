@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the stages of the TSV and VCF scans on synthetic inputs (timings and peak memory as JSON)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import contextlib
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# Benchmark settings
+BENCHMARK_VERSION = 1
+DATA_DIR = '../benchmark_data'
+RESULTS_FILE_NAME = 'benchmark_results.json'
+CONFIG_FILE_NAME = '../config/config_spondyloarthritis.json'
+MARKER_COUNTS = [600000, 1000000] # 23andMe files
+VCF_RECORD_COUNTS = [10000, 100000] # single-sample VCF files (plain and bgzip-compressed)
+COHORT_RECORD_COUNTS = [10000] # multi-sample VCF files (bgzip-compressed)
+COHORT_SAMPLE_COUNT = 100
+REPEATS = 3
+CASE_KINDS = ['tsv', 'vcf', 'cohort']
+
+# Run function as stage and record its duration in seconds
+def time_stage(stages, stage, function, *args):
+
+    start_time = time.perf_counter()
+    result = function(*args)
+    stages[stage] = time.perf_counter() - start_time
+    return result
+
+# Get peak resident set size of this process in MB (None if not available)
+def get_peak_rss():
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / 1024 ** 2 if sys.platform == 'darwin' else peak_rss / 1024 # bytes on macOS, KB on Linux
+
+# Run TSV scan stages (as genome-scanner_tsv.py for one condition)
+def run_tsv_case(config_data, snp_file_name, output_dir, stages):
+
+    # numpy and pandas are loaded lazily (on first use), here timed as part of the imports
+    def import_modules():
+        from condition import pd
+        pd.DataFrame
+    time_stage(stages, 'import', import_modules)
+
+    from scanner import import_and_instantiate
+    condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"], snp_file_name, config_data["snp_database"])
+    time_stage(stages, 'get_snp_db', condition.get_snp_db)
+    time_stage(stages, 'get_tsv_content', condition.get_tsv_content)
+    time_stage(stages, 'get_snp_results', condition.get_snp_results)
+    time_stage(stages, 'summarize_results', condition.summarize_results)
+    time_stage(stages, 'save_results', condition.save_results, os.path.join(output_dir, 'results.csv'), os.path.join(output_dir, 'results.json'))
+
+# Run VCF scan stages (as genome-scanner_vcf.py for one condition, single sample or cohort)
+def run_vcf_case(config_data, vcf_file_name, output_dir, stages, cohort):
+
+    vcf = time_stage(stages, 'import', importlib.import_module, 'genome-scanner_vcf')
+    snpdb = time_stage(stages, 'get_snpdb', vcf.get_snpdb, config_data["snp_database"])
+    vcf_file = time_stage(stages, 'get_vcf_file', vcf.get_vcf_file, vcf_file_name)
+    loci = vcf.pd.read_csv(vcf_file_name + '.loci.csv', dtype={vcf.C_CHROMOSOME: str})
+    snp_loci = time_stage(stages, 'get_snp_loci', vcf.get_snp_loci, snpdb, loci)
+
+    from scanner import import_and_instantiate
+    condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
+                                       vcf_file_name, config_data["snp_database"])
+    condition.snp_db = snpdb
+
+    if cohort:
+        genotypes = time_stage(stages, 'get_cohort_genotypes', vcf.get_cohort_genotypes, snpdb, vcf_file, snp_loci)
+        risks, sample_results = time_stage(stages, 'get_cohort_results', vcf.get_cohort_results, condition, genotypes)
+        summary = time_stage(stages, 'get_cohort_summary', vcf.get_cohort_summary, condition, sample_results)
+        def save_results():
+            genotypes.to_csv(os.path.join(output_dir, 'cohort_genotypes.csv'), sep='\t')
+            risks.to_csv(os.path.join(output_dir, 'cohort_risks.csv'), sep='\t')
+            summary.to_csv(os.path.join(output_dir, 'cohort_summary.csv'), index=False, sep='\t')
+    else:
+        time_stage(stages, 'get_snp_results', vcf.get_snp_results, condition, vcf_file, snp_loci)
+        time_stage(stages, 'summarize_results', condition.summarize_results)
+        def save_results():
+            condition.save_results(os.path.join(output_dir, 'results.csv'), os.path.join(output_dir, 'results.json'))
+    time_stage(stages, 'save_results', save_results)
+
+# Run benchmark case once in this process (stage durations, total duration and peak RSS)
+def run_case(kind, config_file_name, input_file_name):
+
+    with open(config_file_name, 'r') as config_file:
+        config_data = json.load(config_file)
+    stages = {}
+    start_time = time.perf_counter()
+
+    # Progress output of scans is not shown
+    with tempfile.TemporaryDirectory() as output_dir, contextlib.redirect_stdout(open(os.devnull, 'w')):
+        if kind == 'tsv':
+            run_tsv_case(config_data, input_file_name, output_dir, stages)
+        else:
+            run_vcf_case(config_data, input_file_name, output_dir, stages, kind == 'cohort')
+
+    return {"stages": stages, "total": time.perf_counter() - start_time, "peak_rss_mb": get_peak_rss()}
+
+# Get input files of benchmark cases (generated once per size and seed) as (name, kind, input description)
+def get_cases(args):
+
+    from synthetic_data import write_23andme_zip, write_vcf
+    os.makedirs(args.data_dir, exist_ok=True)
+    cases = []
+    if 'tsv' in args.cases:
+        for marker_count in args.markers:
+            file_name = os.path.join(args.data_dir, f"23andme_{marker_count}_{args.seed}.zip")
+            if not os.path.exists(file_name):
+                write_23andme_zip(file_name, marker_count, args.seed)
+            cases.append((f"tsv_{marker_count}", 'tsv', {"file": file_name, "markers": marker_count, "samples": 1}))
+    if 'vcf' in args.cases:
+        for record_count in args.vcf_records:
+            for suffix in ['.vcf', '_bgzip.vcf.gz']:
+                file_name = os.path.join(args.data_dir, f"vcf_{record_count}x1_{args.seed}{suffix}")
+                if not os.path.exists(file_name + '.loci.csv'):
+                    write_vcf(file_name, record_count, 1, args.seed)
+                cases.append((f"vcf{'_bgzip' if suffix.endswith('.gz') else ''}_{record_count}", 'vcf',
+                              {"file": file_name, "markers": record_count, "samples": 1}))
+    if 'cohort' in args.cases:
+        for record_count in args.cohort_records:
+            file_name = os.path.join(args.data_dir, f"vcf_{record_count}x{args.cohort_samples}_{args.seed}.vcf.gz")
+            if not os.path.exists(file_name + '.loci.csv'):
+                write_vcf(file_name, record_count, args.cohort_samples, args.seed)
+            cases.append((f"cohort_{record_count}x{args.cohort_samples}", 'cohort',
+                          {"file": file_name, "markers": record_count, "samples": args.cohort_samples}))
+    for _, _, case_input in cases:
+        case_input["size_bytes"] = os.path.getsize(case_input["file"])
+    return cases
+
+# Get commit of the repository (None outside of a git repository)
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Get median of runs (stage durations, total duration and peak RSS)
+def get_median(runs):
+    return {
+        "stages": {stage: statistics.median(run["stages"][stage] for run in runs) for stage in runs[0]["stages"]},
+        "total": statistics.median(run["total"] for run in runs),
+        "peak_rss_mb": max(run["peak_rss_mb"] for run in runs) if runs[0]["peak_rss_mb"] is not None else None
+    }
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', default=CONFIG_FILE_NAME, help="config file of the condition to scan for")
+    parser.add_argument('--cases', nargs='+', choices=CASE_KINDS, default=CASE_KINDS, help="kinds of benchmark cases")
+    parser.add_argument('--markers', type=int, nargs='+', default=MARKER_COUNTS, help="numbers of markers of 23andMe files")
+    parser.add_argument('--vcf-records', type=int, nargs='+', default=VCF_RECORD_COUNTS, help="numbers of records of single-sample VCF files")
+    parser.add_argument('--cohort-records', type=int, nargs='+', default=COHORT_RECORD_COUNTS, help="numbers of records of multi-sample VCF files")
+    parser.add_argument('--cohort-samples', type=int, default=COHORT_SAMPLE_COUNT, help="number of samples of multi-sample VCF files")
+    parser.add_argument('--repeats', type=int, default=REPEATS, help="runs per case (each in a new process)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed of synthetic inputs")
+    parser.add_argument('--data-dir', default=DATA_DIR, help="directory of synthetic inputs (generated once)")
+    parser.add_argument('--output', default=RESULTS_FILE_NAME, help="JSON file of benchmark results")
+    args = parser.parse_args()
+
+    cases = get_cases(args)
+    benchmark = {
+        "benchmark_version": BENCHMARK_VERSION,
+        "commit": get_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": args.config,
+        "seed": args.seed,
+        "repeats": args.repeats,
+        "cases": []
+    }
+
+    # Each run in a new process (cold imports, peak RSS of the run only)
+    for name, kind, case_input in cases:
+        runs = []
+        for _ in range(args.repeats):
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+                runs.append(executor.submit(run_case, kind, args.config, case_input["file"]).result())
+        median = get_median(runs)
+        benchmark["cases"].append({"name": name, "kind": kind, "input": case_input, "runs": runs, "median": median})
+        peak_rss = f"{median['peak_rss_mb']:.0f} MB" if median["peak_rss_mb"] is not None else 'unknown'
+        print(f"{name}: {median['total']:.3f} s, peak RSS {peak_rss}, "
+              + ', '.join(f"{stage} {duration:.3f} s" for stage, duration in median["stages"].items()))
+
+    with open(args.output, 'w') as output_file:
+        json.dump(benchmark, output_file, indent=2)
+    print(f"\nBenchmark results saved to {args.output}")
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Streaming cohort aggregates of genotype counts, risk allele frequencies and summary score distributions
+(mergeable partial counts of workers and shards)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import json
+import math
+import os
+import tempfile
+from condition import np, pd, C_CONDITION, C_SNP, C_GENOTYPE, C_RISK_ALLELE, C_SAMPLE
+
+# Name constants
+C_COUNT = 'Count'
+C_FREQUENCY = 'Frequency'
+C_ALLELE_COUNT = 'Allele count'
+C_CALLED_ALLELES = 'Called alleles'
+C_SUMMARY_KEY = 'Summary key'
+C_VALUE = 'Value'
+C_SCANS = 'Scans'
+C_MEAN = 'Mean'
+C_STD = 'Std'
+C_MIN = 'Min'
+C_MAX = 'Max'
+V_NO_CALL = '--'
+
+# Aggregate settings
+AGGREGATE_VERSION = 1
+FOLD_ROWS = 1000000 # pending count rows folded into the counts at once
+GENOTYPE_KEYS = [C_CONDITION, C_SNP, C_GENOTYPE]
+ALLELE_KEYS = [C_CONDITION, C_SNP, C_RISK_ALLELE]
+GENOTYPE_COUNTS_FILE_NAME = 'cohort_genotype_counts.csv'
+ALLELE_FREQUENCIES_FILE_NAME = 'cohort_allele_frequencies.csv'
+SUMMARY_COUNTS_FILE_NAME = 'cohort_summary_counts.csv'
+SUMMARY_STATS_FILE_NAME = 'cohort_summary_stats.csv'
+
+# Get moments (count, mean, sum of squared deviations, min, max) of values
+def get_moments(values):
+    return [len(values), float(np.mean(values)), float(np.sum((values - np.mean(values)) ** 2)), float(np.min(values)), float(np.max(values))]
+
+# Merge moments of two sets of values (parallel variance algorithm, associative)
+def merge_moments(moments, other_moments):
+
+    count, mean, m2, minimum, maximum = moments
+    other_count, other_mean, other_m2, other_minimum, other_maximum = other_moments
+    merged_count = count + other_count
+    delta = other_mean - mean
+    return [merged_count, mean + delta * other_count / merged_count, m2 + other_m2 + delta ** 2 * count * other_count / merged_count,
+            min(minimum, other_minimum), max(maximum, other_maximum)]
+
+# Sum count columns of tables per key (pending rows of added scans folded into counts)
+# Keys are codes of key values (less than key sizes) grouped as one integer without hashing the values again
+def fold_counts(tables, key_columns, key_sizes):
+
+    table = pd.concat(tables, ignore_index=True)
+    keys = np.ravel_multi_index(tuple(table[column].values for column in key_columns), key_sizes)
+    counts = table.drop(columns=key_columns).groupby(keys, sort=False).sum()
+    return pd.DataFrame({**dict(zip(key_columns, np.unravel_index(counts.index.values, key_sizes))), **{column: counts[column].values for column in counts.columns}})
+
+# Get empty count table (key codes and counts)
+def get_empty_counts(columns):
+    return pd.DataFrame({column: pd.Series(dtype=np.int64) for column in columns})
+
+# Check allele column of condition (column of its results, checked once before scanning)
+def check_allele_column(condition_name, result_columns, allele_column):
+    if allele_column not in result_columns:
+        raise ValueError(f"Allele column {allele_column} of {condition_name} is not a column of its results {result_columns}")
+
+# Counts of a cohort of scans per condition (memory bound by the number of SNPs and summary values, not by the number of scans)
+# Aggregates of workers or shards are merged by adding their counts (in any order)
+class CohortAggregate:
+    def __init__(self):
+        self.scans = {} # condition -> number of scans
+        self.genotype_counts = get_empty_counts(GENOTYPE_KEYS + [C_COUNT]) # counts of key codes (position in values of key column)
+        self.allele_counts = get_empty_counts(ALLELE_KEYS + [C_ALLELE_COUNT, C_CALLED_ALLELES])
+        self.summary_counts = {} # (condition, summary key, value) -> count of non-numeric summary values
+        self.summary_moments = {} # (condition, summary key) -> moments of numeric summary values
+        self.pending = [] # count tables of added scans (genotype counts, allele counts)
+        self.pending_rows = 0
+        self.key_values = {column: pd.Index([], dtype=object) for column in GENOTYPE_KEYS + ALLELE_KEYS} # key column -> values (only appended to)
+
+    # Add scans of condition: summary scores (one row per scan) and results (rows of all scans, sample column if several scans)
+    # Allele frequencies are counted for the allele column of the condition (ALLELE_COLUMN, e.g. Effect allele of polygenic scores)
+    # SNPs of several database rows are counted once per scan (per risk allele for allele frequencies)
+    def add(self, condition_name, summaries, results, allele_column=C_RISK_ALLELE):
+
+        # Results without alleles in the allele column (e.g. of another condition) are rejected instead of counting no allele frequencies
+        # (batch scans report the SNP file as failed)
+        if (allele_column not in results.columns) or (len(results.index) and results[allele_column].isna().all()):
+            raise ValueError(f"Results of {condition_name} have no alleles in column {allele_column} (allele frequencies not counted)")
+
+        self.scans[condition_name] = self.scans.get(condition_name, 0) + len(summaries.index)
+
+        # Summary values (numeric values as moments, other values counted per value)
+        for summary_key in summaries.columns.drop(C_SAMPLE, errors='ignore'):
+            values = summaries[summary_key]
+            if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+                values = values.dropna().to_numpy(dtype=float)
+                if len(values):
+                    moments = get_moments(values)
+                    key = (condition_name, summary_key)
+                    self.summary_moments[key] = merge_moments(self.summary_moments[key], moments) if key in self.summary_moments else moments
+            else:
+                for value, count in values.astype(str).value_counts(sort=False).items():
+                    key = (condition_name, summary_key, value)
+                    self.summary_counts[key] = self.summary_counts.get(key, 0) + int(count)
+
+        # Codes of SNPs, genotypes and samples of results with genotype (values of large results hashed once)
+        results = results[[column for column in [C_SAMPLE, C_SNP, C_GENOTYPE, allele_column] if column in results.columns]]
+        results = results.loc[results[C_GENOTYPE].notna()]
+        snp_codes = self.encode(C_SNP, results[C_SNP])
+        genotype_codes, genotype_values = pd.factorize(results[C_GENOTYPE])
+        genotype_values = [str(genotype) for genotype in genotype_values]
+        sample_codes = pd.factorize(results[C_SAMPLE])[0] if C_SAMPLE in results.columns else np.zeros(len(snp_codes), dtype=np.int64)
+        condition_code = self.encode(C_CONDITION, [condition_name])[0]
+
+        # Genotype counts per SNP (SNPs of several database rows counted once per scan, rows summed when folded)
+        rows = ~pd.Series(sample_codes * len(self.key_values[C_SNP]) + snp_codes).duplicated().values
+        genotype_counts = pd.DataFrame({C_CONDITION: condition_code, C_SNP: snp_codes[rows],
+                                        C_GENOTYPE: self.encode(C_GENOTYPE, genotype_values)[genotype_codes[rows]], C_COUNT: 1})
+
+        # Risk allele counts per SNP and risk allele (alleles of called genotypes)
+        # Alleles are counted once per distinct genotype and allele (codes of both index the count table)
+        # Only single-base alleles are counted per base (rules of two-letter genotypes, e.g. TT, are in the genotype counts only)
+        allele_codes, allele_values = pd.factorize(results[allele_column])
+        allele_values = [str(allele) for allele in allele_values]
+        single_bases = np.array([len(allele) == 1 for allele in allele_values] + [False], dtype=bool) # code -1 of missing alleles is not counted
+        rows = single_bases[allele_codes] & ~pd.DataFrame({C_SAMPLE: sample_codes, C_SNP: snp_codes, C_RISK_ALLELE: allele_codes}).duplicated().values
+        allele_count_table = np.array([[genotype.count(allele) for allele in allele_values] for genotype in genotype_values], dtype=np.int64)
+        called_allele_table = np.array([0 if genotype == V_NO_CALL else len(genotype) for genotype in genotype_values], dtype=np.int64)
+        allele_counts = pd.DataFrame({C_CONDITION: condition_code, C_SNP: snp_codes[rows], C_RISK_ALLELE: self.encode(C_RISK_ALLELE, allele_values)[allele_codes[rows]],
+                                      C_ALLELE_COUNT: allele_count_table.reshape(len(genotype_values), len(allele_values))[genotype_codes[rows], allele_codes[rows]],
+                                      C_CALLED_ALLELES: called_allele_table[genotype_codes[rows]]})
+
+        self.add_counts(genotype_counts, allele_counts)
+
+    # Encode values of key column as codes (position in values of key column, new values are appended)
+    def encode(self, column, values):
+
+        values = np.asarray(values, dtype=object)
+        key_values = self.key_values[column]
+        codes = key_values.get_indexer(values)
+        missing = codes < 0
+        if missing.any():
+            key_values = key_values.append(pd.Index(pd.unique(values[missing]), dtype=object))
+            codes[missing] = key_values.get_indexer(values[missing])
+        self.key_values[column] = key_values
+        return codes.astype(np.int64)
+
+    # Get number of values per key column (bounds of codes)
+    def get_key_sizes(self, key_columns):
+        return tuple(max(1, len(self.key_values[column])) for column in key_columns)
+
+    # Get count table with key values encoded as codes
+    def encode_counts(self, table, key_columns):
+        return table.assign(**{column: self.encode(column, table[column]) for column in key_columns})
+
+    # Get count table with codes decoded into key values
+    def decode_counts(self, table, key_columns):
+        return table.assign(**{column: self.key_values[column].values[table[column].values] for column in key_columns})
+
+    # Add count tables of key codes (folded into the counts once as many rows are pending as counted, at least FOLD_ROWS)
+    # Each folded row is folded again a bounded number of times on average while memory stays bound by the counts
+    def add_counts(self, genotype_counts, allele_counts):
+
+        self.pending.append((genotype_counts, allele_counts))
+        self.pending_rows += len(genotype_counts.index) + len(allele_counts.index)
+        if self.pending_rows >= max(FOLD_ROWS, len(self.genotype_counts.index) + len(self.allele_counts.index)):
+            self.fold()
+
+    # Fold pending count tables into the counts
+    def fold(self):
+
+        if len(self.pending):
+            self.genotype_counts = fold_counts([self.genotype_counts] + [genotype_counts for genotype_counts, _ in self.pending], GENOTYPE_KEYS, self.get_key_sizes(GENOTYPE_KEYS))
+            self.allele_counts = fold_counts([self.allele_counts] + [allele_counts for _, allele_counts in self.pending], ALLELE_KEYS, self.get_key_sizes(ALLELE_KEYS))
+        self.pending = []
+        self.pending_rows = 0
+
+    # Merge counts of another aggregate (e.g. of another worker or shard)
+    def merge(self, aggregate):
+
+        for condition_name, scan_count in aggregate.scans.items():
+            self.scans[condition_name] = self.scans.get(condition_name, 0) + scan_count
+        for key, count in aggregate.summary_counts.items():
+            self.summary_counts[key] = self.summary_counts.get(key, 0) + count
+        for key, moments in aggregate.summary_moments.items():
+            self.summary_moments[key] = merge_moments(self.summary_moments[key], moments) if key in self.summary_moments else list(moments)
+        aggregate.fold()
+        self.add_counts(self.encode_counts(aggregate.decode_counts(aggregate.genotype_counts, GENOTYPE_KEYS), GENOTYPE_KEYS),
+                        self.encode_counts(aggregate.decode_counts(aggregate.allele_counts, ALLELE_KEYS), ALLELE_KEYS))
+
+    # Get genotype counts and frequencies per SNP (share of scans in which the SNP was found)
+    def get_genotype_table(self):
+
+        self.fold()
+        table = self.decode_counts(self.genotype_counts, GENOTYPE_KEYS).sort_values(GENOTYPE_KEYS, ignore_index=True)
+        table[C_FREQUENCY] = table[C_COUNT] / table.groupby([C_CONDITION, C_SNP], sort=False)[C_COUNT].transform('sum')
+        return table
+
+    # Get risk allele frequencies per SNP and risk allele (risk alleles out of called alleles)
+    def get_allele_table(self):
+
+        self.fold()
+        table = self.decode_counts(self.allele_counts, ALLELE_KEYS).sort_values(ALLELE_KEYS, ignore_index=True)
+        table[C_FREQUENCY] = table[C_ALLELE_COUNT] / table[C_CALLED_ALLELES].where(table[C_CALLED_ALLELES] > 0)
+        return table
+
+    # Get distribution of non-numeric summary values (counts and shares of scans per value)
+    def get_summary_count_table(self):
+
+        rows = [(condition_name, summary_key, value, self.scans[condition_name], count, count / self.scans[condition_name])
+                for (condition_name, summary_key, value), count in sorted(self.summary_counts.items())]
+        return pd.DataFrame(rows, columns=[C_CONDITION, C_SUMMARY_KEY, C_VALUE, C_SCANS, C_COUNT, C_FREQUENCY])
+
+    # Get statistics of numeric summary values (count, mean, standard deviation, min and max)
+    def get_summary_stats_table(self):
+
+        rows = [(condition_name, summary_key, count, mean, math.sqrt(m2 / (count - 1)) if count > 1 else float('nan'), minimum, maximum)
+                for (condition_name, summary_key), (count, mean, m2, minimum, maximum) in sorted(self.summary_moments.items())]
+        return pd.DataFrame(rows, columns=[C_CONDITION, C_SUMMARY_KEY, C_COUNT, C_MEAN, C_STD, C_MIN, C_MAX])
+
+    # Save cohort tables (csv) into output directory
+    def save_tables(self, output_dir):
+
+        os.makedirs(output_dir, exist_ok=True)
+        for file_name, table in [(GENOTYPE_COUNTS_FILE_NAME, self.get_genotype_table()), (ALLELE_FREQUENCIES_FILE_NAME, self.get_allele_table()),
+                                 (SUMMARY_COUNTS_FILE_NAME, self.get_summary_count_table()), (SUMMARY_STATS_FILE_NAME, self.get_summary_stats_table())]:
+            table.to_csv(os.path.join(output_dir, file_name), index=False, sep='\t')
+
+    # Get aggregate as json object
+    def get_data(self):
+
+        self.fold()
+        return {
+            'version': AGGREGATE_VERSION,
+            'scans': self.scans,
+            'genotype_counts': self.decode_counts(self.genotype_counts, GENOTYPE_KEYS).values.tolist(),
+            'allele_counts': self.decode_counts(self.allele_counts, ALLELE_KEYS).values.tolist(),
+            'summary_counts': [[*key, count] for key, count in self.summary_counts.items()],
+            'summary_moments': [[*key, *moments] for key, moments in self.summary_moments.items()]
+        }
+
+    # Save aggregate as json file (written to temporary file and moved into place)
+    def save(self, file_name):
+
+        temp_file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), prefix='.tmp_')
+        with os.fdopen(temp_file_descriptor, 'w') as temp_file:
+            json.dump(self.get_data(), temp_file)
+        os.replace(temp_file_name, file_name)
+
+# Load aggregate from json file (empty aggregate if the file does not exist)
+def load_aggregate(file_name):
+
+    if not os.path.exists(file_name):
+        return CohortAggregate()
+    with open(file_name, 'r') as aggregate_file:
+        data = json.load(aggregate_file)
+    if data.get('version') != AGGREGATE_VERSION:
+        raise ValueError(f"{file_name} is not a cohort aggregate of version {AGGREGATE_VERSION}")
+    return get_aggregate(data)
+
+# Get aggregate from json object
+def get_aggregate(data):
+
+    aggregate = CohortAggregate()
+    aggregate.scans = data['scans']
+    aggregate.summary_counts = {tuple(row[:3]): row[3] for row in data['summary_counts']}
+    aggregate.summary_moments = {tuple(row[:2]): row[2:] for row in data['summary_moments']}
+    aggregate.add_counts(aggregate.encode_counts(pd.DataFrame(data['genotype_counts'], columns=GENOTYPE_KEYS + [C_COUNT]).astype({C_COUNT: np.int64}), GENOTYPE_KEYS),
+                         aggregate.encode_counts(pd.DataFrame(data['allele_counts'], columns=ALLELE_KEYS + [C_ALLELE_COUNT, C_CALLED_ALLELES]).astype({C_ALLELE_COUNT: np.int64, C_CALLED_ALLELES: np.int64}), ALLELE_KEYS))
+    return aggregate
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('aggregates', nargs='+', help="aggregate files (json) of workers or shards to merge")
+    parser.add_argument('--output', help="merged aggregate file (not saved if not specified)")
+    parser.add_argument('--output-dir', default='.', help="directory for cohort tables of the merged aggregate")
+    args = parser.parse_args()
+
+    # Merge aggregates and save cohort tables
+    aggregate = CohortAggregate()
+    for aggregate_file_name in args.aggregates:
+        aggregate.merge(load_aggregate(aggregate_file_name))
+    if args.output is not None:
+        aggregate.save(args.output)
+    aggregate.save_tables(args.output_dir)
+    print(f"Merged {len(args.aggregates)} aggregates of {max(aggregate.scans.values(), default=0)} scans into cohort tables in {args.output_dir}")
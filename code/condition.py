@@ -10,13 +10,37 @@ __maintainer__ = "Melanie Senn"
 __email__ = "melanie.senn@gmail.com"
 
 from abc import abstractmethod
-import pandas as pd
+import importlib.util
+import itertools
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from zipfile import ZipFile
+from instrumentation import Metrics
+
+# Import module lazily (loaded on first attribute access)
+def lazy_import(module_name):
+
+    if module_name in sys.modules:
+        return sys.modules[module_name]
+    spec = importlib.util.find_spec(module_name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+# numpy and pandas are only loaded when tables are used (lightweight scans run without them)
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 # Name constants
 C_APPLICATION = 'Application'
 C_CONDITION = 'Condition'
 C_SNP = 'SNP'
+C_CHROMOSOME = 'Chromosome' # optional SNP database column (selects genotype files of per-chromosome zip files)
 C_GENE = 'Gene/locus'
 C_GENOTYPE = 'Genotype'
 C_RISK_ALLELE = 'Risk allele'
@@ -25,68 +49,424 @@ C_REFERENCE = 'Reference'
 C_ASSOCIATION = 'Association'
 C_RISK = 'Risk'
 C_MAX_RISK = 'Max risk'
+C_SAMPLE = 'Sample'
 V_DIAGNOSIS = 'Diagnosis'
 V_TREATMENT = 'Treatment'
+C_CACHE_SCOPE = 'genotype_cache' # metrics counters of genotype cache
+C_SNP_FILE_SCOPE = 'snp_file' # metrics counters of SNP file members
+C_RESULT_CACHE_SCOPE = 'result_cache' # metrics counters of result cache
+NO_REL_RISK = float('nan') # relative risk of application without results
+
+# Results table columns
+RESULT_COLUMNS = [C_CONDITION, C_APPLICATION, C_SNP, C_GENE, C_GENOTYPE, C_RISK_ALLELE, C_PROTECTIVE_ALLELE, C_ASSOCIATION, C_REFERENCE]
+
+# TSV reader settings
+TSV_COLUMNS = [0, 1, 2, 3] # SNP, chromosome, position, genotype
+TSV_CHUNK_SIZE = 50000
+PREFILTER_MAX_SNPS = 200000 # larger SNP sets match most lines of a SNP file (lines are parsed without byte prefilter)
+CHROMOSOME_MAX_SNPS = 100000 # larger SNP databases span all chromosomes (zip members are not selected by chromosome)
+TSV_WORKERS = min(8, os.cpu_count() or 1) # threads decoding zip members in parallel
+
+# Risk rule settings
+# Risk association of a database row may only depend on its rule columns and the genotype
+RULE_COLUMNS = [C_CONDITION, C_APPLICATION, C_RISK_ALLELE, C_PROTECTIVE_ALLELE]
+# Genotypes compiled up front (other genotypes are compiled on first use)
+STANDARD_GENOTYPES = ['--'] + list('ACGTDI') + [allele_1 + allele_2 for allele_1 in 'ACGTDI' for allele_2 in 'ACGTDI']
+
+# Risk rules of SNP database compiled into lookup tables (rule x genotype code -> risk, max risk, association)
+class RiskRules:
+    def __init__(self, snp_db, get_risk_association, compiled=None):
+        self.get_risk_association = get_risk_association
+
+        # Rules compiled before (rule index, rules, genotype codes, risks, max risks, associations), e.g. by SNP database bundle
+        if compiled is not None:
+            self.rule_index, self.rules, self.genotype_codes, self.risks, self.max_risks, self.associations = compiled
+            return
+
+        # Database rows sharing the rule columns share one rule
+        rule_keys = list(snp_db[RULE_COLUMNS].itertuples(index=False, name=None))
+        rule_codes = {}
+        self.rule_index = np.array([rule_codes.setdefault(rule_key, len(rule_codes)) for rule_key in rule_keys], dtype=np.int64)
+        self.rules = [dict(zip(RULE_COLUMNS, rule_key)) for rule_key in rule_codes]
+
+        # Lookup tables
+        self.genotype_codes = {}
+        self.risks = np.empty((len(self.rules), 0))
+        self.max_risks = np.empty((len(self.rules), 0))
+        self.associations = np.empty((len(self.rules), 0), dtype=object)
+        self.add_genotypes(STANDARD_GENOTYPES)
+
+    # Compile rules for additional genotypes
+    # Rules which cannot be evaluated for a genotype are marked with risk NaN (evaluated per result row)
+    def add_genotypes(self, genotypes):
+
+        risks = np.full((len(self.rules), len(genotypes)), np.nan)
+        max_risks = np.full((len(self.rules), len(genotypes)), np.nan)
+        associations = np.full((len(self.rules), len(genotypes)), None, dtype=object)
+        for rule_count, rule in enumerate(self.rules):
+            for genotype_count, genotype in enumerate(genotypes):
+                try:
+                    risk, max_risk, association = self.get_risk_association({**rule, C_GENOTYPE: genotype})
+                except Exception:
+                    continue
+                risks[rule_count, genotype_count] = risk
+                max_risks[rule_count, genotype_count] = max_risk
+                associations[rule_count, genotype_count] = association
+
+        # Extend lookup tables (new tables are assigned at once)
+        genotype_codes = dict(self.genotype_codes)
+        genotype_codes.update({genotype: len(genotype_codes) + genotype_count for genotype_count, genotype in enumerate(genotypes)})
+        self.risks, self.max_risks, self.associations = np.hstack([self.risks, risks]), np.hstack([self.max_risks, max_risks]), np.hstack([self.associations, associations])
+        self.genotype_codes = genotype_codes
+
+    # Score results (database rows by position and genotypes) by a vectorized gather from lookup tables
+    def score(self, results, db_rows):
+
+        genotypes = results[C_GENOTYPE]
+        new_genotypes = [genotype for genotype in genotypes.unique() if isinstance(genotype, str) and genotype not in self.genotype_codes]
+        if len(new_genotypes):
+            self.add_genotypes(new_genotypes)
+
+        codes = genotypes.map(self.genotype_codes).to_numpy(dtype=float, na_value=np.nan)
+        compiled = ~np.isnan(codes)
+        rules = self.rule_index[db_rows]
+        risks = np.full(len(results.index), np.nan)
+        max_risks = np.full(len(results.index), np.nan)
+        associations = np.full(len(results.index), None, dtype=object)
+        risks[compiled] = self.risks[rules[compiled], codes[compiled].astype(np.int64)]
+        max_risks[compiled] = self.max_risks[rules[compiled], codes[compiled].astype(np.int64)]
+        associations[compiled] = self.associations[rules[compiled], codes[compiled].astype(np.int64)]
+
+        # Evaluate result rows without compiled rule directly
+        for row in np.flatnonzero(np.isnan(risks)):
+            risks[row], max_risks[row], associations[row] = self.get_risk_association(results.iloc[row])
+
+        results[C_RISK] = risks
+        results[C_MAX_RISK] = max_risks
+        results[C_ASSOCIATION] = associations
 
 class Condition:
+    # Results table columns (database columns and genotype) and columns not in csv file
+    RESULT_COLUMNS = RESULT_COLUMNS
+    RESULTS_TABLE_DROP_COLUMNS = [C_APPLICATION, C_CONDITION, C_RISK, C_MAX_RISK]
+    # Scored by risk rules per database row (compiled into lookup tables, SNP database bundles and lightweight scans)
+    RISK_RULES = True
+    # Allele of results the risk is scored for (risk matrix columns and cohort allele frequencies)
+    ALLELE_COLUMN = C_RISK_ALLELE
+
     def __init__(self, snp_file_name, snp_db_file_name):
         self.snp_file_name = snp_file_name
         self.snp_db_file_name = snp_db_file_name
         self.tsv_content = None
+        self.tsv_index = None
         self.snp_db = None
         self.snp_results = None
+        self.genotype_cache = None
+        self.result_cache = None
+        self.snp_file_hash = None
+        self.row_hashes = None
+        self.risk_rules = None
+        self.snp_chromosomes = None
+        self.metrics = Metrics()
+        self.tsv_workers = TSV_WORKERS
+        self.early_stop = False
 
-    # Get TSV files content from user selection
-    def get_tsv_content(self):
+    # Read genotype file (binary file object) with reader of its format in chunks keeping only rows of given SNPs (all rows if no SNPs are given)
+    # With lookup keys of the SNPs, lines are prefiltered on their bytes in blocks and only lines of wanted keys are parsed
+    # SNPs are looked up per row in a set (isin would hash all SNPs again per chunk, slow for large SNP databases)
+    # Reading stops after the current chunk (or block) once the stop event is set (None if stopped before the first chunk)
+    def read_tsv(self, tsv_file, reader, snps=None, stop=None, snp_keys=None):
 
-        if self.snp_file_name is None:
-            from tkinter import filedialog as fd
-            file_types = (('zip files', '*.zip'), ('All files', '*.*'))
-            self.snp_file_name = fd.askopenfilename(title='Open a ZIP file', initialdir='/', filetypes=file_types)
+        if snp_keys is not None:
+            chunks = (self.metrics.add('load_genotypes', chunk, rows=row_count) # lines scanned
+                      for row_count, chunk in reader.read_snp_blocks(tsv_file, snp_keys, TSV_CHUNK_SIZE))
+        else:
+            chunks = reader.read_chunks(tsv_file, TSV_CHUNK_SIZE)
+            chunks = (self.metrics.add('load_genotypes', chunk, rows=len(chunk.index)) for chunk in chunks) # rows read
+        if snps is not None:
+            snps = snps if isinstance(snps, (set, frozenset)) else set(snps)
+            chunks = (chunk.loc[[snp in snps for snp in chunk[0]]] for chunk in chunks)
+        if stop is not None:
+            chunks = list(itertools.takewhile(lambda chunk: not stop.is_set(), chunks))
+            if len(chunks) == 0:
+                return None
+        tsv_content = pd.concat(chunks, ignore_index=True)
+        return tsv_content
+
+    # Read genotype file of zip file
+    def read_zip_member(self, zip_file, member, reader, snps=None, stop=None, snp_keys=None):
+        with zip_file.open(member) as tsv_file:
+            return self.read_tsv(tsv_file, reader, snps, stop, snp_keys)
+
+    # Read genotype files of zip file on a thread pool (decompression and parsing run in parallel), merged in member order
+    # With early stop, remaining members are skipped once every SNP has been found
+    # (SNPs found again in skipped members are then not detected as ambiguous)
+    def read_zip_members(self, zip_file, members, reader, snps=None, snp_keys=None):
+
+        early_stop = self.early_stop and (snps is not None)
+        stop = threading.Event() if early_stop else None
+        remaining_snps = set(snps) if early_stop else None
+        tsv_contents = {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.tsv_workers, len(members)))) as executor:
+            futures = {executor.submit(self.read_zip_member, zip_file, member, reader, snps, stop, snp_keys): member_index for member_index, member in enumerate(members)}
+            for future in as_completed(futures):
+                tsv_contents[futures[future]] = future.result()
+                if early_stop:
+                    remaining_snps.difference_update(tsv_contents[futures[future]][0])
+                    if len(remaining_snps) == 0:
+                        stop.set()
+                        for pending_future in futures:
+                            pending_future.cancel()
+                        break
+
+        self.metrics.count(C_SNP_FILE_SCOPE, members=len(members), members_read=len(tsv_contents))
+        return [tsv_contents[member_index] for member_index in sorted(tsv_contents)]
+
+    # Get lookup keys of given SNPs for the byte prefilter of reader (None if lines are not prefiltered)
+    def get_snp_keys(self, reader, snps):
+
+        if (snps is None) or (reader.snp_field is None) or (len(snps) > PREFILTER_MAX_SNPS):
+            return None
+        from snp_reader import get_wanted_keys
+        return get_wanted_keys(snps)
+
+    # Read genotype files of zip file holding the chromosomes of given SNPs (SNP -> chromosome) only (all members if not known)
+    # All members are read again if a SNP is found on another chromosome than expected
+    def read_selected_zip_members(self, zip_file, members, reader, snps=None, snp_keys=None, snp_chromosomes=None):
+
+        from snp_reader import is_chromosome_match, select_members
+        selected_members = members if (snps is None) or not snp_chromosomes else select_members(zip_file, members, reader, snps, snp_chromosomes)
+        tsv_content = pd.concat(self.read_zip_members(zip_file, selected_members, reader, snps, snp_keys), ignore_index=True)
+        if len(selected_members) < len(members):
+            self.metrics.count(C_SNP_FILE_SCOPE, members_skipped=len(members) - len(selected_members))
+            if not is_chromosome_match(zip(tsv_content[0], tsv_content[1].astype(str)), snp_chromosomes):
+                self.metrics.count(C_SNP_FILE_SCOPE, chromosome_mismatches=1)
+                tsv_content = pd.concat(self.read_zip_members(zip_file, members, reader, snps, snp_keys), ignore_index=True)
+        return tsv_content
+
+    # Read SNP file (zip file of genotype files or single genotype file, format detected by its reader)
+    # Lines of files with tab separated SNP fields are prefiltered by lookup keys of the given SNPs
+    # Genotype files of zip files are selected by the chromosomes of the given SNPs (SNP -> chromosome)
+    def read_snp_file(self, snps=None, snp_chromosomes=None):
+
+        from snp_reader import open_genotype_file, sniff_reader
 
         # Check if file is a zip file
         if self.snp_file_name.endswith('.zip'):
-            
-            # Get TSV content from zip file
-            zip_file = ZipFile(self.snp_file_name)
-            tsv_content = pd.concat([pd.read_csv(zip_file.open(i.filename), sep='\t', header=None) for i in zip_file.infolist() if i.compress_size > 0], ignore_index=True)
+
+            # Get TSV content from zip file (members of the format of the first member)
+            with ZipFile(self.snp_file_name) as zip_file:
+                members = [info.filename for info in zip_file.infolist() if info.compress_size > 0]
+                with zip_file.open(members[0]) as member_file:
+                    reader = sniff_reader(member_file)
+                snp_keys = self.get_snp_keys(reader, snps)
+                tsv_content = self.read_selected_zip_members(zip_file, members, reader, snps, snp_keys, snp_chromosomes)
         else:
-            tsv_content = pd.read_csv(self.snp_file_name, sep='\t', header=None)
+            with open_genotype_file(self.snp_file_name) as genotype_file:
+                reader = sniff_reader(genotype_file)
+            snp_keys = self.get_snp_keys(reader, snps)
+            with open_genotype_file(self.snp_file_name) as genotype_file:
+                tsv_content = self.read_tsv(genotype_file, reader, snps, snp_keys=snp_keys)
+
+        return tsv_content
+
+    # Get TSV files content from user selection
+    # Only rows of the given SNPs (default: SNPs of loaded SNP database) are kept
+    # Chromosomes of the SNPs (SNP -> chromosome, default: chromosomes of loaded SNP database) select genotype files of zip files
+    def get_tsv_content(self, snps=None, snp_chromosomes=None):
+
+        if self.snp_file_name is None:
+            from tkinter import filedialog as fd
+            file_types = (('genotype files', '*.zip *.txt *.tsv *.csv *.vcf *.gz'), ('All files', '*.*'))
+            self.snp_file_name = fd.askopenfilename(title='Open a genotype file', initialdir='/', filetypes=file_types)
+
+        if (snps is None) and (self.snp_db is not None):
+            snps = set(self.snp_db[C_SNP])
+            if snp_chromosomes is None:
+                snp_chromosomes = self.get_snp_chromosomes()
+
+        with self.metrics.stage('load_genotypes') as stage:
+            stage["bytes"] += os.path.getsize(self.snp_file_name)
+            if (self.result_cache is not None) and (snps is not None):
+                tsv_content = self.load_cached_tsv_content(snps, snp_chromosomes)
+            else:
+                tsv_content = self.load_tsv_content(snps, snp_chromosomes)
 
         self.tsv_content = tsv_content
-    
-    # Load SNP database
+        self.tsv_index = None
+
+    # Load TSV content of given SNPs from genotype cache (whole SNP file is cached on first use) or SNP file
+    def load_tsv_content(self, snps=None, snp_chromosomes=None):
+
+        if self.genotype_cache is not None:
+            key = self.get_snp_file_hash()
+            if not self.genotype_cache.contains(key):
+                self.genotype_cache.store(key, self.read_snp_file())
+            tsv_content = self.genotype_cache.load(key, snps)
+            self.metrics.count(C_CACHE_SCOPE, loaded=1)
+        else:
+            tsv_content = self.read_snp_file(snps, snp_chromosomes)
+        return tsv_content
+
+    # Load TSV content of given SNPs from result cache (only SNPs not looked up by earlier scans of the SNP file are loaded)
+    def load_cached_tsv_content(self, snps, snp_chromosomes=None):
+
+        key = self.get_snp_file_hash()
+        entry = self.result_cache.load(key)
+        missing_snps = set(snps).difference(entry['genotypes'])
+        if len(missing_snps):
+            tsv_content = self.load_tsv_content(missing_snps, snp_chromosomes)
+            genotypes = {snp: [] for snp in missing_snps}
+            for row in tsv_content.astype(object).where(tsv_content.notna(), None).values.tolist():
+                genotypes[row[0]].append(row[1:])
+            entry['genotypes'].update(genotypes)
+            self.result_cache.store(key, entry)
+        self.metrics.count(C_RESULT_CACHE_SCOPE, snps_cached=len(set(snps)) - len(missing_snps), snps_loaded=len(missing_snps))
+
+        rows = [[snp, *row] for snp in sorted(snps) for row in entry['genotypes'][snp]]
+        return pd.DataFrame(rows, columns=TSV_COLUMNS)
+
+    # Get content hash of SNP file (cache key, computed once)
+    def get_snp_file_hash(self):
+
+        if self.snp_file_hash is None:
+            from genotype_cache import get_file_hash
+            self.snp_file_hash = get_file_hash(self.snp_file_name)
+        return self.snp_file_hash
+
+    # Build rsID index over TSV content (genotypes of uniquely matching SNPs only)
+    def get_tsv_index(self):
+        with self.metrics.stage('index') as stage:
+            unique_rows = ~self.tsv_content[0].duplicated(keep=False)
+            self.tsv_index = self.tsv_content.loc[unique_rows].set_index(0)[3]
+            stage["rows"] += len(self.tsv_content.index)
+
+    # Load SNP database (memory-mapped with precompiled risk rules from SNP database bundle if compiled)
     def get_snp_db(self):
-        self.snp_db = pd.read_csv(self.snp_db_file_name)
+
+        from snp_db_bundle import get_bundle
+        with self.metrics.stage('load_db') as stage:
+            bundle = get_bundle()
+            if (bundle is not None) and bundle.contains(self.snp_db_file_name, type(self)):
+                self.snp_db = bundle.get_snp_db(self.snp_db_file_name, type(self))
+                self.risk_rules = bundle.get_risk_rules(self.snp_db_file_name, type(self), self.get_risk_association)
+            else:
+                self.snp_db = pd.read_csv(self.snp_db_file_name)
+                self.risk_rules = None
+                stage["bytes"] += os.path.getsize(self.snp_db_file_name)
+            stage["rows"] += len(self.snp_db.index)
+
+    # Share SNP database, compiled risk rules, row hashes and SNP chromosomes of another condition of the same kind
+    def share_snp_db(self, condition):
+        if condition.risk_rules is None:
+            condition.compile_risk_rules()
+        self.snp_db = condition.snp_db
+        self.risk_rules = condition.risk_rules
+        self.row_hashes = condition.row_hashes
+        self.snp_chromosomes = condition.get_snp_chromosomes()
+
+    # Get chromosomes of SNP database SNPs (SNP -> chromosome, computed once) from its chromosome column
+    # or otherwise from the loci files next to the SNP database (SNPs without known chromosome are left out)
+    def get_snp_chromosomes(self):
+
+        if self.snp_chromosomes is None:
+            from loci import get_loci_chromosomes, get_snp_chromosomes
+            if len(self.snp_db.index) > CHROMOSOME_MAX_SNPS:
+                self.snp_chromosomes = {}
+            elif C_CHROMOSOME in self.snp_db.columns:
+                self.snp_chromosomes = get_snp_chromosomes(zip(self.snp_db[C_SNP], self.snp_db[C_CHROMOSOME]))
+            else:
+                self.snp_chromosomes = get_loci_chromosomes(set(self.snp_db[C_SNP]), os.path.dirname(self.snp_db_file_name))
+        return self.snp_chromosomes
+
+    # Get content hash per SNP database row (computed once)
+    def get_row_hashes(self):
+
+        if self.row_hashes is None:
+            from result_cache import get_row_hashes
+            self.row_hashes = np.array(get_row_hashes(self.snp_db), dtype=object)
+        return self.row_hashes
+
+    # Compile risk rules of SNP database into lookup tables
+    def compile_risk_rules(self):
+        self.risk_rules = RiskRules(self.snp_db, self.get_risk_association)
+
+    # Score results of database rows (by position) with compiled risk rules
+    def score_results(self, results, db_rows):
+        with self.metrics.stage('score') as stage:
+            if self.risk_rules is None:
+                self.compile_risk_rules()
+            self.risk_rules.score(results, db_rows)
+            stage["rows"] += len(results.index)
+
+    # Score results of database rows (by position) with risks and associations cached by earlier scans of the SNP file
+    # Only new or changed database rows (and all rows after a change of the modules of the condition and its base classes) are scored
+    def score_cached_results(self, results, db_rows):
+
+        from result_cache import get_module_hash
+        key = self.get_snp_file_hash()
+        entry = self.result_cache.load(key)
+        module_hash = get_module_hash(type(self))
+        cached_results = entry['results'].get(type(self).__name__, {})
+        if cached_results.get('module_hash') != module_hash:
+            cached_results = {'module_hash': module_hash, 'rows': {}}
+        row_hashes = self.get_row_hashes()[db_rows]
+        cached = np.array([row_hash in cached_results['rows'] for row_hash in row_hashes], dtype=bool)
+
+        # Cached rows
+        risks = np.full(len(results.index), np.nan)
+        max_risks = np.full(len(results.index), np.nan)
+        associations = np.full(len(results.index), None, dtype=object)
+        for row in np.flatnonzero(cached):
+            risks[row], max_risks[row], associations[row] = cached_results['rows'][row_hashes[row]]
+
+        # New or changed rows
+        if not cached.all():
+            new_results = results.loc[~cached].copy()
+            self.score_results(new_results, db_rows[~cached])
+            risks[~cached] = new_results[C_RISK].values
+            max_risks[~cached] = new_results[C_MAX_RISK].values
+            associations[~cached] = new_results[C_ASSOCIATION].values
+        results[C_RISK] = risks
+        results[C_MAX_RISK] = max_risks
+        results[C_ASSOCIATION] = associations
+
+        # Keep results of current database rows only
+        cached_results['rows'] = {row_hash: [float(risk), float(max_risk), association]
+                                  for row_hash, risk, max_risk, association in zip(row_hashes, risks, max_risks, associations)}
+        entry['results'][type(self).__name__] = cached_results
+        self.result_cache.store(key, entry)
+        self.metrics.count(C_RESULT_CACHE_SCOPE, rows_cached=cached.sum(), rows_scored=(~cached).sum())
 
     # Get results from TSV files for database SNPs
     def get_snp_results(self):
 
-        # Create empty results table
-        result_columns=[C_CONDITION, C_APPLICATION, C_SNP, C_GENE, C_GENOTYPE, C_RISK_ALLELE, C_PROTECTIVE_ALLELE, C_ASSOCIATION, C_REFERENCE]
-        results = pd.DataFrame(columns=result_columns)
-
-        # Search tsv data for SNPs
-        for db_index in self.snp_db.index:
-            current_SNP = self.snp_db[C_SNP][db_index]
-            print(f"Scanning for SNP {current_SNP} ({db_index + 1} out of {len(self.snp_db.index)})")
-            SNP_match = self.tsv_content[0] == current_SNP
-            if SNP_match.sum() == 1: # check for unique match
-                print(f"Found SNP {current_SNP}")
-                row = self.tsv_content.loc[SNP_match]
-                result_entry = len(results.index)
-                results.loc[result_entry, C_SNP] = current_SNP
-                results.loc[result_entry, C_CONDITION] = self.snp_db[C_CONDITION][db_index]
-                results.loc[result_entry, C_APPLICATION] = self.snp_db[C_APPLICATION][db_index]
-                results.loc[result_entry, C_GENE] = self.snp_db[C_GENE][db_index]
-                results.loc[result_entry, C_REFERENCE] = self.snp_db[C_REFERENCE][db_index]
-                results.loc[result_entry, C_RISK_ALLELE] = self.snp_db[C_RISK_ALLELE][db_index]
-                results.loc[result_entry, C_PROTECTIVE_ALLELE] = self.snp_db[C_PROTECTIVE_ALLELE][db_index]
-                results.loc[result_entry, C_GENOTYPE] = row[3].values[0] # genotype
-                risk, max_risk, association = self.get_risk_association(results.loc[result_entry]) # risk association
-                results.loc[result_entry, C_RISK] = risk
-                results.loc[result_entry, C_MAX_RISK] = max_risk
-                results.loc[result_entry, C_ASSOCIATION] = association
+        # Index tsv data by SNP once
+        if self.tsv_index is None:
+            self.get_tsv_index()
+
+        with self.metrics.stage('match') as stage:
+
+            # Look up each unique database SNP once and fan out to all database rows using it
+            db_snps = self.snp_db[C_SNP].unique()
+            SNP_genotypes = self.tsv_index.reindex(db_snps).dropna()
+            SNP_match = self.snp_db[C_SNP].isin(SNP_genotypes.index)
+            matches = self.snp_db.loc[SNP_match]
+
+            # SNPs found more than once in TSV content are ambiguous (not matched)
+            ambiguous_count = (self.tsv_content[0].value_counts().reindex(db_snps) > 1).sum()
+            self.metrics.count(type(self).__name__, found=len(SNP_genotypes), ambiguous=ambiguous_count,
+                               missing=len(db_snps) - len(SNP_genotypes) - ambiguous_count, db_rows=len(self.snp_db.index), db_rows_matched=len(matches.index))
+            self.metrics.progress(f"Found {len(matches.index)} out of {len(self.snp_db.index)} SNPs")
+
+            # Build results table in bulk
+            results = matches.reset_index(drop=True).reindex(columns=self.RESULT_COLUMNS)
+            results[C_GENOTYPE] = matches[C_SNP].map(SNP_genotypes).values # genotype
+            stage["rows"] += len(db_snps)
+        if self.result_cache is not None:
+            self.score_cached_results(results, np.flatnonzero(SNP_match)) # risk association
+        else:
+            self.score_results(results, np.flatnonzero(SNP_match)) # risk association
 
         self.snp_results = results
 
@@ -95,15 +475,78 @@ class Condition:
     def get_risk_association(self, result_row):
         pass
 
-    # Summarize results from single SNPs into conclusion
+    # Get relative risk (risk / max risk) per application in a single grouped reduction
+    # Results with a sample column are reduced per sample (one row per sample), otherwise one row
+    def get_rel_risks(self, results):
+
+        if C_SAMPLE in results.columns:
+            sums = results.groupby([C_SAMPLE, C_APPLICATION], sort=False)[[C_RISK, C_MAX_RISK]].sum()
+            rel_risks = (sums[C_RISK] / sums[C_MAX_RISK]).unstack(C_APPLICATION)
+        else:
+            sums = results.groupby(C_APPLICATION, sort=False)[[C_RISK, C_MAX_RISK]].sum()
+            rel_risks = (sums[C_RISK] / sums[C_MAX_RISK]).to_frame().T
+        return rel_risks
+
+    # Get relative risk per application of results of a single SNP file (application -> relative risk)
+    def get_result_rel_risks(self):
+        return self.get_rel_risks(self.snp_results).iloc[0].to_dict()
+
+    # Summarize relative risks per application (application -> relative risk) into summary scores (json keys and values)
+    @abstractmethod
+    def summarize_rel_risks(self, rel_risks):
+        pass
+
+    # Summarize relative risks per application of many samples into summary scores (one row per sample, json keys as columns)
+    def summarize_rel_risk_table(self, rel_risks):
+        summary = [self.summarize_rel_risks(sample_rel_risks) for sample_rel_risks in rel_risks.to_dict(orient='records')]
+        return pd.DataFrame(summary, index=rel_risks.index)
+
+    # Summarize results from single SNPs into conclusion (relative risks per application computed from results if not given)
+    @abstractmethod
+    def summarize_results(self, rel_risks=None):
+        pass
+
+    # Get summary scores of results (json keys and values)
     @abstractmethod
-    def summarize_results(self):
+    def get_summary(self):
         pass
 
-    # Save results (csv and json)
-    def save_results(self, results_csv_file_name, results_json_file_name):
+    # Get results table for csv file
+    def get_results_table(self):
+        return self.snp_results.drop(columns=self.RESULTS_TABLE_DROP_COLUMNS)
+
+    # Get results json object (summary scores and results data)
+    def get_result_dic(self):
+        result_dic = self.get_summary()
+        result_dic["data"] = self.snp_results.to_dict(orient='records')
+        return result_dic
+
+    # Get results as csv text and json object in memory (same content as saved files)
+    def get_results_payloads(self):
+        return self.get_results_table().to_csv(index=False, sep='\t'), self.get_result_dic()
+
+    # Save results (csv and json), printed as markdown table if asked for
+    def save_results(self, results_csv_file_name, results_json_file_name, markdown=False):
+
+        with self.metrics.stage('save') as stage:
+
+            # csv file
+            results = self.get_results_table()
+            if markdown:
+                print('\nResults\n' + results.to_markdown())
+            results.to_csv(results_csv_file_name, index=False, sep='\t')
+
+            # json file
+            result_dic = self.get_result_dic()
+
+            # Convert and write JSON object to file
+            with open(results_json_file_name, "w") as outfile:
+                json.dump(result_dic, outfile)
+            stage["rows"] += len(results.index)
+            stage["bytes"] += os.path.getsize(results_csv_file_name) + os.path.getsize(results_json_file_name)
 
-        # csv file
-        results = self.snp_results.drop(columns=[C_APPLICATION, C_CONDITION, C_RISK, C_MAX_RISK])
-        print('\nResults\n' + results.to_markdown())
-        results.to_csv(results_csv_file_name, index=False, sep='\t')
+    # Append summary scores and results of sample to result sink (partitioned by condition module)
+    def write_results(self, result_sink, sample):
+        with self.metrics.stage('save') as stage:
+            result_sink.write(sample, type(self).__module__, self.get_summary(), self.snp_results)
+            stage["rows"] += len(self.snp_results.index)
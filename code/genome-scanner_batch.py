@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Scans a cohort of SNP files for SNPs from databases in parallel and interprets results
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import contextlib
+import glob
+import io
+import itertools
+import os
+import shutil
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import pandas as pd
+from condition import C_CONDITION, C_SAMPLE
+from cohort_aggregate import CohortAggregate, load_aggregate, get_aggregate, check_allele_column
+from result_sink import V_NDJSON, V_COLUMNAR, get_result_sink, get_batch_name
+from scanner import get_config_file_names, get_config, get_condition_class, get_template_conditions, get_conditions, scan_conditions, get_results_file_names
+from work_queue import UNIT_SIZE, LEASE_TIMEOUT, WorkQueue, get_unit_name
+
+# Name constants
+C_FILE = 'File'
+C_STATUS = 'Status'
+C_ERROR = 'Error'
+V_OK = 'OK'
+V_FAILED = 'Failed'
+SNP_FILE_PATTERNS = ['*.zip', '*.txt', '*.tsv', '*.csv', '*.vcf', '*.vcf.gz']
+COHORT_RESULTS_FILE_NAME = 'cohort_results.csv'
+COHORT_SUMMARY_FILE_NAME = 'cohort_summary.csv'
+PENDING_FILES_PER_WORKER = 2 # SNP files submitted ahead per worker (results are released once written)
+POLL_INTERVAL = 10 # seconds between checks for units leased by other workers (at most a third of the lease timeout)
+FINALIZE_LEASE = 'finalize'
+STAGED_PART = 'part' # part name of streamed results staged per SNP file (published as part-<unit> per partition)
+
+# Configs, SNP databases and compiled risk rules loaded once per worker process
+worker_configs = None
+worker_templates = None
+worker_genotype_cache = None
+worker_result_cache = None
+
+# Get SNP file names from paths (SNP files, directories of SNP files or manifest files listing SNP files)
+def get_snp_file_names(paths):
+
+    snp_file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in SNP_FILE_PATTERNS:
+                snp_file_names.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        elif path.endswith('.manifest') or path.endswith('.lst'):
+            with open(path, 'r') as manifest_file:
+                manifest_dir = os.path.dirname(path)
+                for line in manifest_file:
+                    line = line.strip()
+                    if line and not line.startswith('#'):
+                        snp_file_names.append(os.path.join(manifest_dir, line))
+        else:
+            snp_file_names.append(path)
+    return snp_file_names
+
+# Get unique sample names for SNP files (file name without extension, e.g. without .vcf.gz)
+def get_sample_names(snp_file_names):
+
+    sample_names = []
+    for snp_file_name in snp_file_names:
+        sample_name = os.path.basename(snp_file_name)
+        if sample_name.endswith('.gz'):
+            sample_name = sample_name[:-len('.gz')]
+        sample_name = os.path.splitext(sample_name)[0]
+        unique_sample_name = sample_name
+        count = 1
+        while unique_sample_name in sample_names:
+            count += 1
+            unique_sample_name = f"{sample_name}_{count}"
+        sample_names.append(unique_sample_name)
+    return sample_names
+
+# Load configs, SNP databases and compiled risk rules once per worker process
+def init_worker(config_file_names, cache_dir, cache_size, result_cache_dir, result_cache_size):
+
+    global worker_configs, worker_templates, worker_genotype_cache, worker_result_cache
+    worker_configs = [get_config(config_file_name) for config_file_name in config_file_names]
+    worker_templates = get_template_conditions(worker_configs)
+    if cache_dir is not None:
+        from genotype_cache import GenotypeCache
+        worker_genotype_cache = GenotypeCache(cache_dir, cache_size)
+    if result_cache_dir is not None:
+        from result_cache import ResultCache
+        worker_result_cache = ResultCache(result_cache_dir, result_cache_size)
+        for template in worker_templates:
+            template.get_row_hashes()
+
+# Scan SNP file for all conditions and save results per file if save_files (failures are returned, not raised)
+# Aggregated if allele columns of the conditions are given (condition -> allele column, SNP file failed if its results cannot be aggregated)
+# Returns summary rows for the cohort summary, results per condition (condition, summary scores, results) and the aggregate of the SNP file
+def scan_file(snp_file_name, sample_name, output_dir, save_files=True, allele_columns=None):
+
+    summary = []
+    results = []
+    aggregate = None
+    try:
+        conditions = get_conditions(worker_configs, snp_file_name, worker_genotype_cache, worker_templates, tsv_workers=1, # files in parallel
+                                    result_cache=worker_result_cache)
+
+        # Progress output of single scans is not shown
+        with contextlib.redirect_stdout(io.StringIO()):
+            scan_conditions(conditions)
+            if allele_columns is not None:
+                aggregate = CohortAggregate()
+                for config_data, condition in zip(worker_configs, conditions):
+                    aggregate.add(config_data["python_module"], pd.DataFrame([condition.get_summary()]), condition.snp_results,
+                                  allele_columns[config_data["python_module"]])
+            if save_files:
+                sample_dir = os.path.join(output_dir, sample_name)
+                os.makedirs(sample_dir, exist_ok=True)
+                for config_data, condition in zip(worker_configs, conditions):
+                    results_csv_file_name, results_json_file_name = get_results_file_names(config_data, True)
+                    condition.save_results(os.path.join(sample_dir, results_csv_file_name), os.path.join(sample_dir, results_json_file_name))
+
+        # Summary rows and results for cohort tables or result sink
+        for config_data, condition in zip(worker_configs, conditions):
+            summary.append({C_SAMPLE: sample_name, C_FILE: snp_file_name, C_CONDITION: config_data["python_module"],
+                            C_STATUS: V_OK, C_ERROR: '', **condition.get_summary()})
+            results.append((config_data["python_module"], condition.get_summary(), condition.snp_results))
+
+    except Exception:
+        summary = [{C_SAMPLE: sample_name, C_FILE: snp_file_name, C_CONDITION: '',
+                    C_STATUS: V_FAILED, C_ERROR: traceback.format_exc().strip().splitlines()[-1]}]
+        results = []
+        aggregate = None
+
+    return summary, results, aggregate
+
+# Scan SNP files (key, SNP file, sample name) in worker processes with a bounded number of pending SNP files
+# Yields key, summary rows, results and aggregate per SNP file as SNP files finish
+def scan_files(executor, files, output_dir, save_files, allele_columns, workers):
+
+    files = iter(files)
+    futures = {}
+    while True:
+        for key, snp_file_name, sample_name in itertools.islice(files, PENDING_FILES_PER_WORKER * workers - len(futures)):
+            futures[executor.submit(scan_file, snp_file_name, sample_name, output_dir, save_files, allele_columns)] = key
+        if len(futures) == 0:
+            break
+
+        done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield (futures.pop(future), *future.result())
+
+# Get results of SNP file as rows of the cohort results table
+def get_cohort_results(sample_name, snp_results):
+    return snp_results.assign(**{C_SAMPLE: sample_name})[[C_SAMPLE, *snp_results.columns]]
+
+# Get checkpoint of scanned SNP file (summary rows, results per condition if saved as cohort results and its aggregate if aggregated)
+def get_checkpoint(summary, results, save_results, aggregate):
+
+    checkpoint = {'summary': summary}
+    if save_results:
+        checkpoint['results'] = [[condition_name, get_cohort_results(summary[0][C_SAMPLE], snp_results).to_json(orient='table', index=False)]
+                                 for condition_name, _, snp_results in results]
+    if aggregate is not None:
+        checkpoint['aggregate'] = aggregate.get_data()
+    return checkpoint
+
+# Save cohort tables (csv) and cohort aggregates (json) with their cohort tables (csv)
+def save_cohort_tables(cohort_summary, cohort_results, aggregate, output_dir, aggregate_file_name, standardize):
+
+    cohort_summary = pd.DataFrame(cohort_summary).sort_values([C_SAMPLE, C_CONDITION])
+    if standardize:
+        from polygenic import standardize_scores
+        cohort_summary = standardize_scores(cohort_summary, [C_CONDITION])
+    cohort_summary.to_csv(os.path.join(output_dir, COHORT_SUMMARY_FILE_NAME), index=False, sep='\t')
+    if len(cohort_results):
+        cohort_results = pd.concat(cohort_results, ignore_index=True).sort_values(C_SAMPLE, kind='stable')
+        cohort_results.to_csv(os.path.join(output_dir, COHORT_RESULTS_FILE_NAME), index=False, sep='\t')
+
+    if aggregate is not None:
+        aggregate.save(aggregate_file_name)
+        aggregate.save_tables(output_dir)
+    return (cohort_summary[C_STATUS] == V_FAILED).sum()
+
+# Publish staged results of unit into the output directory (one part file of the unit per partition and table)
+# Part files are written to a temporary file and moved into place, so a unit published again replaces its part files
+def publish_unit(queue, unit, output_dir):
+
+    unit_part = f"part-{get_unit_name(unit)}"
+    for relative_file_name, staged_file_names in queue.get_staged_files(unit).items():
+        partition_dir, file_name = os.path.split(os.path.join(output_dir, relative_file_name))
+        os.makedirs(partition_dir, exist_ok=True)
+        temp_file_descriptor, temp_file_name = tempfile.mkstemp(dir=partition_dir, prefix='.tmp_')
+        with os.fdopen(temp_file_descriptor, 'wb') as part_file:
+            for staged_file_name in staged_file_names:
+                with open(staged_file_name, 'rb') as staged_file:
+                    shutil.copyfileobj(staged_file, part_file)
+        os.replace(temp_file_name, os.path.join(partition_dir, unit_part + file_name[len(STAGED_PART):]))
+
+# Scan units of the work plan claimed from the work queue until all units are done (units of other workers are waited for)
+# Finished SNP files are checkpointed, streamed results are staged per SNP file before and published once the unit is done
+def scan_units(queue, executor, output_dir, output_format, batch, allele_columns, workers):
+
+    save_files = output_format == 'files'
+    total_count = sum(len(files) for files in queue.units)
+    while True:
+        units = queue.get_unfinished_units()
+        if len(units) == 0:
+            return
+        unit = next((unit for unit in units if queue.claim(get_unit_name(unit))), None)
+        if unit is None:
+            print(f"Waiting for {len(units)} units leased by other workers")
+            time.sleep(min(POLL_INTERVAL, queue.lease_timeout / 3))
+            continue
+
+        # SNP files of unit are scanned while its lease is held (lease reclaimed by another worker after a timeout)
+        unit_name = get_unit_name(unit)
+        file_count = len(queue.get_finished())
+        try:
+            files = itertools.takewhile(lambda _: queue.is_held(unit_name), queue.get_unfinished_files(unit))
+            for index, summary, results, file_aggregate in scan_files(executor, files, output_dir, save_files, allele_columns, workers):
+                if not queue.is_held(unit_name):
+                    break
+                sample_name = summary[0][C_SAMPLE]
+                if not save_files:
+                    with get_result_sink(output_format, queue.get_staging_dir(index, clear=True), batch, STAGED_PART) as result_sink:
+                        for condition_name, condition_summary, snp_results in results:
+                            result_sink.write(sample_name, condition_name, condition_summary, snp_results)
+                queue.save_checkpoint(index, get_checkpoint(summary, results, save_files, file_aggregate))
+                file_count += 1
+                print(f"Scanned {file_count} out of {total_count} SNP files ({unit_name}, {sample_name}: {summary[0][C_STATUS]})")
+
+            # Unit is done once all its SNP files are finished (published while its lease is held)
+            if queue.is_held(unit_name) and (len(queue.get_unfinished_files(unit)) == 0):
+                publish_unit(queue, unit, output_dir)
+                queue.finish_unit(unit)
+        finally:
+            queue.release(unit_name)
+
+# Claim saving the cohort tables of a distributed batch scan (False if saved or being saved by another worker)
+# Checked again once claimed, as another worker may have saved them before releasing the lease
+def claim_finalize(queue):
+
+    if queue.is_done(FINALIZE_LEASE) or not queue.claim(FINALIZE_LEASE):
+        return False
+    if queue.is_done(FINALIZE_LEASE):
+        queue.release(FINALIZE_LEASE)
+        return False
+    return True
+
+# Load cohort tables and aggregates from checkpoints of all SNP files
+def load_checkpoints(queue, aggregate):
+
+    cohort_summary = []
+    cohort_results = []
+    for checkpoint in queue.load_checkpoints():
+        cohort_summary.extend(checkpoint['summary'])
+        for _, results in checkpoint.get('results', []):
+            cohort_results.append(pd.read_json(io.StringIO(results), orient='table'))
+        if (aggregate is not None) and ('aggregate' in checkpoint): # failed SNP files are not aggregated
+            aggregate.merge(get_aggregate(checkpoint['aggregate']))
+    return cohort_summary, cohort_results
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('inputs', nargs='+', help="SNP files, directories of SNP files or manifest files (.manifest, .lst) listing SNP files")
+    parser.add_argument('--config', nargs='+', required=True, help="config files or directories of config files")
+    parser.add_argument('--output-dir', default='cohort_results', help="directory for per-file results and cohort tables")
+    parser.add_argument('--output-format', choices=['files', V_NDJSON, V_COLUMNAR], default='files',
+                        help="save results as csv and json files per SNP file and cohort results table or append them to NDJSON or columnar files (partitioned by condition and batch)")
+    parser.add_argument('--batch', help="batch partition of NDJSON or columnar results (default: start time)")
+    parser.add_argument('--aggregate', help="json file of cohort aggregates (genotype counts, risk allele frequencies and summary distributions) updated with the scanned SNP files and saved as cohort tables (not aggregated if not specified)")
+    parser.add_argument('--standardize', action='store_true', help="standardize polygenic scores per condition across the cohort summary (z-scores)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--cache-dir', help="directory of the genotype cache (no caching if not specified)")
+    parser.add_argument('--cache-size', type=int, default=1024, help="maximum size of the genotype cache in MB")
+    parser.add_argument('--result-cache-dir', help="directory of the result cache for incremental re-scans (no caching if not specified)")
+    parser.add_argument('--result-cache-size', type=int, default=256, help="maximum size of the result cache in MB")
+    parser.add_argument('--work-dir', help="shared work directory of a distributed batch scan (plan, leases and checkpoints of workers on one or several hosts, resumed if it exists)")
+    parser.add_argument('--unit-size', type=int, default=UNIT_SIZE, help="SNP files per work unit of a distributed batch scan")
+    parser.add_argument('--lease-timeout', type=float, default=LEASE_TIMEOUT, help="seconds until units of a stopped worker are reclaimed by other workers")
+    args = parser.parse_args()
+
+    config_file_names = get_config_file_names(args.config)
+    snp_file_names = get_snp_file_names(args.inputs)
+    sample_names = get_sample_names(snp_file_names)
+    condition_classes = {config_data["python_module"]: get_condition_class(config_data["python_module"], config_data["class_constructor"])
+                         for config_data in map(get_config, config_file_names)}
+    allele_columns = {condition_name: condition_class.ALLELE_COLUMN for condition_name, condition_class in condition_classes.items()} # allele frequencies of cohort aggregates
+    if args.aggregate is not None:
+        for condition_name, condition_class in condition_classes.items():
+            check_allele_column(condition_name, condition_class.RESULT_COLUMNS, condition_class.ALLELE_COLUMN)
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Scanning {len(snp_file_names)} SNP files for {len(config_file_names)} conditions with {args.workers} workers")
+
+    # Work plan shared by all workers of a distributed batch scan (cohort aggregate updated from the aggregate file at plan time)
+    queue = None
+    if args.work_dir is not None:
+        queue = WorkQueue(args.work_dir, args.lease_timeout)
+        base_aggregate = load_aggregate(args.aggregate).get_data() if args.aggregate is not None else None
+        created = queue.plan(snp_file_names, sample_names, args.unit_size,
+                             settings={'output_format': args.output_format, 'aggregate': args.aggregate is not None, 'batch': args.batch},
+                             data={'batch': get_batch_name(), 'base_aggregate': base_aggregate})
+        print(f"{'Created' if created else 'Joined'} work plan of {len(queue.units)} units in {args.work_dir} ({len(queue.get_finished())} SNP files finished)")
+
+    # Scan SNP files in worker processes
+    # Results are appended to the result sink as SNP files finish (csv and json files are saved by the workers)
+    cohort_summary = []
+    cohort_results = []
+    batch = (queue.settings['batch'] or queue.data['batch']) if queue is not None else args.batch
+    result_sink = get_result_sink(args.output_format, args.output_dir, batch) if (args.output_format != 'files') and (queue is None) else None
+    aggregate = load_aggregate(args.aggregate) if (args.aggregate is not None) and (queue is None) else None
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                             initargs=(config_file_names, args.cache_dir, args.cache_size * 1024 ** 2,
+                                       args.result_cache_dir, args.result_cache_size * 1024 ** 2)) as executor, \
+            contextlib.nullcontext() if result_sink is None else result_sink, \
+            contextlib.nullcontext() if queue is None else queue:
+        if queue is not None:
+            scan_units(queue, executor, args.output_dir, args.output_format, batch, allele_columns if args.aggregate is not None else None, args.workers)
+        else:
+            files = zip(range(len(snp_file_names)), snp_file_names, sample_names)
+            for file_count, (_, summary, results, file_aggregate) in enumerate(scan_files(executor, files, args.output_dir, result_sink is None,
+                                                                                          allele_columns if aggregate is not None else None, args.workers), 1):
+                sample_name = summary[0][C_SAMPLE]
+                cohort_summary.extend(summary)
+                if file_aggregate is not None:
+                    aggregate.merge(file_aggregate)
+                for condition_name, condition_summary, snp_results in results:
+                    if result_sink is not None:
+                        result_sink.write(sample_name, condition_name, condition_summary, snp_results)
+                    else:
+                        cohort_results.append(get_cohort_results(sample_name, snp_results))
+                print(f"Scanned {file_count} out of {len(snp_file_names)} SNP files ({sample_name}: {summary[0][C_STATUS]})")
+
+        # Cohort tables of a distributed batch scan are saved by one worker from the checkpoints once all SNP files are finished
+        if queue is not None:
+            if not claim_finalize(queue):
+                print("\nAll SNP files finished, cohort tables are saved by another worker (or were saved before)")
+                raise SystemExit(0)
+            if queue.data['base_aggregate'] is not None:
+                aggregate = get_aggregate(queue.data['base_aggregate'])
+            cohort_summary, cohort_results = load_checkpoints(queue, aggregate)
+
+        # Save cohort tables (csv) and cohort aggregates (json) with their cohort tables (csv)
+        failed_count = save_cohort_tables(cohort_summary, cohort_results, aggregate, args.output_dir, args.aggregate, args.standardize)
+        if queue is not None:
+            queue.mark_done(FINALIZE_LEASE)
+
+    print(f"\nBatch scan finished ({failed_count} failed SNP files)")
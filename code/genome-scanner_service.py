@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Local scan service with preloaded conditions and SNP databases
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import collections
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from scanner import get_config_file_names, get_config, get_template_conditions, get_conditions, scan_conditions
+
+# Service settings
+CONFIG_DIR = '../config'
+HOST = '127.0.0.1'
+PORT = 8080
+QUEUE_DEPTH = 32 # requests waiting for a worker
+MAX_UPLOAD_SIZE = 512 # MB of uploaded SNP files (request body)
+UPLOAD_CHUNK_SIZE = 1024 ** 2 # bytes of request body read at once
+LATENCY_WINDOW = 1000 # requests for latency percentiles
+UPLOAD_SUFFIXES = {'zip': '.zip', 'txt': '.txt', 'tsv': '.tsv', 'csv': '.csv', 'vcf': '.vcf'}
+
+# Configs, SNP databases and compiled risk rules loaded once per worker process (by condition name)
+worker_configs = None
+worker_templates = None
+
+# Get condition name for config data
+def get_condition_name(config_data):
+    return config_data["python_module"]
+
+# Load configs, SNP databases and compiled risk rules once per worker process
+def init_worker(config_file_names):
+
+    global worker_configs, worker_templates
+    configs = [get_config(config_file_name) for config_file_name in config_file_names]
+    worker_configs = {get_condition_name(config_data): config_data for config_data in configs}
+    worker_templates = dict(zip(worker_configs.keys(), get_template_conditions(configs)))
+
+# Scan SNP file for conditions (by name) and return results payloads (csv text and json object per condition)
+def scan_request(snp_file_name, condition_names):
+
+    configs = [worker_configs[condition_name] for condition_name in condition_names]
+    templates = [worker_templates[condition_name] for condition_name in condition_names]
+    conditions = get_conditions(configs, snp_file_name, None, templates, tsv_workers=1) # requests in parallel
+
+    # Progress output of single scans is not shown
+    with contextlib.redirect_stdout(io.StringIO()):
+        scan_conditions(conditions)
+
+    payloads = {}
+    for condition_name, condition in zip(condition_names, conditions):
+        results_csv, results_json = condition.get_results_payloads()
+        payloads[condition_name] = {"csv": results_csv, "json": results_json}
+    return payloads
+
+class ScanService:
+    def __init__(self, config_file_names, workers, queue_depth, max_upload_size=MAX_UPLOAD_SIZE * 1024 ** 2):
+        self.condition_names = [get_condition_name(get_config(config_file_name)) for config_file_name in config_file_names]
+        self.workers = workers
+        self.queue_depth = queue_depth
+        self.max_upload_size = max_upload_size # bytes
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(config_file_names,))
+
+        # Start worker processes (and preload conditions) right away
+        for future in [self.executor.submit(os.getpid) for _ in range(workers)]:
+            future.result()
+
+        # Request metrics
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.counts = collections.Counter()
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+
+    # Reserve a slot for a request (False if workers and queue are full)
+    def reserve(self):
+        with self.lock:
+            if self.pending >= self.workers + self.queue_depth:
+                self.counts['rejected'] += 1
+                return False
+            self.pending += 1
+            return True
+
+    # Release slot of a request and record its latency
+    def release(self, latency, succeeded):
+        with self.lock:
+            self.pending -= 1
+            self.counts['succeeded' if succeeded else 'failed'] += 1
+            self.latencies.append(latency)
+
+    # Scan SNP file for conditions in worker process
+    def scan(self, snp_file_name, condition_names):
+        return self.executor.submit(scan_request, snp_file_name, condition_names).result()
+
+    # Get service metrics (request counts and latency percentiles in seconds)
+    def get_metrics(self):
+        with self.lock:
+            latencies = np.array(self.latencies)
+            metrics = {
+                "conditions": self.condition_names,
+                "workers": self.workers,
+                "queue_depth": self.queue_depth,
+                "pending": self.pending,
+                "requests": dict(self.counts)
+            }
+        if len(latencies):
+            metrics["latency"] = {
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "p99": float(np.percentile(latencies, 99)),
+                "max": float(latencies.max())
+            }
+        return metrics
+
+    # Stop worker processes
+    def shutdown(self):
+        self.executor.shutdown()
+
+class ScanRequestHandler(BaseHTTPRequestHandler):
+    service = None
+
+    # Send JSON response (connection closed after the response if close, e.g. with a request body not read)
+    def send_json(self, status, content, close=False):
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if close:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Copy request body of given length in chunks into file (discarded if no file is given)
+    def copy_body(self, length, file=None):
+        while length > 0:
+            chunk = self.rfile.read(min(length, UPLOAD_CHUNK_SIZE))
+            if not chunk:
+                raise ConnectionError(f"Request body ended {length} bytes before its Content-Length")
+            if file is not None:
+                file.write(chunk)
+            length -= len(chunk)
+
+    # Send JSON response to a request rejected before reading its body (body read and discarded first,
+    # so the client is not reset while still sending it)
+    def reject(self, status, content, content_length):
+        self.copy_body(content_length)
+        self.send_json(status, content)
+
+    # GET /conditions: names of preloaded conditions
+    # GET /metrics: request counts and latency percentiles
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == '/conditions':
+            self.send_json(200, self.service.condition_names)
+        elif path == '/metrics':
+            self.send_json(200, self.service.get_metrics())
+        else:
+            self.send_json(404, {"error": f"Unknown path {path}"})
+
+    # POST /scan?path=<SNP file>&conditions=<name,...>: scan SNP file on the local file system
+    # POST /scan?format=zip&conditions=<name,...>: scan uploaded SNP file (request body of at most the maximum upload size)
+    # Responds with csv text and json object per condition (default: all conditions)
+    def do_POST(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+
+        # Length of request body checked before reading it (connection closed if the body cannot be read)
+        content_length = self.headers.get('Content-Length')
+        if (content_length is None) and ('path' not in query):
+            self.send_json(411, {"error": "Content-Length of uploaded SNP file required"}, close=True)
+            return
+        try:
+            content_length = int(content_length) if content_length is not None else 0
+        except ValueError:
+            content_length = -1
+        if content_length < 0:
+            self.send_json(400, {"error": f"Invalid Content-Length {self.headers.get('Content-Length')}"}, close=True)
+            return
+        if content_length > self.service.max_upload_size:
+            self.send_json(413, {"error": f"Uploaded SNP file larger than {self.service.max_upload_size} bytes"}, close=True)
+            return
+
+        if url.path != '/scan':
+            self.reject(404, {"error": f"Unknown path {url.path}"}, content_length)
+            return
+        condition_names = query['conditions'][0].split(',') if 'conditions' in query else self.service.condition_names
+        unknown_condition_names = [name for name in condition_names if name not in self.service.condition_names]
+        if len(unknown_condition_names):
+            self.reject(400, {"error": f"Unknown conditions {unknown_condition_names}"}, content_length)
+            return
+
+        # Reject request if workers and queue are full
+        if not self.service.reserve():
+            self.reject(503, {"error": "Too many requests"}, content_length)
+            return
+
+        start_time = time.perf_counter()
+        upload_file_name = None
+        succeeded = False
+        try:
+            if 'path' in query:
+                snp_file_name = query['path'][0]
+                self.copy_body(content_length)
+            else:
+                upload_suffix = UPLOAD_SUFFIXES.get(query.get('format', ['zip'])[0], '.zip')
+                with tempfile.NamedTemporaryFile(suffix=upload_suffix, delete=False) as upload_file:
+                    upload_file_name = snp_file_name = upload_file.name
+                    self.copy_body(content_length, upload_file)
+
+            payloads = self.service.scan(snp_file_name, condition_names)
+            succeeded = True
+            self.send_json(200, payloads)
+        except Exception as error:
+            self.send_json(500, {"error": f"{type(error).__name__}: {error}"})
+        finally:
+            if upload_file_name is not None:
+                os.remove(upload_file_name)
+            self.service.release(time.perf_counter() - start_time, succeeded)
+
+    # Request log only for errors
+    def log_request(self, code='-', size='-'):
+        if isinstance(code, int) and code >= 400:
+            super().log_request(code, size)
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--config', nargs='+', default=[CONFIG_DIR], help="config files or directories of config files")
+    parser.add_argument('--host', default=HOST, help="host to bind to (local only by default)")
+    parser.add_argument('--port', type=int, default=PORT, help="port to bind to")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="number of worker processes (default: number of CPUs)")
+    parser.add_argument('--queue-depth', type=int, default=QUEUE_DEPTH, help="maximum number of requests waiting for a worker")
+    parser.add_argument('--max-upload-size', type=int, default=MAX_UPLOAD_SIZE, help="maximum size of uploaded SNP files in MB")
+    args = parser.parse_args()
+
+    # Preload conditions and SNP databases in worker processes
+    service = ScanService(get_config_file_names(args.config), args.workers, args.queue_depth, args.max_upload_size * 1024 ** 2)
+    ScanRequestHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), ScanRequestHandler)
+    print(f"Scan service for {', '.join(service.condition_names)} listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.shutdown()
+        print("\nScan service stopped")
@@ -9,54 +9,111 @@ __version__ = "1.0.0"
 __maintainer__ = "Melanie Senn"
 __email__ = "melanie.senn@gmail.com"
 
-import importlib
-import sys
-import json
-
-# Import a module dynamically and instantiates an object
-def import_and_instantiate(module_name, class_name, *args, **kwargs):
-
-    module = importlib.import_module(module_name)
-    class_ = getattr(module, class_name)
-    return class_(*args, **kwargs)
+import argparse
+import os
+from scanner import import_and_instantiate, get_config_file_names, get_config, get_conditions, scan_conditions, get_results_file_names
+from condition import TSV_WORKERS
+from result_sink import V_NDJSON, V_COLUMNAR
+from instrumentation import Metrics, profiling
 
 if __name__ == '__main__':
 
-    # SNP file name
-    snp_file_name = None
-
     # Check command line arguments
-    args = sys.argv
-    if len(args) > 1:
-        # Get the first argument as the condition's config
-        condition_config = args[1]
-    else:
+    # Config files (or directories of config files) first, followed by the user's SNP file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('paths', nargs='*', help="config files or directories of config files, followed by the user's SNP file (23andMe, AncestryDNA, MyHeritage or VCF)")
+    parser.add_argument('--cache-dir', help="directory of the genotype cache (no caching if not specified)")
+    parser.add_argument('--cache-size', type=int, default=1024, help="maximum size of the genotype cache in MB")
+    parser.add_argument('--result-cache-dir', help="directory of the result cache for incremental re-scans (no caching if not specified)")
+    parser.add_argument('--result-cache-size', type=int, default=256, help="maximum size of the result cache in MB")
+    parser.add_argument('--workers', type=int, default=TSV_WORKERS, help="number of threads reading the TSV files of the zip file in parallel")
+    parser.add_argument('--early-stop', action='store_true', help="stop reading the TSV files once all database SNPs are found (SNPs found again later are not detected as ambiguous)")
+    parser.add_argument('--lite', action='store_true', help="scan without numpy and pandas (small SNP databases only, no genotype cache)")
+    parser.add_argument('--startup-report', action='store_true', help="report import times of the scan (python -X importtime) and exit")
+    parser.add_argument('--markdown', action='store_true', help="print results as markdown table")
+    parser.add_argument('--output-format', choices=['files', V_NDJSON, V_COLUMNAR], default='files',
+                        help="save results as csv and json files (current directory) or append them to NDJSON or columnar files (partitioned by condition and batch)")
+    parser.add_argument('--output-dir', default='results', help="directory of NDJSON or columnar results")
+    parser.add_argument('--batch', help="batch partition of NDJSON or columnar results (default: start time)")
+    parser.add_argument('--progress', action='store_true', help="print progress messages (e.g. number of SNPs found)")
+    parser.add_argument('--metrics', help="json file of stage timings and counters (not saved if not specified)")
+    parser.add_argument('--profile', help="file of cProfile statistics of the scan (no profiling if not specified)")
+    parser.add_argument('--trace-memory', action='store_true', help="trace memory of the scan (peak and top allocations in the metrics)")
+    args = parser.parse_args()
+    config_paths = [path for path in args.paths if path.endswith('.json') or os.path.isdir(path)]
+    other_paths = [path for path in args.paths if path not in config_paths]
+    if len(config_paths) == 0:
         print("You need to provide at least the config file as the first command line parameter")
         exit(0)
-    if len(args) > 2:
-        # Get the second argument as the user's SNP file
-        snp_file_name = args[2]
 
-    with open(condition_config, "r") as config_file:
-        config_data = json.load(config_file)
+    # SNP file name
+    snp_file_name = None
+    if len(other_paths) > 0:
+        # Get the argument after the config files as the user's SNP file
+        snp_file_name = other_paths[0]
+
+    # Genotype cache
+    genotype_cache = None
+    if args.cache_dir is not None:
+        from genotype_cache import GenotypeCache
+        genotype_cache = GenotypeCache(args.cache_dir, args.cache_size * 1024 ** 2)
+
+    # Result cache
+    result_cache = None
+    if args.result_cache_dir is not None:
+        from result_cache import ResultCache
+        result_cache = ResultCache(args.result_cache_dir, args.result_cache_size * 1024 ** 2)
 
-    # Import module and instantiate object for specific condition with config data
-    condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
-                                       snp_file_name, config_data["snp_database"])
+    configs = [get_config(config_file_name) for config_file_name in get_config_file_names(config_paths)]
 
-    # Get content from TSV files
-    condition.get_tsv_content()
+    # Report import times of lightweight and full scan
+    if args.startup_report:
+        from startup import print_startup_report
+        print_startup_report([config_data["python_module"] for config_data in configs])
+        exit(0)
+
+    # Stage timings and counters of all conditions
+    metrics = Metrics(progress=args.progress)
 
-    # Load SNP database
-    condition.get_snp_db()
+    # Lightweight scan without numpy and pandas
+    if args.lite:
+        import lite
+        conditions = [import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
+                                             snp_file_name, config_data["snp_database"]) for config_data in configs]
+        if (snp_file_name is None) or (genotype_cache is not None) or (result_cache is not None) or (args.output_format != 'files') \
+                or not lite.is_small_db(conditions):
+            print(f"The lightweight scan needs a SNP file, no genotype or result cache, csv and json files as output and SNP databases of at most {lite.LITE_MAX_DB_ROWS} rows scored by risk rules")
+            exit(0)
+        for condition in conditions:
+            condition.metrics = metrics
+            condition.early_stop = args.early_stop
+        with profiling(metrics, args.profile, args.trace_memory):
+            condition_results = lite.scan_conditions(conditions)
+            for config_data, condition, results in zip(configs, conditions, condition_results):
+                lite.save_results(condition, results, *get_results_file_names(config_data, len(conditions) > 1), args.markdown)
+    else:
+        with profiling(metrics, args.profile, args.trace_memory):
 
-    # Get results for SNPs found in TSV content and SNP database
-    condition.get_snp_results()
+            # Import modules and instantiate objects for specific conditions with config data, load SNP databases
+            conditions = get_conditions(configs, snp_file_name, genotype_cache, metrics=metrics, tsv_workers=args.workers, early_stop=args.early_stop,
+                                        result_cache=result_cache)
 
-    # Summarize results
-    condition.summarize_results()
+            # Get results and summaries for SNPs found in TSV content and SNP databases
+            scan_conditions(conditions)
 
-    # Save results (csv and json)
-    condition.save_results("results.csv", "results.json")
+            # Save results (csv and json files or result sink)
+            if args.output_format == 'files':
+                for config_data, condition in zip(configs, conditions):
+                    condition.save_results(*get_results_file_names(config_data, len(conditions) > 1), args.markdown)
+            else:
+                from result_sink import get_result_sink
+                sample = os.path.splitext(os.path.basename(conditions[0].snp_file_name))[0]
+                with get_result_sink(args.output_format, args.output_dir, args.batch) as result_sink:
+                    for condition in conditions:
+                        if args.markdown:
+                            print('\nResults\n' + condition.get_results_table().to_markdown())
+                        condition.write_results(result_sink, sample)
 
+    if args.metrics is not None:
+        metrics.save(args.metrics)
     print("\nScan finished")
@@ -12,154 +12,413 @@ __email__ = "melanie.senn@gmail.com"
 from pysam import VariantFile
 import numpy as np
 import pandas as pd
-from tkinter import filedialog as fd
+import argparse
+import gzip
+import json
+import os
+from condition import C_APPLICATION, C_SNP, C_GENOTYPE, C_RISK, C_MAX_RISK, C_SAMPLE
+from instrumentation import Metrics, profiling
+from snp_db_bundle import get_bundle
+from snp_reader import decode_gt, read_line_blocks, get_snp_keys, get_wanted_keys, is_wanted, locate_snp_fields
+from scanner import import_and_instantiate, get_condition_class
+from loci import C_CHROMOSOME, C_POSITION, C_REF, C_ALT, ALT_SEPARATOR, normalize_chromosome, get_genome_build, get_loci, get_snp_loci
 
 # Name constants
-C_APPLICATION = 'Application'
-C_CONDITION = 'Condition'
-C_SNP = 'SNP'
-C_GENE = 'Gene/locus'
-C_GENOTYPE = 'Genotype'
-C_RISK_ALLELE = 'Risk allele'
-C_PROTECTIVE_ALLELE = 'Protective allele'
-C_REFERENCE = 'Reference'
-C_ASSOCIATION = 'Association'
-V_DIAGNOSIS = 'Diagnosis'
-V_TREATMENT = 'Treatment'
-ASSOCIATIONS_DIAGNOSIS = ['Average risk', 'Small increase in risk', 'Increased risk']
-ASSOCIATIONS_TREATMENT = ['clinical response']
-
-# Get association for result row
-def get_association(result_row):
-
-    association = ''
-    application = result_row[C_APPLICATION]
-    if application == V_DIAGNOSIS:
-        
-        # Risk = 0: if risk allele not found in genotype
-        # Risk = 1: if risk allele found once in genotype
-        # Risk = 2: if risk allele found twice in genotype
-        risk = result_row[C_GENOTYPE].count(result_row[C_RISK_ALLELE])
-        assert((risk < 2) or (risk > 0))
-        association = ASSOCIATIONS_DIAGNOSIS[risk]
-    elif V_TREATMENT in application:
-        
-        # Break down application string
-        application, medication, response = application.split('_')
-        association = 'Unknown ' + ASSOCIATIONS_TREATMENT[0] + ' for ' + medication
-        risk_allele = result_row[C_RISK_ALLELE]
-        len_risk_allele = len(risk_allele)
-        genotype = result_row[C_GENOTYPE]
-        
-        # One risk allele given by snpdb (paper reference)
-        if len_risk_allele == 1:     
-            risk = genotype.count(risk_allele)
-            assert((risk < 2) or (risk > 0))
-            if risk > 0:
-                association = response + ' ' + ASSOCIATIONS_TREATMENT[0] + ' for ' + medication
-        
-        # Two combined risk alleles as genotype given by snpdb (paper reference)
-        elif len_risk_allele == 2:  
-            reversed_genotype = genotype[::-1]
-            if (risk_allele == genotype) or (risk_allele == reversed_genotype):
-                association = response + ' ' + ASSOCIATIONS_TREATMENT[0] + ' for ' + medication
-    
-    return association
-
-# Get genotype for record
-def get_genotype(record):
-    
-    genotype = 'II' # Invalid genotype
-
-    # Currently do not handle delete/insert
-    # Reference: reference genome
-    # Alt: studied sample
-    # GT: 0 reference allele, 1 alternative allele
-    # If ref_len > alt_len --> delete, if ref_len < alt_len --> insert
-    ref_len = len(record.ref)   
-    if record.alts == None: # no data available
-        return genotype
-    alt_len = len(record.alts)
-    assert(ref_len == alt_len)  
-
-    # For details on genotype see pysam documentation
-    sample_id = record.samples.keys()[0]
-    genotype_binary = record.samples[sample_id]['GT']
-    
-    assert(genotype_binary != (0, 0)) # (0, 0) should never happen
-    if (genotype_binary == (1, 1)): # Homozygous alt
-        genotype = record.alts[0] + record.alts[0]
-    elif (genotype_binary == (0, 1)): # Heterozygous
-        genotype = record.ref + record.alts[0]
-    elif (genotype_binary == (0, 0)): # Homozygous ref
-        genotype = record.ref + record.ref
-    #print(f"Binary genotype {genotype_binary}")
-    
-    return genotype
-
-# Get results from VCF file for database SNPs
-def get_snp_results(database, vcf_file):
-    
-    # Create empty results table
-    result_columns=[C_CONDITION, C_APPLICATION, C_SNP, C_GENE, C_GENOTYPE, C_RISK_ALLELE, C_PROTECTIVE_ALLELE, C_ASSOCIATION, C_REFERENCE]
-    results = pd.DataFrame(columns=result_columns)
-
-    # Find results in VCF file for each SNP in database 
-    for db_index in database.index:
-        current_SNP = database[C_SNP][db_index]
-        print(f"Scanning for SNP {current_SNP} ({db_index + 1} out of {len(database.index)})")
-        records = vcf_file.fetch()
-        for record in records:
-            if (record.id == current_SNP):
-                print(f"Found SNP {current_SNP}")
-                result_entry = len(results.index)
-                results.loc[result_entry, C_SNP] = current_SNP
-                results.loc[result_entry, C_CONDITION] = database[C_CONDITION][db_index]
-                results.loc[result_entry, C_APPLICATION] = database[C_APPLICATION][db_index]
-                results.loc[result_entry, C_GENE] = database[C_GENE][db_index]
-                results.loc[result_entry, C_REFERENCE] = database[C_REFERENCE][db_index]
-                results.loc[result_entry, C_RISK_ALLELE] = database[C_RISK_ALLELE][db_index]
-                results.loc[result_entry, C_PROTECTIVE_ALLELE] = database[C_PROTECTIVE_ALLELE][db_index]
-                results.loc[result_entry, C_GENOTYPE] = get_genotype(record)
-                results.loc[result_entry, C_ASSOCIATION] = get_association(results.loc[result_entry])
+C_METRICS_SCOPE = 'vcf'
+V_MATCH_ID = 'id' # match records by SNP ID
+V_MATCH_POSITION = 'position' # match records by chromosome, position and alleles (VCF files without SNP IDs)
+V_COMPRESSION_NONE = 'NONE' # compression of plain-text VCF files (pysam)
+VCF_SNP_FIELD = 2 # index of the ID field of VCF lines
+DOT = ord('.')
+
+# Stage timings and counters of the scan
+metrics = Metrics()
+
+# Get text fields of VCF record (as written in the VCF file)
+def get_record_fields(record):
+    return str(record).rstrip('\n').split('\t')
+
+# Get alleles of VCF line (text fields), reference allele first
+def get_alleles(fields):
+    return [fields[3]] + (fields[4].split(',') if fields[4] != '.' else [])
+
+# Get genotypes of VCF line (text fields) for samples (by sample index) as array
+# GT values are decoded once per distinct value, not once per sample
+def get_sample_genotypes(fields, sample_indices):
+
+    sample_fields = np.array(fields[9:])[sample_indices]
+    gt_values = np.char.partition(sample_fields, ':')[:, 0] # GT is the first FORMAT field
+    unique_gt_values, gt_inverse = np.unique(gt_values, return_inverse=True)
+    alleles = get_alleles(fields)
+    unique_genotypes = np.array([decode_gt(gt_value, alleles) for gt_value in unique_gt_values], dtype=object)
+    return unique_genotypes[gt_inverse]
+
+# Get genotype of VCF line (text fields) for the first sample (decoded as by the VCF reader of other scans)
+def get_genotype(fields):
+    return decode_gt(fields[9].split(':', 1)[0], get_alleles(fields))
+
+# Check if VCF file can be scanned line by line (plain-text or gzip-compressed VCF file, not BCF or stream)
+def is_line_scannable(vcf_file):
+    return (vcf_file.format == 'VCF') and os.path.isfile(vcf_file.filename)
+
+# Get genotypes from plain-text or gzip-compressed VCF file for a set of SNPs (single pass over lines of VCF file)
+# The SNP IDs (third field) of a block of lines are located and looked up at once,
+# only lines of wanted SNPs are split into fields and decoded (no record objects for other lines)
+def get_snp_genotypes_by_line(snps, file_name, compressed, get_line_genotype=get_genotype):
+
+    # First record found for each SNP
+    wanted_keys = get_wanted_keys(snps)
+    genotypes = {}
+    record_count = 0
+    no_id_count = 0
+    parsed_count = 0
+    with gzip.open(file_name, 'rb') if compressed else open(file_name, 'rb') as vcf_file:
+        for block in read_line_blocks(vcf_file):
+
+            # Locate SNP IDs (third field) of the lines of block (header and short lines are no records)
+            buf, line_starts, line_ends, id_starts, id_ends, records = locate_snp_fields(block, VCF_SNP_FIELD)
+            no_ids = records & (id_ends - id_starts == 1) & (buf[id_starts] == DOT)
+
+            # Parse lines of SNP IDs with wanted keys
+            candidates = np.flatnonzero(records & is_wanted(get_snp_keys(buf, id_starts, id_ends), wanted_keys))
+            last_line = len(line_ends) - 1
+            for line in candidates:
+                snp = block[id_starts[line]:id_ends[line]].decode()
+                if (snp in snps) and (snp not in genotypes):
+                    genotypes[snp] = get_line_genotype(block[line_starts[line]:line_ends[line]].decode().rstrip('\r').split('\t'))
+                    parsed_count += 1
+
+                    # Stop early once every SNP has been found
+                    if len(genotypes) == len(snps):
+                        last_line = line
+                        break
+
+            record_count += int(np.count_nonzero(records[:last_line + 1]))
+            no_id_count += int(np.count_nonzero(no_ids[:last_line + 1]))
+            if len(genotypes) == len(snps):
+                break
+
+    metrics.add('load_genotypes', rows=record_count)
+    metrics.count(C_METRICS_SCOPE, records_scanned=record_count, records_without_id=no_id_count, records_parsed=parsed_count,
+                  found_scanned=len(genotypes))
+    return genotypes
+
+# Get genotypes from VCF file for a set of SNPs (single pass over VCF file)
+# Plain-text and gzip-compressed VCF files are scanned line by line, other files (e.g. BCF) record by record
+def get_snp_genotypes(snps, vcf_file, get_line_genotype=get_genotype):
+
+    if is_line_scannable(vcf_file):
+        return get_snp_genotypes_by_line(snps, vcf_file.filename, vcf_file.compression != V_COMPRESSION_NONE, get_line_genotype)
+
+    # First record found for each SNP
+    genotypes = {}
+    records = vcf_file.fetch()
+    record_count = 0
+    no_id_count = 0
+    for record_count, record in enumerate(records, 1):
+        if record.id is None:
+            no_id_count += 1
+        elif (record.id in snps) and (record.id not in genotypes):
+            genotypes[record.id] = get_line_genotype(get_record_fields(record))
+
+            # Stop early once every SNP has been found
+            if len(genotypes) == len(snps):
+                break
+
+    metrics.add('load_genotypes', rows=record_count)
+    metrics.count(C_METRICS_SCOPE, records_scanned=record_count, records_without_id=no_id_count, found_scanned=len(genotypes))
+    return genotypes
+
+# Check if alleles of record match reference and alternative alleles of locus (unknown alleles match any record)
+def is_allele_match(record, ref, alt):
+
+    if isinstance(ref, str) and (record.ref != ref):
+        return False
+    if isinstance(alt, str) and not set(alt.split(ALT_SEPARATOR)).intersection(record.alts or []):
+        return False
+    return True
+
+# Get genotypes from position-sorted VCF file for SNPs with known loci by chromosome, position and alleles
+# Loci are sorted per chromosome and merge-joined with a single pass over the VCF file (no index needed)
+def get_snp_genotypes_by_position(snp_loci, vcf_file, get_line_genotype=get_genotype):
+
+    # Sorted targets (position, SNP, reference and alternative alleles) per chromosome
+    refs = snp_loci[C_REF] if C_REF in snp_loci.columns else [None] * len(snp_loci.index)
+    alts = snp_loci[C_ALT] if C_ALT in snp_loci.columns else [None] * len(snp_loci.index)
+    targets = {}
+    for snp, chromosome, position, ref, alt in zip(snp_loci[C_SNP], snp_loci[C_CHROMOSOME], snp_loci[C_POSITION], refs, alts):
+        targets.setdefault(chromosome, []).append((position, snp, ref, alt))
+    for chromosome_targets in targets.values():
+        chromosome_targets.sort(key=lambda target: target[0])
+    next_targets = dict.fromkeys(targets, 0) # first target not passed yet per chromosome
+    last_positions = {}
+    chromosomes = {} # VCF contig name -> normalized chromosome name
+
+    genotypes = {}
+    record_count = 0
+    for record_count, record in enumerate(vcf_file.fetch(), 1):
+        if record.chrom not in chromosomes:
+            chromosomes[record.chrom] = normalize_chromosome(record.chrom)
+        chromosome = chromosomes[record.chrom]
+        chromosome_targets = targets.get(chromosome)
+        if chromosome_targets is None:
+            continue
+        if record.pos < last_positions.get(chromosome, 0):
+            raise ValueError(f"VCF file is not sorted by position (chromosome {record.chrom}, position {record.pos})")
+        last_positions[chromosome] = record.pos
+
+        # Skip targets before the record (not in VCF file)
+        target_index = next_targets[chromosome]
+        while (target_index < len(chromosome_targets)) and (chromosome_targets[target_index][0] < record.pos):
+            target_index += 1
+        next_targets[chromosome] = target_index
+
+        # Match targets at the position of the record (several records or targets may share a position)
+        while (target_index < len(chromosome_targets)) and (chromosome_targets[target_index][0] == record.pos):
+            _, snp, ref, alt = chromosome_targets[target_index]
+            if (snp not in genotypes) and is_allele_match(record, ref, alt):
+                genotypes[snp] = get_line_genotype(get_record_fields(record))
+            target_index += 1
+
+        # Stop early once every SNP has been found
+        if len(genotypes) == len(snp_loci.index):
+            break
+
+    metrics.add('load_genotypes', rows=record_count)
+    metrics.count(C_METRICS_SCOPE, records_scanned=record_count, found_by_position=len(genotypes))
+    return genotypes
+
+# Get genotypes from indexed VCF file for SNPs with known loci (region lookups)
+def get_snp_genotypes_indexed(snp_loci, vcf_file, get_line_genotype=get_genotype):
+
+    # Map normalized chromosome names to VCF contig names (e.g. 1 -> chr1)
+    contigs = {normalize_chromosome(contig): contig for contig in vcf_file.header.contigs}
+
+    # Fetch only the bases around each SNP
+    genotypes = {}
+    lookup_count = 0
+    for snp, chromosome, position in zip(snp_loci[C_SNP], snp_loci[C_CHROMOSOME], snp_loci[C_POSITION]):
+        if chromosome not in contigs:
+            continue
+        lookup_count += 1
+        for record in vcf_file.fetch(contigs[chromosome], position - 1, position):
+            metrics.add('load_genotypes', rows=1)
+            if record.id == snp:
+                genotypes[snp] = get_line_genotype(get_record_fields(record))
                 break
 
-    return results
+    metrics.count(C_METRICS_SCOPE, region_lookups=lookup_count, found_indexed=len(genotypes))
+    return genotypes
+
+# Find genotypes in VCF file for database SNPs (region lookups for SNPs with known loci in indexed VCF file)
+# With positional matching, only SNPs with known loci are found (by chromosome, position and alleles)
+def find_snp_genotypes(database, vcf_file, snp_loci=None, get_line_genotype=get_genotype, match=V_MATCH_ID):
+
+    with metrics.stage('load_genotypes'):
+
+        # Find genotypes for SNPs with known loci by chromosome, position and alleles
+        snps = set(database[C_SNP])
+        genotypes = {}
+        if match == V_MATCH_POSITION:
+            if snp_loci is not None:
+                genotypes = get_snp_genotypes_by_position(snp_loci, vcf_file, get_line_genotype)
+                snps = snps - set(snp_loci[C_SNP])
+            metrics.count(C_METRICS_SCOPE, missing_loci=len(snps))
+            snps = set()
+
+        # Find genotypes for SNPs with known loci by region lookups (indexed VCF file only)
+        elif (snp_loci is not None) and (vcf_file.index is not None):
+            genotypes = get_snp_genotypes_indexed(snp_loci, vcf_file, get_line_genotype)
+            snps = snps - set(snp_loci[C_SNP])
+
+        # Find genotypes for remaining SNPs in a single pass over VCF file
+        if len(snps):
+            genotypes.update(get_snp_genotypes(snps, vcf_file, get_line_genotype))
+
+    snp_count = database[C_SNP].nunique()
+    metrics.count(C_METRICS_SCOPE, found=len(genotypes), missing=snp_count - len(genotypes), db_rows=len(database.index))
+    metrics.progress(f"Found {len(genotypes)} out of {snp_count} SNPs")
+
+    return genotypes
+
+# Get results from VCF file for database SNPs of condition (first sample)
+# Genotypes found in the VCF file are matched and scored by the condition as the genotypes of other SNP files
+def get_snp_results(condition, vcf_file, snp_loci=None, match=V_MATCH_ID):
+
+    genotypes = find_snp_genotypes(condition.snp_db, vcf_file, snp_loci, match=match)
+    condition.tsv_content = pd.DataFrame({0: list(genotypes), 1: None, 2: None, 3: list(genotypes.values())}, columns=[0, 1, 2, 3])
+    condition.get_tsv_index()
+    condition.get_snp_results()
+    return condition.snp_results
+
+# Get genotype matrix (samples x SNPs) from multi-sample VCF file for database SNPs
+# Each matched record is read once and decoded for all (or the selected) samples
+def get_cohort_genotypes(database, vcf_file, snp_loci=None, samples=None, match=V_MATCH_ID):
+
+    vcf_samples = list(vcf_file.header.samples)
+    if samples is None:
+        samples = vcf_samples
+    sample_indices = np.array([vcf_samples.index(sample) for sample in samples], dtype=int)
+
+    genotypes = find_snp_genotypes(database, vcf_file, snp_loci,
+                                   lambda fields: get_sample_genotypes(fields, sample_indices), match)
+    snps = [snp for snp in database[C_SNP].unique() if snp in genotypes]
+    genotypes = pd.DataFrame({snp: genotypes[snp] for snp in snps}, index=pd.Index(samples, name=C_SAMPLE), columns=snps)
+
+    return genotypes
+
+# Get cohort results for condition from genotype matrix
+# Results are scored with the condition's compiled risk rules in one vectorized gather
+# Returns risk matrix (samples x database SNPs) and per-sample results (long table)
+def get_cohort_results(condition, genotypes):
+
+    result_columns = condition.RESULT_COLUMNS + [C_RISK, C_MAX_RISK]
+    db_rows = np.flatnonzero(condition.snp_db[C_SNP].isin(genotypes.columns))
+    matches = condition.snp_db.iloc[db_rows]
+    sample_count = len(genotypes.index)
 
-# Load SNP database
-def get_snpdb(db_filename):
+    # Per-sample results (database rows x samples), scored in stage 'score' of the condition's metrics
+    sample_results = matches.iloc[np.repeat(np.arange(len(db_rows)), sample_count)].reset_index(drop=True).reindex(columns=result_columns)
+    sample_results.insert(0, C_SAMPLE, np.tile(genotypes.index.values, len(db_rows)))
+    sample_results[C_GENOTYPE] = genotypes[matches[C_SNP]].values.T.ravel()
+    condition.score_results(sample_results, np.repeat(db_rows, sample_count))
 
-    database = pd.read_csv(db_filename)
+    # Risk matrix
+    risks = pd.DataFrame(sample_results[C_RISK].values.reshape(len(db_rows), sample_count).T, index=genotypes.index,
+                         columns=pd.MultiIndex.from_frame(matches.reindex(columns=[C_APPLICATION, C_SNP, condition.ALLELE_COLUMN])))
+
+    return risks, sample_results
+
+# Get summary of condition per sample from per-sample results (single grouped reduction)
+def get_cohort_summary(condition, sample_results):
+
+    with metrics.stage('summarize') as stage:
+        rel_risks = condition.get_rel_risks(sample_results)
+        summary = condition.summarize_rel_risk_table(rel_risks)
+        stage["rows"] += len(summary.index)
+    return summary.reset_index(names=C_SAMPLE)
+
+# Load SNP database of condition class
+def get_snpdb(db_filename, condition_class):
+
+    with metrics.stage('load_db') as stage:
+        bundle = get_bundle()
+        if (bundle is not None) and bundle.contains(db_filename, condition_class):
+            database = bundle.get_snp_db(db_filename, condition_class)
+        else:
+            database = pd.read_csv(db_filename)
+        stage["rows"] += len(database.index)
     return database
 
 # Get VCF file from user selection
-def get_vcf_file():
+def get_vcf_file(file_name=None):
 
-    file_types = (('vcf files', '*.vcf'), ('All files', '*.*'))
-    file_name = fd.askopenfilename(title='Open a VCF file', initialdir='/', filetypes=file_types)
+    if file_name is None:
+        from tkinter import filedialog as fd # GUI only loaded for file selection
+        file_types = (('vcf files', '*.vcf *.vcf.gz'), ('All files', '*.*'))
+        file_name = fd.askopenfilename(title='Open a VCF file', initialdir='/', filetypes=file_types)
     file = VariantFile(file_name)
 
     return file
 
 if __name__ == '__main__':
-    
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('config', nargs='?', help="config file of the condition")
+    parser.add_argument('vcf_file', nargs='?', help="user's VCF file (selected by input dialog if not specified)")
+    parser.add_argument('build', nargs='?', help="genome build of the VCF file, e.g. GRCh38 (detected from VCF header if not specified)")
+    parser.add_argument('--cohort', action='store_true', help="scan all samples of a multi-sample VCF file")
+    parser.add_argument('--samples', help="comma separated samples to scan in cohort mode (default: all samples)")
+    parser.add_argument('--standardize', action='store_true', help="standardize polygenic scores across the samples in cohort mode (z-scores)")
+    parser.add_argument('--aggregate', help="json file of cohort aggregates updated with the samples in cohort mode and saved as cohort tables (not aggregated if not specified)")
+    parser.add_argument('--match', choices=[V_MATCH_ID, V_MATCH_POSITION], default=V_MATCH_ID,
+                        help="match VCF records by SNP ID or by chromosome, position and alleles of the loci file (VCF files without SNP IDs)")
+    parser.add_argument('--markdown', action='store_true', help="print results as markdown table")
+    parser.add_argument('--progress', action='store_true', help="print progress messages (e.g. number of SNPs found)")
+    parser.add_argument('--metrics', help="json file of stage timings and counters (not saved if not specified)")
+    parser.add_argument('--profile', help="file of cProfile statistics of the scan (no profiling if not specified)")
+    parser.add_argument('--trace-memory', action='store_true', help="trace memory of the scan (peak and top allocations in the metrics)")
+    args = parser.parse_args()
+    if args.config is None:
+        print("You need to provide at least the config file as the first command line parameter")
+        exit(0)
+    build = args.build
+    metrics.progress_enabled = args.progress
+
+    with open(args.config, "r") as config_file:
+        config_data = json.load(config_file)
+
     # Get VCF file
-    vcf_file = get_vcf_file()
+    vcf_file = get_vcf_file(args.vcf_file)
 
-    # Load SNP database
-    snpdb = get_snpdb('../db/snpdb_sa.csv')
+    with profiling(metrics, args.profile, args.trace_memory):
 
-    # Get results for SNPs found in VCF file and SNP database
-    results = get_snp_results(snpdb, vcf_file)
+        # Load SNP database
+        snpdb = get_snpdb(config_data["snp_database"], get_condition_class(config_data["python_module"], config_data["class_constructor"]))
 
-    # Print SNP database
-    #print('\nSNP Database\n' + snpdb.to_markdown())
+        # Get loci of database SNPs for genome build of VCF file (for region lookups in indexed VCF file)
+        # Loci files are next to the SNP database
+        if build is None:
+            build = get_genome_build(vcf_file.header)
+        snp_loci = get_snp_loci(snpdb, get_loci(build, os.path.dirname(config_data["snp_database"])) if build is not None else None)
+        if (args.match == V_MATCH_POSITION) and (snp_loci is None):
+            print(f"Matching by position needs the loci of the database SNPs (loci file for genome build {build} or database columns {C_CHROMOSOME} and {C_POSITION})")
+            exit(0)
 
-    # Print results
-    results = results.drop(columns=[C_APPLICATION, C_CONDITION])
-    print('\nResults\n' + results.to_markdown())
-    results.to_csv('results.csv', index=False, sep='\t')
+        # Instantiate object for specific condition with config data
+        condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
+                                           args.vcf_file, config_data["snp_database"])
+        condition.snp_db = snpdb
+        condition.metrics = metrics
 
-    print('\nScan finished')
+        if args.cohort:
+
+            # Allele column of cohort aggregates checked before scanning
+            if args.aggregate is not None:
+                from cohort_aggregate import check_allele_column
+                check_allele_column(config_data["python_module"], condition.RESULT_COLUMNS, condition.ALLELE_COLUMN)
+
+            # Get genotypes, risks and summaries for all samples (single pass over VCF file)
+            samples = args.samples.split(',') if args.samples is not None else None
+            genotypes = get_cohort_genotypes(snpdb, vcf_file, snp_loci, samples, args.match)
+            risks, sample_results = get_cohort_results(condition, genotypes)
+            summary = get_cohort_summary(condition, sample_results)
+            if args.standardize:
+                from polygenic import standardize_scores
+                summary = standardize_scores(summary)
+
+            # Save cohort results (csv)
+            with metrics.stage('save') as stage:
+                genotypes.to_csv('cohort_genotypes.csv', sep='\t')
+                risks.to_csv('cohort_risks.csv', sep='\t')
+                summary.to_csv('cohort_summary.csv', index=False, sep='\t')
+                stage["rows"] += len(sample_results.index)
 
+            # Update cohort aggregates (json) and save their cohort tables (csv)
+            if args.aggregate is not None:
+                from cohort_aggregate import load_aggregate
+                with metrics.stage('aggregate') as stage:
+                    aggregate = load_aggregate(args.aggregate)
+                    aggregate.add(config_data["python_module"], summary, sample_results, condition.ALLELE_COLUMN)
+                    aggregate.save(args.aggregate)
+                    aggregate.save_tables('.')
+                    stage["rows"] += len(sample_results.index)
+            print(f"\nScanned {len(genotypes.index)} samples")
 
+        else:
+
+            # Get results for SNPs found in VCF file and SNP database, summarize and save them (csv and json)
+            get_snp_results(condition, vcf_file, snp_loci, args.match)
+            with metrics.stage('summarize'):
+                condition.summarize_results()
+            condition.save_results('results.csv', 'results.json', args.markdown)
+
+    # Hint at positional matching for VCF files without SNP IDs
+    vcf_counters = metrics.counters.get(C_METRICS_SCOPE, {})
+    if (vcf_counters.get('found', 0) == 0) and (vcf_counters.get('records_without_id', 0) > 0):
+        print(f"\nNo SNPs found by SNP ID in {vcf_counters['records_without_id']} records without SNP ID, try matching by position (--match position)")
+
+    if args.metrics is not None:
+        metrics.save(args.metrics)
+    print('\nScan finished')
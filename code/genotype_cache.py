@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Persistent compact binary cache of parsed genotype files
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+# Cache settings
+CACHE_VERSION = 1
+CACHE_MAX_SIZE = 1024 ** 3 # bytes
+HASH_BLOCK_SIZE = 1024 ** 2 # bytes
+META_FILE_NAME = 'meta.json'
+ARRAY_NAMES = ['snps', 'chromosomes', 'positions', 'genotypes']
+
+# Numeric SNP IDs: rs123 -> 123, i123 (23andMe internal ID) -> -123
+SNP_PATTERN = re.compile(r'^(rs|i)(\d+)$')
+
+# Convert SNP ID to number (None if SNP ID cannot be converted)
+def snp_to_number(snp):
+
+    match = SNP_PATTERN.match(str(snp))
+    if match is None:
+        return None
+    number = int(match.group(2))
+    return number if match.group(1) == 'rs' else -number
+
+# Convert numbers to SNP IDs
+def numbers_to_snps(numbers):
+    return np.where(numbers >= 0, np.char.add('rs', np.abs(numbers).astype(str)), np.char.add('i', np.abs(numbers).astype(str)))
+
+# Get content hash of file (cache key)
+def get_file_hash(file_name):
+
+    file_hash = hashlib.sha256()
+    with open(file_name, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            file_hash.update(block)
+    return file_hash.hexdigest()
+
+# Get smallest unsigned integer type for codes of distinct values (0 for missing values)
+def get_code_type(value_count):
+    return np.uint8 if value_count < np.iinfo(np.uint8).max else np.uint32
+
+class GenotypeCache:
+    def __init__(self, cache_dir, max_size=CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Get directory of cache entry
+    def get_entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    # Check if cache entry exists
+    def contains(self, key):
+        return os.path.exists(os.path.join(self.get_entry_dir(key), META_FILE_NAME))
+
+    # Store TSV content (SNP, chromosome, position, genotype) as cache entry
+    def store(self, key, tsv_content):
+
+        # Numeric SNP IDs sorted for binary search (SNP IDs which cannot be converted are not cached)
+        snps = tsv_content[0].map(snp_to_number)
+        tsv_content = tsv_content.loc[snps.notna()]
+        snps = snps.loc[snps.notna()].astype(np.int64).values
+        order = np.argsort(snps, kind='stable')
+
+        # Small integer codes for chromosomes and genotypes (0 for missing values)
+        # Codes are bytes unless there are more distinct values (e.g. indel genotypes of VCF files)
+        chromosome_codes, chromosomes = pd.factorize(tsv_content[1].astype(str))
+        genotype_codes, genotypes = pd.factorize(tsv_content[3])
+        arrays = {
+            'snps': snps[order],
+            'chromosomes': (chromosome_codes + 1).astype(get_code_type(len(chromosomes)))[order],
+            'positions': pd.to_numeric(tsv_content[2], errors='coerce').fillna(-1).astype(np.int32).values[order],
+            'genotypes': (genotype_codes + 1).astype(get_code_type(len(genotypes)))[order]
+        }
+        meta = {
+            'version': CACHE_VERSION,
+            'rows': len(order),
+            'chromosomes': [str(chromosome) for chromosome in chromosomes],
+            'genotypes': [str(genotype) for genotype in genotypes]
+        }
+
+        # Write entry to temporary directory and move it into place
+        entry_dir = self.get_entry_dir(key)
+        temp_dir = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp_')
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(temp_dir, name + '.npy'), arrays[name])
+        with open(os.path.join(temp_dir, META_FILE_NAME), 'w') as meta_file:
+            json.dump(meta, meta_file)
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError: # entry stored concurrently
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        self.evict(keep=key)
+
+    # Load TSV content (SNP, chromosome, position, genotype) from cache entry
+    # Only rows of the given SNPs (all rows if no SNPs are given) are loaded
+    def load(self, key, snps=None):
+
+        entry_dir = self.get_entry_dir(key)
+        with open(os.path.join(entry_dir, META_FILE_NAME), 'r') as meta_file:
+            meta = json.load(meta_file)
+        arrays = {name: np.load(os.path.join(entry_dir, name + '.npy'), mmap_mode='r') for name in ARRAY_NAMES}
+
+        # Mark entry as recently used
+        os.utime(os.path.join(entry_dir, META_FILE_NAME))
+
+        # Binary search for rows of given SNPs (duplicates included)
+        if snps is None:
+            rows = np.arange(meta['rows'])
+        else:
+            numbers = np.unique([number for number in map(snp_to_number, snps) if number is not None]).astype(np.int64)
+            starts = np.searchsorted(arrays['snps'], numbers, side='left')
+            ends = np.searchsorted(arrays['snps'], numbers, side='right')
+            rows = np.concatenate([np.arange(start, end) for start, end in zip(starts, ends)] + [np.array([], dtype=np.int64)])
+
+        # Decode rows
+        chromosomes = np.array([None] + meta['chromosomes'], dtype=object)
+        genotypes = np.array([None] + meta['genotypes'], dtype=object)
+        positions = pd.Series(arrays['positions'][rows])
+        tsv_content = pd.DataFrame({
+            0: numbers_to_snps(arrays['snps'][rows]).astype(object),
+            1: chromosomes[arrays['chromosomes'][rows]],
+            2: positions.where(positions >= 0).astype('Int64'),
+            3: genotypes[arrays['genotypes'][rows]]
+        })
+        return tsv_content
+
+    # Get size of cache entry in bytes
+    def get_entry_size(self, key):
+        entry_dir = self.get_entry_dir(key)
+        return sum(os.path.getsize(os.path.join(entry_dir, file_name)) for file_name in os.listdir(entry_dir))
+
+    # Evict least recently used entries (except entry to keep) until cache size is within limit
+    def evict(self, keep=None):
+
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            if self.contains(key):
+                last_used = os.path.getmtime(os.path.join(self.get_entry_dir(key), META_FILE_NAME))
+                entries.append((last_used, key, self.get_entry_size(key)))
+
+        cache_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            shutil.rmtree(self.get_entry_dir(key), ignore_errors=True)
+            cache_size -= size
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Stage timings, counters and optional profiling of scans (metrics as JSON)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import contextlib
+import json
+import threading
+import time
+
+# Instrumentation settings
+MEMORY_TOP_COUNT = 10 # allocation sites reported by memory tracing
+
+class Metrics:
+    def __init__(self, progress=False):
+        self.progress_enabled = progress
+        self.stages = {}
+        self.counters = {}
+        self.profile = None
+        self.memory = None
+        self.lock = threading.Lock() # rows and counters are added by reader threads
+
+    # Record wall time of a pipeline stage (rows and bytes processed are added to the yielded stage record)
+    # Repeated stages (e.g. per condition) are summed up
+    @contextlib.contextmanager
+    def stage(self, name):
+
+        record = self.get_stage(name)
+        start_time = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] += time.perf_counter() - start_time
+            record["calls"] += 1
+
+    # Get stage record (wall time in seconds, calls, rows and bytes processed)
+    def get_stage(self, name):
+        return self.stages.setdefault(name, {"seconds": 0.0, "calls": 0, "rows": 0, "bytes": 0})
+
+    # Add rows and bytes processed to stage record (returns item passed through, e.g. a chunk of rows)
+    def add(self, name, item=None, rows=0, bytes=0):
+
+        with self.lock:
+            record = self.get_stage(name)
+            record["rows"] += int(rows)
+            record["bytes"] += int(bytes)
+        return item
+
+    # Add to counters (e.g. SNPs found, missing, ambiguous) of scope (e.g. condition)
+    def count(self, scope, **counts):
+
+        with self.lock:
+            counters = self.counters.setdefault(scope, {})
+            for name, count in counts.items():
+                counters[name] = counters.get(name, 0) + int(count)
+
+    # Print human-readable progress (off by default)
+    def progress(self, message):
+        if self.progress_enabled:
+            print(message)
+
+    # Get metrics (json object)
+    def get_metrics(self):
+
+        metrics = {"stages": self.stages, "counters": self.counters}
+        if self.profile is not None:
+            metrics["profile"] = self.profile
+        if self.memory is not None:
+            metrics["memory"] = self.memory
+        return metrics
+
+    # Save metrics (json sidecar file)
+    def save(self, metrics_file_name):
+        with open(metrics_file_name, "w") as metrics_file:
+            json.dump(self.get_metrics(), metrics_file, indent=2)
+
+# Profile the enclosed code with cProfile (statistics saved to profile file) and/or trace its memory with tracemalloc
+# Profile file and peak memory with top allocation sites are added to the metrics
+@contextlib.contextmanager
+def profiling(metrics, profile_file_name=None, trace_memory=False):
+
+    profile = None
+    if profile_file_name is not None:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    if trace_memory:
+        import tracemalloc
+        tracemalloc.start()
+
+    try:
+        yield
+    finally:
+        if profile is not None:
+            profile.disable()
+            profile.dump_stats(profile_file_name)
+            metrics.profile = profile_file_name
+        if trace_memory:
+            _, peak_size = tracemalloc.get_traced_memory()
+            statistics = tracemalloc.take_snapshot().statistics('lineno')[:MEMORY_TOP_COUNT]
+            tracemalloc.stop()
+            metrics.memory = {
+                "peak_bytes": peak_size,
+                "top_allocations": [{"location": str(statistic.traceback), "bytes": statistic.size, "count": statistic.count} for statistic in statistics]
+            }
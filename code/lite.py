@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Lightweight scan of small SNP databases without numpy and pandas (fast startup)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import csv
+import io
+import json
+import os
+from zipfile import ZipFile
+from snp_db_bundle import get_bundle
+from snp_reader import open_genotype_file, sniff_reader, select_members, is_chromosome_match
+from loci import get_loci_chromosomes, get_snp_chromosomes
+from condition import C_SNP, C_CHROMOSOME, C_APPLICATION, C_GENOTYPE, C_ASSOCIATION, C_RISK, C_MAX_RISK, C_SNP_FILE_SCOPE, NO_REL_RISK, RESULT_COLUMNS
+
+# Lightweight scan settings
+LITE_MAX_DB_ROWS = 1000 # larger SNP databases are scanned with pandas
+
+# Load SNP database of condition class as list of rows (empty values as NaN like pandas) from SNP database bundle or csv file
+def read_snp_db(snp_db_file_name, condition_class):
+
+    bundle = get_bundle()
+    if (bundle is not None) and bundle.contains(snp_db_file_name, condition_class):
+        return bundle.get_rows(snp_db_file_name, condition_class)
+    with open(snp_db_file_name, 'r', newline='') as snp_db_file:
+        return [{column: value if value != '' else NO_REL_RISK for column, value in row.items()} for row in csv.DictReader(snp_db_file)]
+
+# Read genotypes of given SNPs from rows of reader (SNP -> list of genotypes, duplicates included)
+# (SNP, chromosome) pairs of the rows found are collected too if asked for
+# Returns number of rows read
+def read_tsv_genotypes(rows, snps, genotypes, snp_chromosome_pairs=None):
+
+    row_count = 0
+    for row_count, (snp, chromosome, _, genotype) in enumerate(rows, 1):
+        if snp in snps:
+            genotypes.setdefault(snp, []).append(genotype)
+            if snp_chromosome_pairs is not None:
+                snp_chromosome_pairs.append((snp, chromosome))
+    return row_count
+
+# Read genotypes of given SNPs from genotype files of zip file (SNP -> list of genotypes)
+# With early stop, remaining members are skipped once every SNP has been found
+# Returns genotypes and number of members read
+def read_zip_genotypes(zip_file, members, reader, snps, stage, early_stop=False, snp_chromosome_pairs=None):
+
+    genotypes = {}
+    member_count = 0
+    for member_count, member in enumerate(members, 1):
+        with io.TextIOWrapper(zip_file.open(member), encoding='utf-8') as tsv_file:
+            stage["rows"] += read_tsv_genotypes(reader.read_rows(tsv_file), snps, genotypes, snp_chromosome_pairs)
+        if early_stop and (len(genotypes) == len(snps)):
+            break
+    return genotypes, member_count
+
+# Get genotypes of SNPs from SNP file (zip file of genotype files or single genotype file, format detected by its reader)
+# as SNP -> list of genotypes
+# With early stop, remaining zip members are skipped once every SNP has been found
+# Genotype files of zip files are selected by the chromosomes of the SNPs (SNP -> chromosome, all members if not known)
+# and all members are read again if a SNP is found on another chromosome than expected
+def get_snp_genotypes(snp_file_name, snps, metrics, early_stop=False, snp_chromosomes=None):
+
+    genotypes = {}
+    with metrics.stage('load_genotypes') as stage:
+        stage["bytes"] += os.path.getsize(snp_file_name)
+        if snp_file_name.endswith('.zip'):
+            with ZipFile(snp_file_name) as zip_file:
+                members = [info.filename for info in zip_file.infolist() if info.compress_size > 0]
+                with zip_file.open(members[0]) as member_file:
+                    reader = sniff_reader(member_file)
+                selected_members = select_members(zip_file, members, reader, snps, snp_chromosomes) if snp_chromosomes else members
+                snp_chromosome_pairs = [] if len(selected_members) < len(members) else None
+                genotypes, member_count = read_zip_genotypes(zip_file, selected_members, reader, snps, stage, early_stop, snp_chromosome_pairs)
+                metrics.count(C_SNP_FILE_SCOPE, members=len(selected_members), members_read=member_count)
+                if snp_chromosome_pairs is not None:
+                    metrics.count(C_SNP_FILE_SCOPE, members_skipped=len(members) - len(selected_members))
+                    if not is_chromosome_match(snp_chromosome_pairs, snp_chromosomes):
+                        metrics.count(C_SNP_FILE_SCOPE, chromosome_mismatches=1)
+                        genotypes, member_count = read_zip_genotypes(zip_file, members, reader, snps, stage, early_stop)
+                        metrics.count(C_SNP_FILE_SCOPE, members=len(members), members_read=member_count)
+        else:
+            with open_genotype_file(snp_file_name) as genotype_file:
+                reader = sniff_reader(genotype_file)
+            with io.TextIOWrapper(open_genotype_file(snp_file_name), encoding='utf-8') as tsv_file:
+                stage["rows"] += read_tsv_genotypes(reader.read_rows(tsv_file), snps, genotypes)
+    return genotypes
+
+# Get results for database SNPs found once in genotypes (database order)
+# SNPs found more than once are ambiguous and not matched
+def get_snp_results(condition, snp_db, genotypes):
+
+    metrics = condition.metrics
+    with metrics.stage('match') as stage:
+        db_snps = set(db_row[C_SNP] for db_row in snp_db)
+        found_count = sum(1 for snp in db_snps if len(genotypes.get(snp, [])) == 1)
+        ambiguous_count = sum(1 for snp in db_snps if len(genotypes.get(snp, [])) > 1)
+        stage["rows"] += len(db_snps)
+
+    with metrics.stage('score') as stage:
+        results = []
+        for db_row in snp_db:
+            if len(genotypes.get(db_row[C_SNP], [])) != 1:
+                continue
+            result = {column: db_row.get(column, NO_REL_RISK) for column in RESULT_COLUMNS}
+            result[C_GENOTYPE] = genotypes[db_row[C_SNP]][0]
+            risk, max_risk, result[C_ASSOCIATION] = condition.get_risk_association(result)
+            result[C_RISK] = float(risk)
+            result[C_MAX_RISK] = float(max_risk)
+            results.append(result)
+        stage["rows"] += len(results)
+
+    metrics.count(type(condition).__name__, found=found_count, ambiguous=ambiguous_count,
+                  missing=len(db_snps) - found_count - ambiguous_count, db_rows=len(snp_db), db_rows_matched=len(results))
+    metrics.progress(f"Found {len(results)} out of {len(snp_db)} SNPs")
+    return results
+
+# Get relative risk (risk / max risk) per application
+def get_rel_risks(results):
+
+    sums = {}
+    for result in results:
+        risk_sum, max_risk_sum = sums.get(result[C_APPLICATION], (0.0, 0.0))
+        sums[result[C_APPLICATION]] = (risk_sum + result[C_RISK], max_risk_sum + result[C_MAX_RISK])
+    return {application: risk_sum / max_risk_sum if max_risk_sum else NO_REL_RISK for application, (risk_sum, max_risk_sum) in sums.items()}
+
+# Get chromosomes of SNPs of SNP databases (SNP -> chromosome) from their chromosome columns
+# or otherwise from the loci files next to the SNP databases
+def get_db_chromosomes(conditions, snp_dbs):
+
+    snp_chromosomes = {}
+    for condition, snp_db in zip(conditions, snp_dbs):
+        if all(C_CHROMOSOME in db_row for db_row in snp_db):
+            snp_chromosomes.update(get_snp_chromosomes((db_row[C_SNP], db_row[C_CHROMOSOME]) for db_row in snp_db))
+        else:
+            snp_chromosomes.update(get_loci_chromosomes({db_row[C_SNP] for db_row in snp_db}, os.path.dirname(condition.snp_db_file_name)))
+    return snp_chromosomes
+
+# Scan SNP file for conditions (SNP file read once for all conditions) and return results per condition
+def scan_conditions(conditions):
+
+    snp_dbs = []
+    for condition in conditions:
+        with condition.metrics.stage('load_db') as stage:
+            snp_dbs.append(read_snp_db(condition.snp_db_file_name, type(condition)))
+            stage["rows"] += len(snp_dbs[-1])
+    snps = {db_row[C_SNP] for snp_db in snp_dbs for db_row in snp_db}
+    genotypes = get_snp_genotypes(conditions[0].snp_file_name, snps, conditions[0].metrics, conditions[0].early_stop,
+                                  get_db_chromosomes(conditions, snp_dbs))
+
+    condition_results = []
+    for condition, snp_db in zip(conditions, snp_dbs):
+        results = get_snp_results(condition, snp_db, genotypes)
+        with condition.metrics.stage('summarize'):
+            condition.summarize_results(get_rel_risks(results))
+        condition_results.append(results)
+    return condition_results
+
+# Check if SNP databases of conditions are small enough for the lightweight scan (and scored by risk rules)
+def is_small_db(conditions):
+
+    for condition in conditions:
+        if not condition.RISK_RULES:
+            return False
+        with open(condition.snp_db_file_name, 'r') as snp_db_file:
+            if sum(1 for _ in snp_db_file) - 1 > LITE_MAX_DB_ROWS:
+                return False
+    return True
+
+# Save results of condition (csv and json, same content as the pandas scan), printed as markdown table if asked for
+def save_results(condition, results, results_csv_file_name, results_json_file_name, markdown=False):
+
+    with condition.metrics.stage('save') as stage:
+
+        # csv file
+        columns = [column for column in RESULT_COLUMNS + [C_RISK, C_MAX_RISK] if column not in condition.RESULTS_TABLE_DROP_COLUMNS]
+        table = [['' if value != value else value for value in (result[column] for column in columns)] for result in results]
+        if markdown:
+            try:
+                from tabulate import tabulate
+                print('\nResults\n' + tabulate(table, headers=columns, tablefmt='pipe', showindex=True))
+            except ImportError:
+                pass
+        with open(results_csv_file_name, 'w', newline='') as results_csv_file:
+            writer = csv.writer(results_csv_file, delimiter='\t', lineterminator='\n')
+            writer.writerow(columns)
+            writer.writerows(table)
+
+        # json file
+        result_dic = condition.get_summary()
+        result_dic["data"] = results
+        with open(results_json_file_name, "w") as outfile:
+            json.dump(result_dic, outfile)
+        stage["rows"] += len(results)
+        stage["bytes"] += os.path.getsize(results_csv_file_name) + os.path.getsize(results_json_file_name)
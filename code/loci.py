@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Genomic loci (chromosome, position and alleles) of database SNPs for a genome build
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import csv
+import glob
+import os
+import sys
+from condition import pd, C_SNP, C_CHROMOSOME
+from snp_reader import normalize_chromosome
+
+# Name constants
+C_POSITION = 'Position'
+C_REF = 'Ref'
+C_ALT = 'Alt'
+ALT_SEPARATOR = ','
+V_GRCH37 = 'GRCh37'
+V_GRCH38 = 'GRCh38'
+DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'db') # default directory of SNP databases and loci files
+LOCI_FILE_NAME = 'loci_{build}.csv'
+
+# Length of chromosome 1 per genome build (to detect the build of a VCF file)
+CHROMOSOME_1_LENGTHS = {249250621: V_GRCH37, 248956422: V_GRCH38}
+
+# Reference genome names per genome build (to detect the build of a VCF file)
+REFERENCE_NAMES = {V_GRCH37: ['GRCh37', 'hg19', 'b37', 'hs37d5'], V_GRCH38: ['GRCh38', 'hg38']}
+
+# Get genome build from VCF header (None if unknown)
+def get_genome_build(vcf_header):
+
+    # Contig length of chromosome 1
+    for contig in vcf_header.contigs.values():
+        if normalize_chromosome(contig.name) == '1' and contig.length in CHROMOSOME_1_LENGTHS:
+            return CHROMOSOME_1_LENGTHS[contig.length]
+
+    # Reference genome name
+    for record in vcf_header.records:
+        if record.key == 'reference':
+            for build, names in REFERENCE_NAMES.items():
+                if any(name.lower() in record.value.lower() for name in names):
+                    return build
+
+    return None
+
+# Get loci file name for genome build
+def get_loci_file_name(build, db_dir=DB_DIR):
+    return os.path.join(db_dir, LOCI_FILE_NAME.format(build=build))
+
+# Load loci for genome build (None if not available)
+def get_loci(build, db_dir=DB_DIR):
+
+    loci_file_name = get_loci_file_name(build, db_dir)
+    if not os.path.exists(loci_file_name):
+        return None
+    loci = pd.read_csv(loci_file_name, dtype={C_CHROMOSOME: str})
+    return loci
+
+# Get loci for database SNPs (from database columns if available, otherwise from loci table)
+# Reference and alternative alleles (Ref, Alt) are kept if available
+def get_snp_loci(database, loci=None):
+
+    if (C_CHROMOSOME in database.columns) and (C_POSITION in database.columns):
+        snp_loci = database[[column for column in [C_SNP, C_CHROMOSOME, C_POSITION, C_REF, C_ALT] if column in database.columns]]
+    elif loci is not None:
+        snp_loci = loci.loc[loci[C_SNP].isin(database[C_SNP])]
+    else:
+        return None
+
+    snp_loci = snp_loci.dropna(subset=[C_CHROMOSOME, C_POSITION]).drop_duplicates(subset=C_SNP)
+    snp_loci = snp_loci.astype({C_CHROMOSOME: str, C_POSITION: int})
+    snp_loci[C_CHROMOSOME] = snp_loci[C_CHROMOSOME].map(normalize_chromosome)
+    return snp_loci.reset_index(drop=True)
+
+# Get chromosomes of SNPs (SNP -> chromosome) from (SNP, chromosome) pairs, e.g. of SNP database rows
+# SNPs without chromosome and SNPs of different chromosomes (e.g. in loci files of several builds) are left out
+def get_snp_chromosomes(snp_chromosome_pairs):
+
+    chromosomes = {}
+    conflicting_snps = set()
+    for snp, chromosome in snp_chromosome_pairs:
+        if isinstance(chromosome, float):
+            if chromosome != chromosome: # missing value
+                continue
+            chromosome = int(chromosome)
+        chromosome = normalize_chromosome(chromosome)
+        if chromosomes.setdefault(snp, chromosome) != chromosome:
+            conflicting_snps.add(snp)
+    for snp in conflicting_snps:
+        del chromosomes[snp]
+    return chromosomes
+
+# Get chromosomes of SNPs (SNP -> chromosome) from the loci files of all genome builds (a SNP's chromosome does not depend on the build)
+# Loci files are read without pandas (lightweight scans)
+def get_loci_chromosomes(snps, db_dir=DB_DIR):
+
+    snp_chromosome_pairs = []
+    for loci_file_name in sorted(glob.glob(get_loci_file_name('*', db_dir))):
+        with open(loci_file_name, 'r', newline='') as loci_file:
+            snp_chromosome_pairs.extend((row[C_SNP], row[C_CHROMOSOME]) for row in csv.DictReader(loci_file) if row[C_SNP] in snps)
+    return get_snp_chromosomes(snp_chromosome_pairs)
+
+# Build loci table for database SNPs from a VCF file annotated with SNP IDs (e.g. dbSNP)
+def build_loci(vcf_file, db_file_names):
+
+    snps = set()
+    for db_file_name in db_file_names:
+        snps.update(pd.read_csv(db_file_name)[C_SNP])
+
+    # Single pass over VCF file
+    loci = {}
+    for record in vcf_file.fetch():
+        if (record.id in snps) and (record.id not in loci):
+            loci[record.id] = (normalize_chromosome(record.chrom), record.pos, record.ref, ALT_SEPARATOR.join(record.alts or []))
+            if len(loci) == len(snps):
+                break
+
+    loci = pd.DataFrame([(snp, *locus) for snp, locus in loci.items()],
+                        columns=[C_SNP, C_CHROMOSOME, C_POSITION, C_REF, C_ALT])
+    return loci
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    args = sys.argv
+    if len(args) < 3:
+        print("You need to provide the genome build (e.g. GRCh38) and a VCF file annotated with SNP IDs (e.g. dbSNP)")
+        exit(0)
+    build = args[1]
+    vcf_file_name = args[2]
+
+    from pysam import VariantFile
+
+    # Build loci for all SNP databases and merge with existing loci
+    loci = build_loci(VariantFile(vcf_file_name), sorted(glob.glob(os.path.join(DB_DIR, 'snpdb_*.csv'))))
+    existing_loci = get_loci(build)
+    if existing_loci is not None:
+        loci = pd.concat([existing_loci.loc[~existing_loci[C_SNP].isin(loci[C_SNP])], loci], ignore_index=True)
+    loci.to_csv(get_loci_file_name(build), index=False)
+
+    print(f"\nLoci of {len(loci.index)} SNPs saved for genome build {build}")
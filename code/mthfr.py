@@ -10,11 +10,19 @@ __maintainer__ = "Melanie Senn"
 __email__ = "melanie.senn@gmail.com"
 
 from condition import *
-import json
 
 # Name constants
 ASSOCIATIONS_DIAGNOSIS = ['Average risk', 'Small increase in risk', 'Increased risk']
 
+# Get diagnostic risk association for relative risk
+# Average risk (0), small increase in risk (<= 0.5), increased risk (> 0.5 or no SNP found)
+def get_diagnostic_risk_association(rel_risk):
+    if rel_risk == 0.0:
+        return ASSOCIATIONS_DIAGNOSIS[0]
+    elif rel_risk <= 0.5:
+        return ASSOCIATIONS_DIAGNOSIS[1]
+    return ASSOCIATIONS_DIAGNOSIS[2]
+
 class MTHFR(Condition):
     def __init__(self, snp_file_name, snp_db_file_name):
         super().__init__(snp_file_name, snp_db_file_name)
@@ -37,43 +45,25 @@ class MTHFR(Condition):
 
         return risk, max_risk, association
 
-    # Summarize results from single SNPs into conclusion
-    def summarize_results(self):
-
-        # Diagnostic summary
-        diagnostic_results = self.snp_results.loc[self.snp_results[C_APPLICATION] == V_DIAGNOSIS]
-        diagnostic_risk = diagnostic_results[C_RISK].sum()
-        diagnostic_max_risk = diagnostic_results[C_MAX_RISK].sum()
-        diagnostic_rel_risk = diagnostic_risk / diagnostic_max_risk
-
-        # Average risk
-        if diagnostic_rel_risk == 0.0:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[0]
+    # Summarize relative risks per application (application -> relative risk) into summary scores (json keys and values)
+    def summarize_rel_risks(self, rel_risks):
+        return {
+            "dianogstic_score": get_diagnostic_risk_association(rel_risks.get(V_DIAGNOSIS, NO_REL_RISK)) # diagnostic summary
+        }
 
-        # Small increase in risk
-        elif diagnostic_rel_risk <= 0.5:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[1]
+    # Summarize results from single SNPs into conclusion (relative risks per application computed from results if not given)
+    def summarize_results(self, rel_risks=None):
 
-        # Increased risk
-        else:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[2]
+        summary = self.summarize_rel_risks(self.get_result_rel_risks() if rel_risks is None else rel_risks)
+        diagnostic_risk_association = summary["dianogstic_score"]
 
         self.diagnostic_risk_association = diagnostic_risk_association
 
         # Summarize results from single SNPs for conclusion
         print('\nYour diagnostic insights: ' + diagnostic_risk_association)
 
-    # Save results (csv and json)
-    def save_results(self, results_csv_file_name, results_json_file_name):
-
-        super().save_results(results_csv_file_name, results_json_file_name)
-
-        # json file
-        result_dic = {
-            "dianogstic_score": self.diagnostic_risk_association,
-            "data" : self.snp_results.to_dict(orient='records')
+    # Get summary scores of results (json keys and values)
+    def get_summary(self):
+        return {
+            "dianogstic_score": self.diagnostic_risk_association
         }
-
-        # Convert and write JSON object to file
-        with open(results_json_file_name, "w") as outfile:
-            json.dump(result_dic, outfile)
@@ -9,8 +9,8 @@ __version__ = "1.0.0"
 __maintainer__ = "Melanie Senn"
 __email__ = "melanie.senn@gmail.com"
 
+import math
 from condition import *
-import json
 
 # Name constants
 ASSOCIATIONS_DIAGNOSIS = ['Average risk', 'Small increase in risk', 'Increased risk']
@@ -20,8 +20,22 @@ V_BIP = 'Bipolar Disorder'
 V_SCZ = 'Schizophrenia'
 V_MDD = 'Major Depressive Disorder'
 V_ANO = 'Anorexia Nervosa'
+DISORDERS = [V_ASD, V_TS, V_BIP, V_SCZ, V_MDD, V_ANO]
+SUMMARY_KEYS = ["dianogstic_score_asd", "dianogstic_score_ts", "dianogstic_score_bip", "dianogstic_score_scz", "dianogstic_score_mdd", "dianogstic_score_ano"]
+
+# Get diagnostic risk association for relative risk
+# Average risk (0), small increase in risk (<= 0.5), increased risk (> 0.5 or no SNP found)
+def get_diagnostic_risk_association(rel_risk):
+    if rel_risk == 0.0:
+        return ASSOCIATIONS_DIAGNOSIS[0]
+    elif rel_risk <= 0.5:
+        return ASSOCIATIONS_DIAGNOSIS[1]
+    return ASSOCIATIONS_DIAGNOSIS[2]
 
 class Neuropsych(Condition):
+    # Results table columns not in csv file (application is kept to tell disorders apart)
+    RESULTS_TABLE_DROP_COLUMNS = [C_CONDITION, C_RISK, C_MAX_RISK]
+
     def __init__(self, snp_file_name, snp_db_file_name):
         super().__init__(snp_file_name, snp_db_file_name)
 
@@ -43,58 +57,27 @@ class Neuropsych(Condition):
         
         return risk, max_risk, association
     
-    # Summarize results from single SNPs into conclusion
-    def summarize_results(self):
-
-        # For each disorder
-        disorders = [V_ASD, V_TS, V_BIP, V_SCZ, V_MDD, V_ANO]
-        for disorder in disorders:
-            self.diagnostic_risk_association.append("Unknown risk")
-        for disorder_count, disorder in enumerate(disorders):
-
-            # Diagnostic summary
-            diagnostic_results = self.snp_results.loc[self.snp_results[C_APPLICATION] == disorder]
-            if len(diagnostic_results):
-                diagnostic_risk = diagnostic_results[C_RISK].sum()
-                diagnostic_max_risk = diagnostic_results[C_MAX_RISK].sum()
-                diagnostic_rel_risk = diagnostic_risk / diagnostic_max_risk
+    # Summarize relative risks per application (application -> relative risk) into summary scores (json keys and values)
+    def summarize_rel_risks(self, rel_risks):
 
-                # Average risk
-                if diagnostic_rel_risk == 0.0:
-                    diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[0]
+        # Diagnostic summary for each disorder (unknown risk if no SNP of disorder was found)
+        summary = {}
+        for disorder, summary_key in zip(DISORDERS, SUMMARY_KEYS):
+            diagnostic_rel_risk = rel_risks.get(disorder, NO_REL_RISK)
+            summary[summary_key] = "Unknown risk" if math.isnan(diagnostic_rel_risk) else get_diagnostic_risk_association(diagnostic_rel_risk)
 
-                # Small increase in risk
-                elif diagnostic_rel_risk <= 0.5:
-                    diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[1]
+        return summary
 
-                # Increased risk
-                else:
-                    diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[2]
+    # Summarize results from single SNPs into conclusion (relative risks per application computed from results if not given)
+    def summarize_results(self, rel_risks=None):
 
-                self.diagnostic_risk_association[disorder_count] = diagnostic_risk_association
+        summary = self.summarize_rel_risks(self.get_result_rel_risks() if rel_risks is None else rel_risks)
+        self.diagnostic_risk_association = [summary[summary_key] for summary_key in SUMMARY_KEYS]
 
-            # Summarize results from single SNPs for conclusion
+        # Summarize results from single SNPs for conclusion
+        for disorder_count, disorder in enumerate(DISORDERS):
             print('\nYour diagnostic insights for ' + disorder + ': ' + self.diagnostic_risk_association[disorder_count])
 
-    # Save results (csv and json)
-    def save_results(self, results_csv_file_name, results_json_file_name):
-
-        # csv file
-        results = self.snp_results.drop(columns=[C_CONDITION, C_RISK, C_MAX_RISK])
-        print('\nResults\n' + results.to_markdown())
-        results.to_csv(results_csv_file_name, index=False, sep='\t')
-
-        # json file
-        result_dic = {
-            "dianogstic_score_asd": self.diagnostic_risk_association[0],
-            "dianogstic_score_ts": self.diagnostic_risk_association[1],
-            "dianogstic_score_bip": self.diagnostic_risk_association[2],
-            "dianogstic_score_scz": self.diagnostic_risk_association[3],
-            "dianogstic_score_mdd": self.diagnostic_risk_association[4],
-            "dianogstic_score_ano": self.diagnostic_risk_association[5],
-            "data" : self.snp_results.to_dict(orient='records')
-        }
-
-        # Convert and write JSON object to file
-        with open(results_json_file_name, "w") as outfile:
-            json.dump(result_dic, outfile)
+    # Get summary scores of results (json keys and values)
+    def get_summary(self):
+        return dict(zip(SUMMARY_KEYS, self.diagnostic_risk_association))
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Describes polygenic scores (weighted sums of effect allele dosages over many SNPs, e.g. published polygenic risk scores)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+from condition import *
+
+# Name constants
+C_EFFECT_ALLELE = 'Effect allele'
+C_OTHER_ALLELE = 'Other allele'
+C_WEIGHT = 'Weight'
+C_EFFECT_ALLELE_FREQUENCY = 'Effect allele frequency'
+C_DOSAGE = 'Dosage'
+C_EXPECTED_RISK = 'Expected risk' # weight times expected dosage (2 x effect allele frequency)
+V_POLYGENIC_SCORE = 'polygenic_score'
+V_POLYGENIC_SCORE_Z = 'polygenic_score_z'
+ASSOCIATIONS_DOSAGE = ['No effect allele', 'One effect allele', 'Two effect alleles']
+JSON_BLOCK_ROWS = 100000 # results rows converted to json at once
+
+# SNP database columns (others are not loaded) and their types (categories for repeated values)
+REQUIRED_COLUMNS = [C_SNP, C_EFFECT_ALLELE, C_WEIGHT]
+DB_COLUMN_TYPES = {C_CONDITION: 'category', C_APPLICATION: 'category', C_SNP: 'str', C_EFFECT_ALLELE: 'category',
+                   C_OTHER_ALLELE: 'category', C_WEIGHT: 'float64', C_EFFECT_ALLELE_FREQUENCY: 'float64',
+                   C_CHROMOSOME: 'category'}
+
+# Per-sample sums of scored results (reduced into summary scores)
+S_RISK = 'risk'
+S_SCORED = 'scored'
+S_EXPECTED_RISK = 'expected_risk'
+S_EXPECTED = 'expected'
+
+# Get effect allele dosages of genotypes (0, 1 or 2, NaN if not scored) as a vectorized comparison of both alleles
+# Genotypes are scored if each allele is the effect or the other allele (any called allele if the other allele is not given),
+# single alleles (e.g. Y and MT) count once, no-calls and genotypes of other alleles (e.g. other strand, indels) are not scored
+def get_dosages(genotypes, effect_alleles, other_alleles):
+
+    genotypes = pd.Series(genotypes, dtype=object)
+    lengths = genotypes.str.len().to_numpy(dtype=float, na_value=np.nan)
+    first = genotypes.str[0].to_numpy(dtype=object)
+    second = genotypes.str[1].to_numpy(dtype=object)
+    no_other_allele = pd.isna(other_alleles)
+
+    def is_known(alleles):
+        return (alleles == effect_alleles) | (alleles == other_alleles) | (no_other_allele & (alleles != '-') & pd.notna(alleles))
+
+    scored = ((lengths == 1) | (lengths == 2)) & is_known(first) & ((lengths == 1) | is_known(second))
+    dosages = (first == effect_alleles).astype(float) + (second == effect_alleles)
+    dosages[~scored] = np.nan
+    return dosages
+
+# Standardize polygenic scores across the samples of a cohort (per group, e.g. condition) as z-scores
+# Summary without polygenic scores is returned unchanged
+def standardize_scores(summary, group_columns=None):
+
+    if V_POLYGENIC_SCORE not in summary.columns:
+        return summary
+    scores = pd.to_numeric(summary[V_POLYGENIC_SCORE], errors='coerce')
+    groups = scores.groupby([summary[column] for column in group_columns], sort=False) if group_columns else scores.groupby(np.zeros(len(scores.index)))
+    summary = summary.copy()
+    summary.insert(summary.columns.get_loc(V_POLYGENIC_SCORE) + 1, V_POLYGENIC_SCORE_Z,
+                   (scores - groups.transform('mean')) / groups.transform('std'))
+    return summary
+
+class PolygenicScore(Condition):
+    # Results table columns (database columns and genotype) and columns not in csv file
+    RESULT_COLUMNS = [C_CONDITION, C_APPLICATION, C_SNP, C_GENOTYPE, C_EFFECT_ALLELE, C_OTHER_ALLELE, C_WEIGHT, C_EFFECT_ALLELE_FREQUENCY]
+    RESULTS_TABLE_DROP_COLUMNS = [C_APPLICATION, C_CONDITION, C_EXPECTED_RISK]
+    # Scored by a weighted sum of dosages (no risk rules per database row)
+    RISK_RULES = False
+    ALLELE_COLUMN = C_EFFECT_ALLELE
+
+    def __init__(self, snp_file_name, snp_db_file_name):
+        super().__init__(snp_file_name, snp_db_file_name)
+
+        self.expected_risk = None
+        self.summary = None
+
+    # Load SNP database (database columns only, repeated values as categories)
+    def get_snp_db(self):
+
+        with self.metrics.stage('load_db') as stage:
+            snp_db = pd.read_csv(self.snp_db_file_name, usecols=lambda column: column in DB_COLUMN_TYPES, dtype=DB_COLUMN_TYPES)
+            missing_columns = [column for column in REQUIRED_COLUMNS if column not in snp_db.columns]
+            if len(missing_columns):
+                raise ValueError(f"{self.snp_db_file_name}: missing columns {missing_columns}")
+            self.snp_db = snp_db
+            self.risk_rules = None
+            stage["rows"] += len(self.snp_db.index)
+            stage["bytes"] += os.path.getsize(self.snp_db_file_name)
+
+    # No risk rules to compile
+    def compile_risk_rules(self):
+        pass
+
+    # Results are not cached per database row (scored in a single vectorized pass)
+    def get_row_hashes(self):
+        return None
+
+    # Score results of database rows (by position) as dosage times weight
+    def score_results(self, results, db_rows):
+
+        with self.metrics.stage('score') as stage:
+            effect_alleles = self.snp_db[C_EFFECT_ALLELE].to_numpy(dtype=object)[db_rows]
+            other_alleles = self.snp_db[C_OTHER_ALLELE].to_numpy(dtype=object)[db_rows] if C_OTHER_ALLELE in self.snp_db.columns \
+                else np.full(len(db_rows), np.nan, dtype=object)
+            weights = self.snp_db[C_WEIGHT].to_numpy(dtype=float)[db_rows]
+            dosages = get_dosages(results[C_GENOTYPE].values, effect_alleles, other_alleles)
+
+            results[C_DOSAGE] = dosages
+            results[C_RISK] = dosages * weights + 0.0 # no negative zeros
+            results[C_EXPECTED_RISK] = self.get_expected_risks()[db_rows]
+            stage["rows"] += len(results.index)
+
+    # Score results without result cache (scoring is cheaper than looking up cached rows)
+    def score_cached_results(self, results, db_rows):
+        self.score_results(results, db_rows)
+
+    # Get expected risk per database row (weight times 2 x effect allele frequency, NaN if frequency not given)
+    def get_expected_risks(self):
+
+        if self.expected_risk is None:
+            if C_EFFECT_ALLELE_FREQUENCY in self.snp_db.columns:
+                self.expected_risk = 2 * self.snp_db[C_EFFECT_ALLELE_FREQUENCY].to_numpy(dtype=float) * self.snp_db[C_WEIGHT].to_numpy(dtype=float)
+            else:
+                self.expected_risk = np.full(len(self.snp_db.index), np.nan)
+        return self.expected_risk
+
+    # Get risk association for result row (risk is the dosage times the weight, max risk twice the absolute weight)
+    def get_risk_association(self, result_row):
+
+        other_alleles = np.array([result_row.get(C_OTHER_ALLELE, NO_REL_RISK)], dtype=object)
+        dosage = get_dosages([result_row[C_GENOTYPE]], np.array([result_row[C_EFFECT_ALLELE]], dtype=object), other_alleles)[0]
+        if dosage != dosage:
+            return NO_REL_RISK, NO_REL_RISK, ''
+        return dosage * result_row[C_WEIGHT], 2 * abs(result_row[C_WEIGHT]), ASSOCIATIONS_DOSAGE[int(dosage)]
+
+    # Get sums of scored results (risks, scored variants, expected risks and variants with expected risk of scored results)
+    # Results with a sample column are reduced per sample (one row per sample), otherwise one row
+    def get_rel_risks(self, results):
+
+        scored = results[C_RISK].notna()
+        expected = scored & results[C_EXPECTED_RISK].notna()
+        sums = pd.DataFrame({S_RISK: results[C_RISK].where(scored, 0.0).values, S_SCORED: scored.values,
+                             S_EXPECTED_RISK: results[C_EXPECTED_RISK].where(expected, 0.0).values, S_EXPECTED: expected.values})
+        if C_SAMPLE in results.columns:
+            return sums.groupby(results[C_SAMPLE].values, sort=False).sum().rename_axis(C_SAMPLE)
+        return sums.sum().to_frame().T
+
+    # Summarize sums of scored results (as of get_rel_risks) into polygenic score and variant counts (json keys and values)
+    # Variants not scored (missing, ambiguous or not called) with effect allele frequency contribute their expected risk (mean imputation)
+    def summarize_rel_risks(self, rel_risks):
+
+        expected_risks = self.get_expected_risks()
+        variant_count = len(self.snp_db.index)
+        scored_count = int(rel_risks.get(S_SCORED, 0))
+        imputed_count = int(np.count_nonzero(~np.isnan(expected_risks))) - int(rel_risks.get(S_EXPECTED, 0))
+        score = rel_risks.get(S_RISK, 0.0) + np.nansum(expected_risks) - rel_risks.get(S_EXPECTED_RISK, 0.0)
+        return {
+            V_POLYGENIC_SCORE: float(score),
+            "variants": variant_count,
+            "variants_scored": scored_count,
+            "variants_missing": variant_count - scored_count,
+            "variants_imputed": imputed_count,
+            "variant_coverage": scored_count / variant_count if variant_count else NO_REL_RISK
+        }
+
+    # Summarize results from single SNPs into polygenic score (sums of scored results computed from results if not given)
+    def summarize_results(self, rel_risks=None):
+
+        self.summary = self.summarize_rel_risks(self.get_result_rel_risks() if rel_risks is None else rel_risks)
+
+        # Summarize results from single SNPs for conclusion
+        print(f"\nYour polygenic score: {self.summary[V_POLYGENIC_SCORE]:.6g} ({self.summary['variants_scored']} out of {self.summary['variants']} variants scored, "
+              f"{self.summary['variants_imputed']} missing variants imputed)")
+
+    # Get summary scores of results (json keys and values)
+    def get_summary(self):
+        return self.summary
+
+    # Save results (csv and json), printed as markdown table if asked for
+    # Results data are written to the json file in blocks of rows (no json object per row for large SNP databases)
+    def save_results(self, results_csv_file_name, results_json_file_name, markdown=False):
+
+        with self.metrics.stage('save') as stage:
+
+            # csv file
+            results = self.get_results_table()
+            if markdown:
+                print('\nResults\n' + results.to_markdown())
+            results.to_csv(results_csv_file_name, index=False, sep='\t')
+
+            # json file (missing values as null)
+            summary = json.dumps(self.get_summary())
+            with open(results_json_file_name, "w") as outfile:
+                outfile.write(summary[:-1] + (', ' if len(self.get_summary()) else '') + '"data": [')
+                for start in range(0, len(self.snp_results.index), JSON_BLOCK_ROWS):
+                    block = self.snp_results.iloc[start:start + JSON_BLOCK_ROWS].to_json(orient='records', double_precision=15)
+                    outfile.write((',' if start else '') + block[1:-1])
+                outfile.write(']}')
+            stage["rows"] += len(results.index)
+            stage["bytes"] += os.path.getsize(results_csv_file_name) + os.path.getsize(results_json_file_name)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of extracted genotypes and scored results per SNP file (incremental re-scans after SNP database updates)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+# Cache settings
+CACHE_VERSION = 1
+CACHE_MAX_SIZE = 256 * 1024 ** 2 # bytes
+ROW_HASH_LENGTH = 16 # hex digits of SHA-256 per SNP database row
+ENTRY_FILE_EXTENSION = '.json'
+
+# Get content hash per SNP database row (column names and values) to detect new or changed rows
+def get_row_hashes(snp_db):
+
+    columns = list(snp_db.columns)
+    rows = snp_db.astype(object).where(snp_db.notna(), None).values.tolist()
+    return [hashlib.sha256(json.dumps(dict(zip(columns, row)), default=str).encode()).hexdigest()[:ROW_HASH_LENGTH] for row in rows]
+
+# Get content hash of the source files of the modules of a condition class and its base classes
+# (results are scored again if the risk rules of the condition or the scoring of its base classes change, e.g. in condition.py)
+def get_module_hash(condition_class):
+
+    module_hash = hashlib.sha256()
+    for module_name in dict.fromkeys(base_class.__module__ for base_class in condition_class.__mro__):
+        module_file_name = getattr(sys.modules.get(module_name), '__file__', None)
+        if module_file_name is not None: # built-in modules (e.g. of object) have no source file
+            with open(module_file_name, 'rb') as module_file:
+                module_hash.update(hashlib.sha256(module_file.read()).digest())
+    return module_hash.hexdigest()
+
+class ResultCache:
+    def __init__(self, cache_dir, max_size=CACHE_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(cache_dir, exist_ok=True)
+
+    # Get file of cache entry
+    def get_entry_file_name(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_FILE_EXTENSION)
+
+    # Check if cache entry exists
+    def contains(self, key):
+        return os.path.exists(self.get_entry_file_name(key))
+
+    # Load cache entry of SNP file (empty entry if not cached or of another cache version)
+    # genotypes: SNP -> TSV rows (chromosome, position, genotype) of all SNPs looked up so far (no rows if not found)
+    # results: condition -> module hash and database row hash -> risk, max risk and association
+    def load(self, key):
+
+        entry = {'version': CACHE_VERSION, 'genotypes': {}, 'results': {}}
+        entry_file_name = self.get_entry_file_name(key)
+        try:
+            with open(entry_file_name, 'r') as entry_file:
+                cached_entry = json.load(entry_file)
+            os.utime(entry_file_name) # mark entry as recently used
+        except (OSError, ValueError):
+            return entry
+        return cached_entry if cached_entry.get('version') == CACHE_VERSION else entry
+
+    # Store cache entry of SNP file (written to temporary file and moved into place)
+    def store(self, key, entry):
+
+        temp_file_descriptor, temp_file_name = tempfile.mkstemp(dir=self.cache_dir, prefix='.tmp_')
+        with os.fdopen(temp_file_descriptor, 'w') as temp_file:
+            json.dump(entry, temp_file)
+        os.replace(temp_file_name, self.get_entry_file_name(key))
+        self.evict(keep=key)
+
+    # Evict least recently used entries (except entry to keep) until cache size is within limit
+    def evict(self, keep=None):
+
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(ENTRY_FILE_EXTENSION):
+                entry_file_name = os.path.join(self.cache_dir, file_name)
+                try:
+                    entries.append((os.path.getmtime(entry_file_name), file_name[:-len(ENTRY_FILE_EXTENSION)], os.path.getsize(entry_file_name)))
+                except OSError: # entry evicted concurrently
+                    continue
+
+        cache_size = sum(size for _, _, size in entries)
+        for _, key, size in sorted(entries):
+            if cache_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            try:
+                os.remove(self.get_entry_file_name(key))
+            except OSError:
+                pass
+            cache_size -= size
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Streaming result sinks (NDJSON or columnar binary files partitioned by condition and batch)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+from abc import abstractmethod
+import datetime
+import json
+import os
+import struct
+import uuid
+from condition import np, pd, C_SAMPLE
+
+# Sink settings
+V_NDJSON = 'ndjson'
+V_COLUMNAR = 'columnar'
+COLUMNAR_MAGIC = b'GCOL'
+COLUMNAR_VERSION = 1
+COLUMNAR_HEADER = struct.Struct('<4sII') # magic, version, header length (per block)
+COLUMNAR_BLOCK_ROWS = 65536 # rows buffered per partition and table before a block is written
+COLUMNAR_EXTENSION = '.gcol'
+ALIGNMENT = 8 # bytes
+
+# Get default batch name (start time of the run)
+def get_batch_name():
+    return datetime.datetime.now().strftime('%Y%m%dT%H%M%S')
+
+# Get padding of offset to alignment
+def get_padding(offset):
+    return -offset % ALIGNMENT
+
+# Convert value to json value (missing values as null, numpy scalars as Python scalars)
+def to_json_value(value):
+
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+class ResultSink:
+    def __init__(self, output_dir, batch=None, part=None):
+        self.output_dir = output_dir
+        self.batch = batch if batch is not None else get_batch_name()
+        self.part = part if part is not None else f"part-{os.getpid()}-{uuid.uuid4().hex[:8]}" # unique per writer (concurrent runs append to own files)
+
+    # Get partition directory of condition (created on first use)
+    def get_partition_dir(self, condition_name):
+
+        partition_dir = os.path.join(self.output_dir, f"condition={condition_name}", f"batch={self.batch}")
+        os.makedirs(partition_dir, exist_ok=True)
+        return partition_dir
+
+    # Append summary scores and results of a sample for a condition
+    @abstractmethod
+    def write(self, sample, condition_name, summary, results):
+        pass
+
+    # Write buffered results and close files
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# One json line per sample and condition (summary scores and results data as in the json file of a single scan)
+class NdjsonSink(ResultSink):
+    def __init__(self, output_dir, batch=None, part=None):
+        super().__init__(output_dir, batch, part)
+        self.files = {}
+
+    def write(self, sample, condition_name, summary, results):
+
+        if condition_name not in self.files:
+            self.files[condition_name] = open(os.path.join(self.get_partition_dir(condition_name), self.part + '.ndjson'), 'a')
+        data = [{column: to_json_value(value) for column, value in row.items()} for row in results.to_dict(orient='records')]
+        line = {C_SAMPLE: sample, **{key: to_json_value(value) for key, value in summary.items()}, "data": data}
+        self.files[condition_name].write(json.dumps(line, allow_nan=False) + '\n')
+        self.files[condition_name].flush()
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+# Columnar binary files of blocks (results rows and summary scores per sample in separate files)
+# Each block has a header (magic, version, header length), a json header of columns and their aligned arrays
+# Numeric columns are stored as float64 or int64 arrays, other columns as int32 codes of a per-block dictionary (-1 if missing)
+class ColumnarSink(ResultSink):
+    def __init__(self, output_dir, batch=None, part=None, block_rows=COLUMNAR_BLOCK_ROWS):
+        super().__init__(output_dir, batch, part)
+        self.block_rows = block_rows
+        self.buffers = {} # (condition, table) -> list of tables
+        self.buffer_rows = {} # (condition, table) -> rows of buffered tables
+
+    def write(self, sample, condition_name, summary, results):
+
+        summary = pd.DataFrame([{C_SAMPLE: sample, **summary}])
+        results = results.copy()
+        results.insert(0, C_SAMPLE, sample)
+        for table_name, table in [('summary', summary), ('results', results)]:
+            key = (condition_name, table_name)
+            self.buffers.setdefault(key, []).append(table)
+            self.buffer_rows[key] = self.buffer_rows.get(key, 0) + len(table.index)
+            if self.buffer_rows[key] >= self.block_rows:
+                self.write_block(condition_name, table_name)
+
+    # Write buffered tables of condition as one block
+    def write_block(self, condition_name, table_name):
+
+        buffer = self.buffers.pop((condition_name, table_name), [])
+        self.buffer_rows.pop((condition_name, table_name), None)
+        if len(buffer) == 0:
+            return
+        table = pd.concat(buffer, ignore_index=True)
+
+        columns = []
+        arrays = []
+        offset = 0
+        for column in table.columns:
+            values = table[column]
+            if pd.api.types.is_bool_dtype(values) or not pd.api.types.is_numeric_dtype(values):
+                codes, uniques = pd.factorize(values, use_na_sentinel=True)
+                array = codes.astype(np.int32)
+                column_header = {"name": column, "type": 'str', "dictionary": [to_json_value(value) for value in uniques]}
+            elif pd.api.types.is_integer_dtype(values):
+                array = values.to_numpy(dtype=np.int64)
+                column_header = {"name": column, "type": 'int64'}
+            else:
+                array = values.to_numpy(dtype=np.float64)
+                column_header = {"name": column, "type": 'float64'}
+            column_header.update({"offset": offset, "length": len(array)})
+            columns.append(column_header)
+            arrays.append(array.tobytes() + bytes(get_padding(array.nbytes)))
+            offset += len(arrays[-1])
+
+        header = json.dumps({"rows": len(table.index), "bytes": offset, "columns": columns}, allow_nan=False).encode()
+        file_name = os.path.join(self.get_partition_dir(condition_name), f"{self.part}.{table_name}{COLUMNAR_EXTENSION}")
+        with open(file_name, 'ab') as columnar_file:
+            columnar_file.write(COLUMNAR_HEADER.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(header)) + header)
+            columnar_file.write(bytes(get_padding(COLUMNAR_HEADER.size + len(header))))
+            columnar_file.write(b''.join(arrays))
+
+    def close(self):
+        for condition_name, table_name in list(self.buffers):
+            self.write_block(condition_name, table_name)
+
+# Read blocks of columnar file (one table per block)
+def read_columnar_blocks(file_name):
+
+    with open(file_name, 'rb') as columnar_file:
+        data = columnar_file.read()
+    offset = 0
+    while offset < len(data):
+        magic, version, header_length = COLUMNAR_HEADER.unpack_from(data, offset)
+        if (magic != COLUMNAR_MAGIC) or (version != COLUMNAR_VERSION):
+            raise ValueError(f"{file_name} is not a columnar results file of version {COLUMNAR_VERSION}")
+        offset += COLUMNAR_HEADER.size
+        header = json.loads(data[offset:offset + header_length])
+        offset += header_length + get_padding(COLUMNAR_HEADER.size + header_length)
+        table = {}
+        for column in header["columns"]:
+            dtype = np.int32 if column["type"] == 'str' else column["type"]
+            array = np.frombuffer(data, dtype=dtype, count=column["length"], offset=offset + column["offset"])
+            if column["type"] == 'str':
+                dictionary = np.array(column["dictionary"] + [None], dtype=object)
+                array = dictionary[array] # missing values (code -1) map to None
+            table[column["name"]] = array
+        yield pd.DataFrame(table)
+        offset += header["bytes"]
+
+# Read columnar file as one table
+def read_columnar(file_name):
+    return pd.concat(read_columnar_blocks(file_name), ignore_index=True)
+
+# Get result sink for output format (part name of files unique per writer if not given)
+def get_result_sink(output_format, output_dir, batch=None, part=None):
+    return {V_NDJSON: NdjsonSink, V_COLUMNAR: ColumnarSink}[output_format](output_dir, batch, part)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Scans genotype data for multiple conditions at once
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import glob
+import importlib
+import json
+import os
+from condition import C_SNP, TSV_WORKERS
+
+# Import a module dynamically and instantiates an object
+def import_and_instantiate(module_name, class_name, *args, **kwargs):
+    return get_condition_class(module_name, class_name)(*args, **kwargs)
+
+# Import class of condition (class attributes without instance, e.g. ALLELE_COLUMN)
+def get_condition_class(module_name, class_name):
+
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
+
+# Get config file names from paths (config files or directories of config files)
+def get_config_file_names(paths):
+
+    config_file_names = []
+    for path in paths:
+        if os.path.isdir(path):
+            config_file_names.extend(sorted(glob.glob(os.path.join(path, '*.json'))))
+        else:
+            config_file_names.append(path)
+    return config_file_names
+
+# Load config data from config file
+def get_config(config_file_name):
+
+    with open(config_file_name, "r") as config_file:
+        config_data = json.load(config_file)
+    return config_data
+
+# Instantiate template conditions for config data with loaded SNP databases and compiled risk rules
+# (to be shared by the conditions of many SNP files)
+def get_template_conditions(configs):
+
+    templates = []
+    for config_data in configs:
+        template = import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
+                                          None, config_data["snp_database"])
+        template.get_snp_db()
+        if template.risk_rules is None:
+            template.compile_risk_rules()
+        templates.append(template)
+    return templates
+
+# Instantiate conditions for config data and load their SNP databases (unless shared by template conditions)
+# Conditions record stage timings and counters into the given metrics (own metrics per condition if not given)
+# Zip members of the SNP file are read by tsv_workers threads (stopping early once all SNPs are found if early_stop)
+def get_conditions(configs, snp_file_name, genotype_cache=None, templates=None, metrics=None, tsv_workers=TSV_WORKERS, early_stop=False,
+                   result_cache=None):
+
+    conditions = []
+    for config_index, config_data in enumerate(configs):
+
+        # Import module and instantiate object for specific condition with config data
+        condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"],
+                                           snp_file_name, config_data["snp_database"])
+        condition.genotype_cache = genotype_cache
+        condition.result_cache = result_cache
+        condition.tsv_workers = tsv_workers
+        condition.early_stop = early_stop
+        if metrics is not None:
+            condition.metrics = metrics
+
+        # Load SNP database
+        if templates is None:
+            condition.get_snp_db()
+        else:
+            condition.share_snp_db(templates[config_index])
+        conditions.append(condition)
+
+    return conditions
+
+# Get content from TSV files once and share it between conditions
+def get_shared_tsv_content(conditions):
+
+    # Union lookup of SNPs (and their chromosomes) of all conditions
+    snps = set()
+    snp_chromosomes = {}
+    for condition in conditions:
+        snps.update(condition.snp_db[C_SNP])
+        snp_chromosomes.update(condition.get_snp_chromosomes())
+
+    # Get content from TSV files (rows of database SNPs only)
+    first_condition = conditions[0]
+    first_condition.get_tsv_content(snps, snp_chromosomes)
+    first_condition.get_tsv_index()
+
+    # Share content and index between conditions
+    for condition in conditions:
+        condition.snp_file_name = first_condition.snp_file_name
+        condition.snp_file_hash = first_condition.snp_file_hash
+        condition.tsv_content = first_condition.tsv_content
+        condition.tsv_index = first_condition.tsv_index
+
+# Scan SNP file for conditions (results and summary per condition)
+def scan_conditions(conditions):
+
+    # Get content from TSV files (once for all conditions)
+    get_shared_tsv_content(conditions)
+
+    for condition in conditions:
+
+        # Get results for SNPs found in TSV content and SNP database
+        condition.get_snp_results()
+
+        # Summarize results
+        with condition.metrics.stage('summarize'):
+            condition.summarize_results()
+
+# Get results file names for condition (one pair of files per condition for multiple conditions)
+def get_results_file_names(config_data, multiple_conditions):
+
+    if multiple_conditions:
+        return f"results_{config_data['python_module']}.csv", f"results_{config_data['python_module']}.json"
+    return "results.csv", "results.json"
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Compiles SNP databases of all conditions into one validated binary bundle (memory-mapped by the scanners)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from condition import np, pd, RiskRules, C_CONDITION, C_APPLICATION, C_SNP, C_GENE, C_GENOTYPE, C_RISK_ALLELE, \
+    C_PROTECTIVE_ALLELE, C_REFERENCE, RULE_COLUMNS, NO_REL_RISK, V_TREATMENT
+
+# Bundle settings
+BUNDLE_FILE_NAME = '../db/snpdb.bundle'
+BUNDLE_MAGIC = b'GSDB'
+BUNDLE_VERSION = 2
+BUNDLE_HEADER = struct.Struct('<4sII') # magic, version, header length
+ALIGNMENT = 8 # bytes
+NO_STRING = -1 # string code of empty values
+V_STRING = 'str' # type of text columns (string codes)
+COLUMN_TYPECODES = {'int64': 'q', 'float64': 'd', 'bool': 'b'} # array typecodes of numeric columns (other columns as string codes)
+
+# Validation settings
+REQUIRED_COLUMNS = [C_CONDITION, C_APPLICATION, C_SNP, C_GENE, C_RISK_ALLELE, C_PROTECTIVE_ALLELE, C_REFERENCE]
+ALLELES = 'ACGTDI'
+VALIDATION_GENOTYPES = [allele_1 + allele_2 for allele_1 in 'ACGT' for allele_2 in 'ACGT'] # genotypes every rule must score
+
+# Opened bundles (by file name, None if missing or invalid)
+bundles = {}
+
+# Get padding of offset to alignment
+def get_padding(offset):
+    return -offset % ALIGNMENT
+
+# Get name of array of database column
+def get_column_array_name(column_count):
+    return f"column_{column_count}"
+
+# Get content hash of file
+def get_file_hash(file_name):
+    with open(file_name, 'rb') as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+# Get source file relative to bundle directory (symbolic links resolved, key of bundle entries)
+def get_source_file_name(file_name, bundle_dir):
+    return os.path.relpath(os.path.realpath(file_name), bundle_dir)
+
+# Get source file record (file relative to bundle directory, size, modification time and hash) to detect outdated bundles
+def get_source(file_name, bundle_dir):
+    stat = os.stat(file_name)
+    return {"file": get_source_file_name(file_name, bundle_dir), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "hash": get_file_hash(file_name)}
+
+# Validate SNP database of condition (list of error messages with csv line numbers)
+def validate_snp_db(condition, snp_db, snp_db_file_name):
+
+    from genotype_cache import snp_to_number
+
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in snp_db.columns]
+    if len(missing_columns):
+        return [f"{snp_db_file_name}: missing columns {missing_columns}"]
+
+    errors = []
+    for row_count, db_row in enumerate(snp_db.to_dict(orient='records')):
+        location = f"{snp_db_file_name} line {row_count + 2}"
+        if not isinstance(db_row[C_SNP], str) or snp_to_number(db_row[C_SNP]) is None:
+            errors.append(f"{location}: invalid SNP ID {db_row[C_SNP]}")
+            continue
+        if not isinstance(db_row[C_APPLICATION], str):
+            errors.append(f"{location}: missing application")
+            continue
+        risk_allele = db_row[C_RISK_ALLELE]
+        if not isinstance(risk_allele, str) or len(risk_allele) not in (1, 2) or any(allele not in ALLELES for allele in risk_allele):
+            errors.append(f"{location}: invalid risk allele {risk_allele}")
+            continue
+        if (V_TREATMENT in db_row[C_APPLICATION]) and len(db_row[C_APPLICATION].split('_')) != 3:
+            errors.append(f"{location}: treatment application {db_row[C_APPLICATION]} is not of the form Treatment_<medication>_<response>")
+            continue
+
+        # Risk rule has to score every genotype of two alleles
+        for genotype in VALIDATION_GENOTYPES:
+            try:
+                condition.get_risk_association({**db_row, C_GENOTYPE: genotype})
+            except Exception as error:
+                error_name = f"{type(error).__name__}: {error}" if str(error) else type(error).__name__
+                errors.append(f"{location}: risk rule fails for genotype {genotype} ({error_name})")
+                break
+    return errors
+
+# Compile SNP databases of conditions (config data) into bundle
+def compile_bundle(configs, bundle_file_name=BUNDLE_FILE_NAME):
+
+    from genotype_cache import snp_to_number
+    from scanner import import_and_instantiate
+
+    bundle_dir = os.path.dirname(os.path.realpath(bundle_file_name))
+    entries = {}
+    snp_dbs = {}
+    data = bytearray()
+    errors = []
+    for config_data in configs:
+        snp_db_file_name = config_data["snp_database"]
+        condition = import_and_instantiate(config_data["python_module"], config_data["class_constructor"], None, snp_db_file_name)
+        if not condition.RISK_RULES: # scored without risk rules (loaded from csv file)
+            continue
+
+        # SNP database compiled once per condition class (risk rules of another class are not served for it)
+        key = get_source_file_name(snp_db_file_name, bundle_dir)
+        if key in entries:
+            compiled_class = (entries[key]["python_module"], entries[key]["class_constructor"])
+            if compiled_class != (config_data["python_module"], config_data["class_constructor"]):
+                errors.append(f"{snp_db_file_name}: SNP database compiled for {'.'.join(compiled_class)} is also configured for "
+                              f"{config_data['python_module']}.{config_data['class_constructor']} (one condition class per SNP database)")
+            continue
+        snp_db = pd.read_csv(snp_db_file_name)
+        snp_db_errors = validate_snp_db(condition, snp_db, snp_db_file_name)
+        errors.extend(snp_db_errors)
+        if len(snp_db_errors):
+            continue
+        risk_rules = RiskRules(snp_db, condition.get_risk_association)
+
+        # Interned strings (empty values as NaN)
+        strings = {}
+        def get_string_code(value):
+            return NO_STRING if not isinstance(value, str) else strings.setdefault(value, len(strings))
+        columns = list(snp_db.columns)
+        column_types = [str(snp_db[column].dtype) if str(snp_db[column].dtype) in COLUMN_TYPECODES else V_STRING for column in columns]
+        rules = [[get_string_code(rule[column]) for column in RULE_COLUMNS] for rule in risk_rules.rules]
+        associations = [get_string_code(association) for association in risk_rules.associations.ravel()]
+
+        # Arrays (numeric rsID keys, columns as string codes or typed values, precompiled risk rules)
+        arrays = {'snps': array('q', [snp_to_number(snp) for snp in snp_db[C_SNP]])}
+        for column_count, (column, column_type) in enumerate(zip(columns, column_types)):
+            if column_type == V_STRING:
+                arrays[get_column_array_name(column_count)] = array('i', [get_string_code(value) for value in snp_db[column]])
+            else:
+                arrays[get_column_array_name(column_count)] = array(COLUMN_TYPECODES[column_type], snp_db[column].tolist())
+        arrays.update({
+            'rule_index': array('i', risk_rules.rule_index.tolist()),
+            'risks': array('d', risk_rules.risks.ravel().tolist()),
+            'max_risks': array('d', risk_rules.max_risks.ravel().tolist()),
+            'associations': array('i', associations)
+        })
+        array_offsets = {}
+        for name, values_array in arrays.items():
+            data.extend(bytes(get_padding(len(data))))
+            array_offsets[name] = [len(data), values_array.typecode, len(values_array)]
+            data.extend(values_array.tobytes())
+
+        module_file_name = sys.modules[type(condition).__module__].__file__
+        snp_dbs[key] = snp_db
+        entries[key] = {
+            "python_module": config_data["python_module"],
+            "class_constructor": config_data["class_constructor"],
+            "sources": [get_source(snp_db_file_name, bundle_dir), get_source(module_file_name, bundle_dir)],
+            "rows": len(snp_db.index),
+            "columns": columns,
+            "column_types": column_types,
+            "strings": list(strings),
+            "rules": rules,
+            "genotypes": list(risk_rules.genotype_codes),
+            "arrays": array_offsets
+        }
+
+    if len(errors):
+        raise ValueError("Invalid SNP databases:\n" + "\n".join(errors))
+
+    # Header, header json and aligned arrays written to temporary file and moved into place
+    header = json.dumps({"version": BUNDLE_VERSION, "entries": entries}).encode()
+    temp_file_name = bundle_file_name + '.tmp'
+    with open(temp_file_name, 'wb') as bundle_file:
+        bundle_file.write(BUNDLE_HEADER.pack(BUNDLE_MAGIC, BUNDLE_VERSION, len(header)))
+        bundle_file.write(header)
+        bundle_file.write(bytes(get_padding(BUNDLE_HEADER.size + len(header))))
+        bundle_file.write(data)
+
+    # SNP databases of the bundle have to be the same as read from their csv files
+    bundle = SnpDbBundle(temp_file_name)
+    for key, snp_db in snp_dbs.items():
+        try:
+            pd.testing.assert_frame_equal(bundle.get_table(entries[key]), snp_db)
+        except AssertionError as error:
+            errors.append(f"{key}: SNP database of bundle differs from csv file ({error})")
+    bundle.close()
+    if len(errors):
+        os.remove(temp_file_name)
+        raise ValueError("Invalid SNP database bundle:\n" + "\n".join(errors))
+    os.replace(temp_file_name, bundle_file_name)
+    return entries
+
+class SnpDbBundle:
+    def __init__(self, bundle_file_name=BUNDLE_FILE_NAME):
+        self.bundle_file_name = bundle_file_name
+        self.bundle_dir = os.path.dirname(os.path.realpath(bundle_file_name))
+        with open(bundle_file_name, 'rb') as bundle_file:
+            self.buffer = mmap.mmap(bundle_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, header_length = BUNDLE_HEADER.unpack_from(self.buffer)
+        if (magic != BUNDLE_MAGIC) or (version != BUNDLE_VERSION):
+            raise ValueError(f"{bundle_file_name} is not a SNP database bundle of version {BUNDLE_VERSION}")
+        self.header = json.loads(self.buffer[BUNDLE_HEADER.size:BUNDLE_HEADER.size + header_length])
+        self.data_offset = BUNDLE_HEADER.size + header_length + get_padding(BUNDLE_HEADER.size + header_length)
+        self.up_to_date = {}
+
+    # Check if sources (SNP database and condition module) of entry are unchanged since compilation
+    def is_up_to_date(self, key):
+
+        if key not in self.up_to_date:
+            up_to_date = True
+            for source in self.header["entries"][key]["sources"]:
+                file_name = os.path.join(self.bundle_dir, source["file"])
+                if not os.path.exists(file_name):
+                    up_to_date = False
+                    break
+                stat = os.stat(file_name)
+                if ((stat.st_size, stat.st_mtime_ns) != (source["size"], source["mtime_ns"])) and (get_file_hash(file_name) != source["hash"]):
+                    up_to_date = False
+                    break
+            if not up_to_date:
+                print(f"SNP database bundle {self.bundle_file_name} is out of date for {key} (reading the csv file instead)")
+            self.up_to_date[key] = up_to_date
+        return self.up_to_date[key]
+
+    # Get entry of SNP database of condition class (None if not in bundle, compiled for another class or out of date)
+    # Entries are keyed by their SNP database file relative to the bundle directory (other files of the same name are not in the bundle)
+    def get_entry(self, snp_db_file_name, condition_class):
+        key = get_source_file_name(snp_db_file_name, self.bundle_dir)
+        entry = self.header["entries"].get(key)
+        if (entry is None) or ((entry["python_module"], entry["class_constructor"]) != (condition_class.__module__, condition_class.__name__)):
+            return None
+        if not self.is_up_to_date(key):
+            return None
+        return entry
+
+    # Check if SNP database of condition class is in bundle and up to date
+    def contains(self, snp_db_file_name, condition_class):
+        return self.get_entry(snp_db_file_name, condition_class) is not None
+
+    # Get array of entry (memory-mapped, read only)
+    def get_array(self, entry, name):
+        offset, typecode, length = entry["arrays"][name]
+        start = self.data_offset + offset
+        return memoryview(self.buffer)[start:start + length * array(typecode).itemsize].cast(typecode)
+
+    # Get strings of entry (empty values as NaN at string code -1)
+    def get_strings(self, entry):
+        return entry["strings"] + [NO_REL_RISK]
+
+    # Get SNP database as list of rows (no numpy and pandas needed)
+    def get_rows(self, snp_db_file_name, condition_class):
+
+        entry = self.get_entry(snp_db_file_name, condition_class)
+        strings = self.get_strings(entry)
+        columns = []
+        for column_count, column_type in enumerate(entry["column_types"]):
+            values = self.get_array(entry, get_column_array_name(column_count))
+            if column_type == V_STRING:
+                columns.append([strings[code] for code in values])
+            else:
+                columns.append([bool(value) for value in values] if column_type == 'bool' else values.tolist())
+        return [dict(zip(entry["columns"], row)) for row in zip(*columns)]
+
+    # Get table of entry (text columns as strings, numeric columns as copies of their typed arrays)
+    def get_table(self, entry):
+
+        strings = np.array(self.get_strings(entry), dtype=object)
+        table = {}
+        for column_count, (column, column_type) in enumerate(zip(entry["columns"], entry["column_types"])):
+            values = self.get_array(entry, get_column_array_name(column_count))
+            if column_type == V_STRING:
+                table[column] = strings[np.frombuffer(values, dtype=np.int32)]
+            else:
+                table[column] = np.frombuffer(values, dtype=column_type).copy()
+        return pd.DataFrame(table, columns=entry["columns"], index=pd.RangeIndex(entry["rows"]))
+
+    # Get SNP database as table (same as read from csv file)
+    def get_snp_db(self, snp_db_file_name, condition_class):
+        return self.get_table(self.get_entry(snp_db_file_name, condition_class))
+
+    # Close memory-mapped bundle
+    def close(self):
+        self.buffer.close()
+
+    # Get precompiled risk rules of SNP database of condition class
+    def get_risk_rules(self, snp_db_file_name, condition_class, get_risk_association):
+
+        entry = self.get_entry(snp_db_file_name, condition_class)
+        strings = self.get_strings(entry)
+        rules = [dict(zip(RULE_COLUMNS, [strings[code] for code in rule])) for rule in entry["rules"]]
+        shape = (len(rules), len(entry["genotypes"]))
+        associations = np.array(strings[:-1] + [None], dtype=object)[np.frombuffer(self.get_array(entry, 'associations'), dtype=np.int32)]
+        compiled = (
+            np.frombuffer(self.get_array(entry, 'rule_index'), dtype=np.int32),
+            rules,
+            {genotype: genotype_count for genotype_count, genotype in enumerate(entry["genotypes"])},
+            np.frombuffer(self.get_array(entry, 'risks'), dtype=np.float64).reshape(shape),
+            np.frombuffer(self.get_array(entry, 'max_risks'), dtype=np.float64).reshape(shape),
+            associations.reshape(shape)
+        )
+        return RiskRules(None, get_risk_association, compiled)
+
+# Get opened SNP database bundle (None if no bundle was compiled or the bundle is invalid)
+def get_bundle(bundle_file_name=BUNDLE_FILE_NAME):
+
+    if bundle_file_name not in bundles:
+        bundle = None
+        if os.path.exists(bundle_file_name):
+            try:
+                bundle = SnpDbBundle(bundle_file_name)
+            except (ValueError, struct.error) as error:
+                print(f"SNP database bundle not used: {error}")
+        bundles[bundle_file_name] = bundle
+    return bundles[bundle_file_name]
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('configs', nargs='*', default=['../config'], help="config files or directories of config files (default: ../config)")
+    parser.add_argument('--output', default=BUNDLE_FILE_NAME, help="bundle file")
+    args = parser.parse_args()
+
+    from scanner import get_config_file_names, get_config
+    configs = [get_config(config_file_name) for config_file_name in get_config_file_names(args.configs)]
+    try:
+        entries = compile_bundle(configs, args.output)
+    except ValueError as error:
+        print(error)
+        exit(1)
+    print(f"Compiled {len(entries)} SNP databases ({sum(entry['rows'] for entry in entries.values())} rows) into {args.output}")
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Readers of genotype files (23andMe, AncestryDNA, MyHeritage, VCF), detected by sniffing the start of the file
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+from abc import abstractmethod
+import codecs
+import csv
+import gzip
+import io
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from condition import np, pd, TSV_COLUMNS
+
+# Reader settings
+SNIFF_SIZE = 65536 # bytes read from the start of a genotype file to detect its format
+GZIP_MAGIC = b'\x1f\x8b'
+V_NO_CALL = '--'
+GT_SEPARATOR = re.compile('[/|]')
+ANCESTRYDNA_HEADER = ['rsid', 'chromosome', 'position', 'allele1', 'allele2']
+ANCESTRYDNA_CHROMOSOMES = {'23': 'X', '24': 'Y', '25': 'X', '26': 'MT'} # numbered chromosomes (25: pseudoautosomal region of X)
+ANCESTRYDNA_NO_CALL = '0'
+MYHERITAGE_HEADER = ['RSID', 'CHROMOSOME', 'POSITION', 'RESULT']
+VCF_FILE_FORMAT = '##fileformat=VCF'
+VCF_HEADER = '#CHROM'
+VCF_COLUMNS = [0, 1, 2, 3, 4, 9] # chromosome, position, SNP, reference allele, alternative alleles, first sample
+LINE_BLOCK_SIZE = 16 * 1024 ** 2 # bytes of lines prefiltered at once
+SNP_KEY_BYTES = 8 # bytes from the start and from the end of SNP IDs packed into lookup keys
+SNP_KEY_MIX = 0x9E3779B97F4A7C15 # multiplier mixing start and end bytes of SNP IDs into lookup keys
+TAB, NEWLINE, HASH = ord('\t'), ord('\n'), ord('#')
+CHROMOSOME_FILE_NAME = re.compile(r'(?:^|[^a-z0-9])(?:chr|chrom|chromosome)[_-]?([0-9]{1,2}|x|y|mt|m)(?![a-z0-9])', re.IGNORECASE)
+
+# Normalize chromosome name (e.g. chr1 -> 1, chrM -> MT)
+def normalize_chromosome(chromosome):
+
+    chromosome = str(chromosome)
+    if chromosome.lower().startswith('chr'):
+        chromosome = chromosome[3:]
+    if chromosome == 'M':
+        chromosome = 'MT'
+    return chromosome
+
+# Decode GT value (e.g. 0|1) into genotype (e.g. CT) for alleles (reference allele first)
+# Missing calls (e.g. ./.) are decoded as no call
+def decode_gt(gt_value, alleles):
+
+    allele_indices = GT_SEPARATOR.split(gt_value)
+    if not all(allele_index.isdigit() and int(allele_index) < len(alleles) for allele_index in allele_indices):
+        return V_NO_CALL
+    return ''.join(alleles[int(allele_index)] for allele_index in allele_indices)
+
+# Decode GT values of records into genotypes (as decode_gt, vectorized over the records of a chunk)
+def decode_gt_values(gt_values, refs, alts):
+
+    alleles = pd.concat([refs, alts.str.split(',', expand=True)], axis=1, ignore_index=True).to_numpy(dtype=object)
+    allele_indices = gt_values.str.split(GT_SEPARATOR.pattern, regex=True, expand=True)
+    genotypes = np.full(len(gt_values.index), '', dtype=object)
+    called = np.ones(len(gt_values.index), dtype=bool)
+    for column in allele_indices.columns:
+        values = allele_indices[column]
+        present = values.notna().to_numpy()
+        digits = values.str.isdigit().fillna(False).to_numpy(dtype=bool)
+        indices = pd.to_numeric(values.where(digits)).to_numpy(dtype=float, na_value=np.nan)
+        rows = np.flatnonzero(indices < alleles.shape[1])
+        decoded = np.full(len(gt_values.index), None, dtype=object)
+        decoded[rows] = alleles[rows, indices[rows].astype(np.int64)]
+        valid = pd.notna(decoded) # allele index of the record
+        called &= valid | ~present
+        genotypes[valid] = genotypes[valid] + decoded[valid]
+    genotypes[~called] = V_NO_CALL
+    return genotypes
+
+# Get first data lines (not comments) of lines
+def get_data_lines(lines, count=1):
+    return [line for line in lines if not line.startswith('#')][:count]
+
+# Read blocks of complete lines from binary file object (e.g. zip member or gzip-compressed file), without byte order mark
+# The next block is read and decompressed on a thread while the current block is scanned
+def read_line_blocks(binary_file, block_size=LINE_BLOCK_SIZE):
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        next_block = executor.submit(binary_file.read, block_size)
+        rest = None
+        while True:
+            block = next_block.result()
+            if not block:
+                break
+            next_block = executor.submit(binary_file.read, block_size)
+            block = rest + block if rest is not None else block.removeprefix(codecs.BOM_UTF8)
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            if end:
+                yield block[:end]
+        if rest:
+            yield rest + b'\n'
+
+# Get lookup keys of the byte strings buf[starts:ends] (start and end bytes and length mixed into 64 bits)
+# Different strings may share a key, lines of matching keys are confirmed when parsed
+def get_snp_keys(buf, starts, ends):
+
+    offsets = np.arange(SNP_KEY_BYTES)
+    first = starts[:, None] + offsets
+    last = ends[:, None] - SNP_KEY_BYTES + offsets
+    first_bytes = buf[np.minimum(first, len(buf) - 1)]
+    first_bytes[first >= ends[:, None]] = 0
+    last_bytes = buf[np.maximum(last, 0)]
+    last_bytes[last < starts[:, None]] = 0
+    return first_bytes.view(np.uint64).ravel() * np.uint64(SNP_KEY_MIX) + last_bytes.view(np.uint64).ravel() + (ends - starts).astype(np.uint64)
+
+# Get sorted lookup keys of SNP IDs
+def get_wanted_keys(snps):
+
+    wanted = [snp.encode() for snp in snps]
+    if len(wanted) == 0:
+        return np.array([], dtype=np.uint64)
+    ends = np.cumsum([len(snp) + 1 for snp in wanted]) - 1
+    starts = ends - [len(snp) for snp in wanted]
+    return np.unique(get_snp_keys(np.frombuffer(b'\t'.join(wanted) + b'\t', np.uint8), starts, ends))
+
+# Check which lookup keys are among the sorted wanted keys
+def is_wanted(keys, wanted_keys):
+
+    if len(wanted_keys) == 0:
+        return np.zeros(len(keys), dtype=bool)
+    return wanted_keys[np.minimum(np.searchsorted(wanted_keys, keys), len(wanted_keys) - 1)] == keys
+
+# Get empty table of rows (TSV_COLUMNS, column types of parsed rows)
+def get_empty_rows():
+    return pd.DataFrame({0: pd.Series(dtype=object), 1: pd.Series(dtype=object), 2: pd.Series(dtype=np.int64), 3: pd.Series(dtype=object)})
+
+# Locate SNP field (by index of tab separated fields) in the lines of block (complete lines)
+# Returns bytes of block, starts and ends of lines and SNP fields and mask of data lines (not comments, SNP field complete)
+def locate_snp_fields(block, snp_field):
+
+    buf = np.frombuffer(block, np.uint8)
+    line_ends = np.flatnonzero(buf == NEWLINE)
+    line_starts = np.concatenate(([0], line_ends[:-1] + 1))
+    tabs = np.flatnonzero(buf == TAB)
+    if len(tabs) <= snp_field:
+        return buf, line_starts, line_ends, line_starts, line_starts, np.zeros(len(line_starts), dtype=bool)
+    first_tabs = np.minimum(np.searchsorted(tabs, line_starts), len(tabs) - snp_field - 1)
+    snp_starts = tabs[first_tabs + snp_field - 1] + 1 if snp_field else line_starts
+    snp_ends = tabs[first_tabs + snp_field]
+    records = (buf[line_starts] != HASH) & (tabs[first_tabs] >= line_starts) & (snp_ends < line_ends)
+    return buf, line_starts, line_ends, snp_starts, snp_ends, records
+
+# Reader of a genotype file format
+# Readers stream (SNP, chromosome, position, genotype) rows as tables in chunks (TSV_COLUMNS, full scan)
+# or as tuples of text fields (lightweight scan without numpy and pandas)
+class SnpReader:
+    name = None
+    snp_field = None # index of the tab separated SNP field of data lines (None: lines are not prefiltered by SNP)
+
+    # Check if first lines of a genotype file are of the reader's format
+    @abstractmethod
+    def sniff(self, lines):
+        pass
+
+    # Read genotype file (binary file object) in chunks of rows (tables of TSV_COLUMNS)
+    @abstractmethod
+    def read_chunks(self, genotype_file, chunk_size):
+        pass
+
+    # Parse data lines (binary file object, no header lines needed) in chunks of rows (tables of TSV_COLUMNS)
+    def parse_chunks(self, lines_file, chunk_size):
+        return self.read_chunks(lines_file, chunk_size)
+
+    # Read rows of wanted SNPs (sorted lookup keys) from genotype file (binary file object) in blocks of lines
+    # The SNP fields of a block are looked up on their bytes at once, only lines of wanted keys are parsed
+    # Yields number of data lines and table of parsed lines (TSV_COLUMNS, may contain SNPs sharing a key) per block
+    def read_snp_blocks(self, genotype_file, wanted_keys, chunk_size):
+
+        for block in read_line_blocks(genotype_file):
+            buf, line_starts, line_ends, snp_starts, snp_ends, records = locate_snp_fields(block, self.snp_field)
+            wanted = records & is_wanted(get_snp_keys(buf, snp_starts, snp_ends), wanted_keys)
+            if not wanted.any():
+                yield int(np.count_nonzero(records)), get_empty_rows()
+                continue
+            lines = block if wanted.all() else buf[np.repeat(wanted, line_ends - line_starts + 1)].tobytes()
+            yield int(np.count_nonzero(records)), pd.concat(self.parse_chunks(io.BytesIO(lines), chunk_size), ignore_index=True)
+
+    # Read rows of text lines as (SNP, chromosome, position, genotype) tuples
+    @abstractmethod
+    def read_rows(self, lines):
+        pass
+
+# 23andMe TSV files (SNP, chromosome, position, genotype), also the default for other files of four tab separated columns
+class TwentyThreeAndMeReader(SnpReader):
+    name = '23andme'
+    snp_field = 0
+
+    def sniff(self, lines):
+        data_lines = get_data_lines(lines)
+        return (len(data_lines) == 0) or (len(data_lines[0].split('\t')) >= len(TSV_COLUMNS))
+
+    def read_chunks(self, genotype_file, chunk_size):
+        return pd.read_csv(genotype_file, sep='\t', header=None, comment='#', usecols=TSV_COLUMNS,
+                           dtype={0: str, 1: str, 3: str}, chunksize=chunk_size)
+
+    def read_rows(self, lines):
+        for line in lines:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\r\n').split('\t', 4)
+            if len(fields) > 3:
+                yield fields[0], fields[1], fields[2], fields[3]
+
+# AncestryDNA TSV files (header line, SNP, chromosome number, position, both alleles, 0 for no call)
+class AncestryDnaReader(SnpReader):
+    name = 'ancestrydna'
+    snp_field = 0
+
+    def sniff(self, lines):
+        data_lines = get_data_lines(lines)
+        return (len(data_lines) == 1) and (data_lines[0].rstrip('\r\n').lower().split('\t') == ANCESTRYDNA_HEADER)
+
+    def read_chunks(self, genotype_file, chunk_size):
+
+        for chunk in pd.read_csv(genotype_file, sep='\t', header=None, comment='#', usecols=[0, 1, 2, 3, 4], dtype=str, chunksize=chunk_size):
+            chunk = chunk.loc[chunk[0].str.lower() != ANCESTRYDNA_HEADER[0]]
+            no_call = (chunk[3] == ANCESTRYDNA_NO_CALL) | (chunk[4] == ANCESTRYDNA_NO_CALL)
+            yield pd.DataFrame({0: chunk[0].values, 1: chunk[1].replace(ANCESTRYDNA_CHROMOSOMES).values,
+                                2: pd.to_numeric(chunk[2]).values, 3: (chunk[3] + chunk[4]).where(~no_call, V_NO_CALL).values})
+
+    def read_rows(self, lines):
+        for line in lines:
+            fields = line.rstrip('\r\n').split('\t')
+            if line.startswith('#') or (len(fields) < len(ANCESTRYDNA_HEADER)) or (fields[0].lower() == ANCESTRYDNA_HEADER[0]):
+                continue
+            no_call = ANCESTRYDNA_NO_CALL in (fields[3], fields[4])
+            yield fields[0], ANCESTRYDNA_CHROMOSOMES.get(fields[1], fields[1]), fields[2], V_NO_CALL if no_call else fields[3] + fields[4]
+
+# MyHeritage (and FamilyTreeDNA) csv files (header line, quoted SNP, chromosome, position, genotype)
+class MyHeritageReader(SnpReader):
+    name = 'myheritage'
+
+    def sniff(self, lines):
+        data_lines = get_data_lines(lines)
+        return (len(data_lines) == 1) and ([field.upper() for field in next(csv.reader(data_lines))] == MYHERITAGE_HEADER)
+
+    def read_chunks(self, genotype_file, chunk_size):
+
+        for chunk in pd.read_csv(genotype_file, sep=',', header=None, comment='#', usecols=TSV_COLUMNS, dtype=str, chunksize=chunk_size):
+            chunk = chunk.loc[chunk[0].str.upper() != MYHERITAGE_HEADER[0]]
+            yield pd.DataFrame({0: chunk[0].values, 1: chunk[1].values, 2: pd.to_numeric(chunk[2]).values, 3: chunk[3].values})
+
+    def read_rows(self, lines):
+        for fields in csv.reader(line for line in lines if not line.startswith('#')):
+            if (len(fields) >= len(MYHERITAGE_HEADER)) and (fields[0].upper() != MYHERITAGE_HEADER[0]):
+                yield fields[0], fields[1], fields[2], fields[3]
+
+# VCF files (genotypes of the first sample, records without SNP ID are kept with ID .)
+class VcfReader(SnpReader):
+    name = 'vcf'
+    snp_field = 2
+
+    def sniff(self, lines):
+        return (len(lines) > 0) and lines[0].startswith(VCF_FILE_FORMAT)
+
+    def read_chunks(self, genotype_file, chunk_size):
+
+        # Header lines are skipped up to the column header line, records are parsed in chunks
+        vcf_file = io.TextIOWrapper(genotype_file, encoding='utf-8')
+        line = vcf_file.readline()
+        while line and not line.startswith(VCF_HEADER):
+            line = vcf_file.readline()
+        return self.parse_chunks(vcf_file, chunk_size)
+
+    def parse_chunks(self, lines_file, chunk_size):
+
+        for chunk in pd.read_csv(lines_file, sep='\t', header=None, usecols=VCF_COLUMNS, dtype=str, chunksize=chunk_size):
+            gt_values = chunk[9].str.split(':', n=1).str[0]
+            yield pd.DataFrame({0: chunk[2].values, 1: chunk[0].map(normalize_chromosome).values,
+                                2: pd.to_numeric(chunk[1]).values, 3: decode_gt_values(gt_values, chunk[3], chunk[4])})
+
+    def read_rows(self, lines):
+        for line in lines:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\r\n').split('\t', 10)
+            if len(fields) > 9:
+                yield fields[2], normalize_chromosome(fields[0]), fields[1], decode_gt(fields[9].split(':', 1)[0], [fields[3]] + fields[4].split(','))
+
+# Readers in sniffing order (first reader recognizing the start of a file is used, 23andMe last as default)
+READERS = [VcfReader(), AncestryDnaReader(), MyHeritageReader(), TwentyThreeAndMeReader()]
+
+# Register reader of another genotype file format (sniffed before the built-in readers)
+def register_reader(reader):
+    READERS.insert(0, reader)
+    return reader
+
+# Get reader for the first bytes of a genotype file
+def get_reader(head):
+
+    lines = head.decode('utf-8-sig', errors='replace').splitlines()
+    if len(head) >= SNIFF_SIZE:
+        lines = lines[:-1] # last line may be cut off
+    for reader in READERS:
+        if reader.sniff(lines):
+            return reader
+    raise ValueError(f"Unknown genotype file format (supported formats: {', '.join(reader.name for reader in READERS)})")
+
+# Get reader of genotype file (binary file object, first bytes are read)
+def sniff_reader(genotype_file):
+    return get_reader(genotype_file.read(SNIFF_SIZE))
+
+# Open genotype file as binary file object (gzip-compressed files, e.g. .vcf.gz, are decompressed)
+def open_genotype_file(file_name):
+
+    with open(file_name, 'rb') as genotype_file:
+        magic = genotype_file.read(len(GZIP_MAGIC))
+    return gzip.open(file_name, 'rb') if magic == GZIP_MAGIC else open(file_name, 'rb')
+
+# Get chromosome of genotype file of zip file (per-chromosome zip files) from its file name (e.g. chr1.txt, genome_chrX.txt)
+# or otherwise from its first data line (None if not known)
+def get_member_chromosome(zip_file, member, reader):
+
+    match = CHROMOSOME_FILE_NAME.search(os.path.splitext(os.path.basename(member))[0])
+    if match is not None:
+        chromosome = match.group(1).upper()
+        return normalize_chromosome(str(int(chromosome)) if chromosome.isdigit() else chromosome)
+    with io.TextIOWrapper(zip_file.open(member), encoding='utf-8') as member_file:
+        row = next(reader.read_rows(member_file), None)
+    return normalize_chromosome(row[1]) if row is not None else None
+
+# Select genotype files of zip file holding the chromosomes of SNPs (SNP -> chromosome) if the zip file has one file per chromosome
+# All members are selected if the selection is ambiguous: SNPs without chromosome, members without chromosome,
+# several members of a chromosome or chromosomes of SNPs without member
+def select_members(zip_file, members, reader, snps, snp_chromosomes):
+
+    chromosomes = {snp_chromosomes.get(snp) for snp in snps}
+    if (len(members) < 2) or (len(chromosomes) == 0) or (None in chromosomes):
+        return members
+    member_chromosomes = [get_member_chromosome(zip_file, member, reader) for member in members]
+    if (None in member_chromosomes) or (len(set(member_chromosomes)) < len(members)) or not chromosomes.issubset(member_chromosomes):
+        return members
+    return [member for member, chromosome in zip(members, member_chromosomes) if chromosome in chromosomes]
+
+# Check if SNPs were found on their chromosomes (SNP -> chromosome) in (SNP, chromosome) pairs of rows of selected members
+# (otherwise the members of other chromosomes may hold SNPs too)
+def is_chromosome_match(snp_chromosome_pairs, snp_chromosomes):
+    return all(normalize_chromosome(chromosome) == snp_chromosomes.get(snp) for snp, chromosome in snp_chromosome_pairs)
@@ -10,7 +10,6 @@ __maintainer__ = "Melanie Senn"
 __email__ = "melanie.senn@gmail.com"
 
 from condition import *
-import json
 
 # Name constants
 V_TREATMENT_TNF_POS = 'Treatment_TNF-Inhibitor_Positive'
@@ -20,6 +19,15 @@ V_TREATMENT_CLIN_RESP = 'clinical response'
 ASSOCIATIONS_DIAGNOSIS = ['Average risk', 'Small increase in risk', 'Increased risk']
 ASSOCIATIONS_TREATMENT_OPPORTUNITY = ['Low opportunity', 'High opportunity']
 
+# Get diagnostic risk association for relative risk
+# Average risk (0), small increase in risk (<= 0.5), increased risk (> 0.5 or no SNP found)
+def get_diagnostic_risk_association(rel_risk):
+    if rel_risk == 0.0:
+        return ASSOCIATIONS_DIAGNOSIS[0]
+    elif rel_risk <= 0.5:
+        return ASSOCIATIONS_DIAGNOSIS[1]
+    return ASSOCIATIONS_DIAGNOSIS[2]
+
 class Spondyloarthritis(Condition):
     def __init__(self, snp_file_name, snp_db_file_name):
         super().__init__(snp_file_name, snp_db_file_name)
@@ -70,50 +78,40 @@ class Spondyloarthritis(Condition):
 
         return risk, max_risk, association
 
-    # Summarize results from single SNPs into conclusion
-    def summarize_results(self):
-
-        # Diagnostic summary
-        diagnostic_results = self.snp_results.loc[self.snp_results[C_APPLICATION] == V_DIAGNOSIS]
-        diagnostic_risk = diagnostic_results[C_RISK].sum()
-        diagnostic_max_risk = diagnostic_results[C_MAX_RISK].sum()
-        diagnostic_rel_risk = diagnostic_risk / diagnostic_max_risk
+    # Get risk associations for relative risks per application (application -> relative risk)
+    def get_risk_associations(self, rel_risks):
 
-        # Average risk
-        if diagnostic_rel_risk == 0.0:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[0]
+        # Treatment summary: low (<= 0.3) or high treatment opportunity
+        def get_treatment_risk_association(treatment_rel_risk):
+            return ASSOCIATIONS_TREATMENT_OPPORTUNITY[0] if treatment_rel_risk <= 0.3 else ASSOCIATIONS_TREATMENT_OPPORTUNITY[1]
 
-        # Small increase in risk
-        elif diagnostic_rel_risk <= 0.5:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[1]
-
-        # Increased risk
-        else:
-            diagnostic_risk_association = ASSOCIATIONS_DIAGNOSIS[2]
+        risk_associations = {
+            V_DIAGNOSIS: get_diagnostic_risk_association(rel_risks.get(V_DIAGNOSIS, NO_REL_RISK)), # diagnostic summary
+            V_TREATMENT_TNF_POS: get_treatment_risk_association(rel_risks.get(V_TREATMENT_TNF_POS, NO_REL_RISK)), # TNF Inhibitor
+            V_TREATMENT_MTX_POS: get_treatment_risk_association(rel_risks.get(V_TREATMENT_MTX_POS, NO_REL_RISK)) # Methotrexate
+        }
 
-        # Treatment summary
-        # Get relative risk for treatment options
-        def get_rel_risk(treatment_application):
-            treatment_results = self.snp_results.loc[self.snp_results[C_APPLICATION] == treatment_application]
-            treatment_risk = treatment_results[C_RISK].sum()
-            treatment_max_risk = treatment_results[C_MAX_RISK].sum()
-            treatment_rel_risk = treatment_risk / treatment_max_risk
+        return risk_associations
 
-            # Low treatment opportunity
-            if treatment_rel_risk <= 0.3:
-                treatment_risk_association = ASSOCIATIONS_TREATMENT_OPPORTUNITY[0]
+    # Summarize relative risks per application (application -> relative risk) into summary scores (json keys and values)
+    def summarize_rel_risks(self, rel_risks):
 
-            # High treatment opportunity
-            else:
-                treatment_risk_association = ASSOCIATIONS_TREATMENT_OPPORTUNITY[1]
+        risk_associations = self.get_risk_associations(rel_risks)
+        summary = {
+            "dianogstic_score": risk_associations[V_DIAGNOSIS],
+            "tnf_treatment_score": risk_associations[V_TREATMENT_TNF_POS] + V_TREATMENT_CLIN_RESP_POS,
+            "mr_treatment_score": risk_associations[V_TREATMENT_MTX_POS] + V_TREATMENT_CLIN_RESP_POS
+        }
 
-            return treatment_risk_association
+        return summary
 
-        # TNF Inhibitor
-        treatment_risk_association_tnf_pos = get_rel_risk(V_TREATMENT_TNF_POS)
+    # Summarize results from single SNPs into conclusion (relative risks per application computed from results if not given)
+    def summarize_results(self, rel_risks=None):
 
-        # Methotrexate
-        treatment_risk_association_mtx_pos = get_rel_risk(V_TREATMENT_MTX_POS)
+        risk_associations = self.get_risk_associations(self.get_result_rel_risks() if rel_risks is None else rel_risks)
+        diagnostic_risk_association = risk_associations[V_DIAGNOSIS]
+        treatment_risk_association_tnf_pos = risk_associations[V_TREATMENT_TNF_POS]
+        treatment_risk_association_mtx_pos = risk_associations[V_TREATMENT_MTX_POS]
 
         self.diagnostic_risk_association = diagnostic_risk_association
         self.treatment_risk_association_tnf_pos = treatment_risk_association_tnf_pos
@@ -124,19 +122,10 @@ class Spondyloarthritis(Condition):
         print('\nYour TNF inhibitor treatment insights: ' + treatment_risk_association_tnf_pos + V_TREATMENT_CLIN_RESP_POS)
         print('\nYour Methotrexate treatment insights: ' + treatment_risk_association_mtx_pos + V_TREATMENT_CLIN_RESP_POS)
 
-    # Save results (csv and json)
-    def save_results(self, results_csv_file_name, results_json_file_name):
-
-        super().save_results(results_csv_file_name, results_json_file_name)
-
-        # json file
-        result_dic = {
+    # Get summary scores of results (json keys and values)
+    def get_summary(self):
+        return {
             "dianogstic_score": self.diagnostic_risk_association,
             "tnf_treatment_score": self.treatment_risk_association_tnf_pos + V_TREATMENT_CLIN_RESP_POS,
-            "mr_treatment_score" : self.treatment_risk_association_mtx_pos + V_TREATMENT_CLIN_RESP_POS,
-            "data" : self.snp_results.to_dict(orient='records')
+            "mr_treatment_score" : self.treatment_risk_association_mtx_pos + V_TREATMENT_CLIN_RESP_POS
         }
-
-        # Convert and write JSON object to file
-        with open(results_json_file_name, "w") as outfile:
-            json.dump(result_dic, outfile)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Startup import time report of scans (python -X importtime)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import os
+import subprocess
+import sys
+
+# Startup settings
+STARTUP_BUDGET_MS = 100 # import time budget of the lightweight scan
+REPORT_MODULE_COUNT = 8 # slowest top level imports reported
+LITE_MODULES = ['lite']
+FULL_MODULES = ['numpy', 'pandas', 'scanner'] # tables of the full scan (loaded before lazy imports of condition)
+
+# Get import times in ms (top level module -> cumulative import time) of modules in a fresh interpreter
+def get_import_times(modules):
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + ', '.join(modules)],
+                             cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True)
+
+    # Lines: "import time: self [us] | cumulative | imported package" (nested imports are indented)
+    import_times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or line.endswith('imported package'):
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            import_times[name.strip()] = int(cumulative) / 1000
+    return import_times
+
+# Print import times of lightweight and full scan for condition modules
+def print_startup_report(condition_modules):
+
+    for scan_name, modules in [('Lightweight scan', LITE_MODULES), ('Full scan', FULL_MODULES)]:
+        import_times = get_import_times(modules + condition_modules)
+        total_time = sum(import_times.values())
+        print(f"\n{scan_name}: {total_time:.1f} ms imports")
+        for name, import_time in sorted(import_times.items(), key=lambda item: -item[1])[:REPORT_MODULE_COUNT]:
+            print(f"  {import_time:8.1f} ms  {name}")
+        if scan_name == 'Lightweight scan':
+            print(f"  Budget {STARTUP_BUDGET_MS} ms: {'OK' if total_time <= STARTUP_BUDGET_MS else 'exceeded'}")
+
+if __name__ == '__main__':
+    print_startup_report(sys.argv[1:])
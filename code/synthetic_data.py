@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic 23andMe and VCF files seeded with the SNPs of the SNP databases (offline, reproducible)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import argparse
+import csv
+import glob
+import os
+import tempfile
+import zipfile
+import numpy as np
+
+# Name constants
+DB_FILE_PATTERN = '../db/snpdb_*.csv'
+CHROMOSOMES = [str(chromosome) for chromosome in range(1, 23)] + ['X', 'Y', 'MT']
+# Chromosome lengths of GRCh37 (bases)
+CHROMOSOME_LENGTHS = [249250621, 243199373, 198022430, 191154276, 180915260, 171115067, 159138663, 146364022, 141213431,
+                      135534747, 135006516, 133851895, 115169878, 107349540, 102531392, 90354753, 81195210, 78077248,
+                      59128983, 63025520, 48129895, 51304566, 155270560, 59373566, 16569]
+ALLELES = np.array(list('ACGT'))
+TSV_HEADER = ('# This data file generated by 23andMe at: synthetic\n'
+              '# Synthetic genotype data for benchmarks, not from a real person\n'
+              '# rsid\tchromosome\tposition\tgenotype\n')
+NO_CALL_RATE = 0.01 # 23andMe no-calls (--)
+INTERNAL_ID_RATE = 0.02 # 23andMe internal IDs (i123)
+GT_VALUES = np.array(['0/0', '0/1', '1/1', '0|1', '1|0', '1|1', './.'])
+GT_WEIGHTS = [0.45, 0.2, 0.15, 0.08, 0.08, 0.03, 0.01]
+SINGLE_SAMPLE_GT_WEIGHTS = [0.0, 0.4, 0.3, 0.1, 0.1, 0.1, 0.0] # variant calls only (as in personal VCF files)
+POLYGENIC_MISSING_RATE = 0.05 # polygenic score variants not in the SNP file
+POLYGENIC_WEIGHT_SD = 0.05 # standard deviation of polygenic score weights (log odds ratios)
+V_POLYGENIC_APPLICATION = 'Polygenic score'
+
+# Get SNPs of SNP databases (SNP -> alleles of database rows)
+def get_db_snps(db_file_pattern=DB_FILE_PATTERN):
+
+    db_snps = {}
+    for db_file_name in sorted(glob.glob(db_file_pattern)):
+        with open(db_file_name, 'r', newline='') as db_file:
+            for db_row in csv.DictReader(db_file):
+                alleles = db_row['Risk allele'][:1] + db_row['Protective allele'][:1]
+                db_snps.setdefault(db_row['SNP'].strip(), alleles if len(set(alleles)) == 2 else 'AG')
+    return db_snps
+
+# Get markers (chromosome indices, positions, SNP IDs, reference and alternative alleles) sorted by chromosome and position
+# Chromosomes are chosen by length, database SNPs are included with their alleles
+def get_markers(marker_count, rng, chromosome_count=len(CHROMOSOMES), internal_id_rate=0.0, db_file_pattern=DB_FILE_PATTERN):
+
+    db_snps = get_db_snps(db_file_pattern)
+    random_count = max(marker_count - len(db_snps), 0)
+    lengths = np.array(CHROMOSOME_LENGTHS[:chromosome_count], dtype=np.float64)
+    chromosomes = rng.choice(chromosome_count, size=random_count + len(db_snps), p=lengths / lengths.sum())
+    positions = (rng.random(len(chromosomes)) * lengths[chromosomes]).astype(np.int64) + 1
+
+    # Unique random rsIDs (database SNPs excluded), some replaced by internal IDs
+    numbers = rng.choice(max(20 * random_count, 10 ** 6), size=random_count, replace=False) + 1
+    snps = np.char.add('rs', numbers.astype(str)).astype(object)
+    numbers, snps = numbers[~np.isin(snps, list(db_snps))], snps[~np.isin(snps, list(db_snps))]
+    internal = rng.random(len(snps)) < internal_id_rate
+    snps[internal] = np.char.add('i', numbers[internal].astype(str))
+    snps = np.concatenate([snps, np.array(list(db_snps), dtype=object)])
+
+    refs = rng.integers(0, 4, size=len(snps))
+    alts = (refs + rng.integers(1, 4, size=len(snps))) % 4
+    refs, alts = ALLELES[refs], ALLELES[alts]
+    for db_count, alleles in enumerate(db_snps.values()):
+        refs[len(snps) - len(db_snps) + db_count], alts[len(snps) - len(db_snps) + db_count] = alleles[1], alleles[0]
+
+    chromosomes = chromosomes[:len(snps)]
+    positions = positions[:len(snps)]
+    order = np.lexsort((positions, chromosomes))
+    return chromosomes[order], positions[order], snps[order], refs[order], alts[order]
+
+# Write 23andMe-style zip file (one TSV file per chromosome) with given number of markers
+def write_23andme_zip(file_name, marker_count, seed=0, db_file_pattern=DB_FILE_PATTERN):
+
+    rng = np.random.default_rng(seed)
+    chromosomes, positions, snps, refs, alts = get_markers(marker_count, rng, internal_id_rate=INTERNAL_ID_RATE, db_file_pattern=db_file_pattern)
+
+    # Genotypes by allele frequency, single alleles for Y and MT, some no-calls
+    frequencies = rng.random(len(snps))
+    first = np.where(rng.random(len(snps)) < frequencies, alts, refs)
+    second = np.where(rng.random(len(snps)) < frequencies, alts, refs)
+    haploid = np.isin(np.array(CHROMOSOMES, dtype=object)[chromosomes], ['Y', 'MT'])
+    genotypes = np.where(haploid, first, np.char.add(first, second)).astype(object)
+    genotypes[rng.random(len(snps)) < NO_CALL_RATE] = '--'
+
+    with zipfile.ZipFile(file_name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+        for chromosome_count, chromosome in enumerate(CHROMOSOMES):
+            rows = np.flatnonzero(chromosomes == chromosome_count)
+            lines = [f"{snps[row]}\t{chromosome}\t{positions[row]}\t{genotypes[row]}\n" for row in rows]
+            zip_file.writestr(f"genome_chr{chromosome}.txt", TSV_HEADER + ''.join(lines))
+    return file_name
+
+# Write VCF file (bgzip-compressed with tabix index if the file name ends with .gz) with given number of records and samples
+# Loci (with reference and alternative alleles) of the database SNPs are written to <file name>.loci.csv
+# Without IDs the ID column is empty (.) as in the output of many sequencing pipelines
+def write_vcf(file_name, record_count, sample_count=1, seed=0, db_file_pattern=DB_FILE_PATTERN, with_ids=True):
+
+    rng = np.random.default_rng(seed)
+    chromosome_count = 22
+    chromosomes, positions, snps, refs, alts = get_markers(record_count, rng, chromosome_count, db_file_pattern=db_file_pattern)
+    db_snps = get_db_snps(db_file_pattern)
+
+    # VCF file to be compressed is written to a temporary file next to it (an existing file of the uncompressed name is kept)
+    if file_name.endswith('.gz'):
+        temp_file_descriptor, vcf_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), prefix='.tmp_', suffix='.vcf')
+        os.close(temp_file_descriptor)
+    else:
+        vcf_file_name = file_name
+    with open(vcf_file_name, 'w') as vcf_file:
+        vcf_file.write('##fileformat=VCFv4.2\n##reference=GRCh37\n')
+        for chromosome, length in zip(CHROMOSOMES[:chromosome_count], CHROMOSOME_LENGTHS):
+            vcf_file.write(f"##contig=<ID={chromosome},length={length}>\n")
+        vcf_file.write('##INFO=<ID=DP,Number=1,Type=Integer,Description="Total depth">\n')
+        vcf_file.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+        vcf_file.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Read depth">\n')
+        vcf_file.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t' + '\t'.join(f"SAMPLE{sample:05d}" for sample in range(sample_count)) + '\n')
+
+        # Sample fields written in blocks of records
+        gt_weights = SINGLE_SAMPLE_GT_WEIGHTS if sample_count == 1 else GT_WEIGHTS
+        block_size = max(1, 1000000 // sample_count)
+        for start in range(0, len(snps), block_size):
+            end = min(start + block_size, len(snps))
+            gt_values = GT_VALUES[rng.choice(len(GT_VALUES), size=(end - start, sample_count), p=gt_weights)]
+            depths = rng.integers(5, 60, size=end - start)
+            lines = []
+            for row in range(start, end):
+                samples = '\t'.join(np.char.add(gt_values[row - start], ':' + str(depths[row - start])))
+                lines.append(f"{CHROMOSOMES[chromosomes[row]]}\t{positions[row]}\t{snps[row] if with_ids else '.'}\t{refs[row]}\t{alts[row]}\t50\tPASS\tDP={depths[row - start]}\tGT:DP\t{samples}\n")
+            vcf_file.writelines(lines)
+
+    if file_name.endswith('.gz'):
+        import pysam
+        pysam.tabix_compress(vcf_file_name, file_name, force=True)
+        os.remove(vcf_file_name)
+        pysam.tabix_index(file_name, preset='vcf', force=True) # index of compressed file (<file name>.tbi)
+
+    with open(file_name + '.loci.csv', 'w') as loci_file:
+        loci_file.write('SNP,Chromosome,Position,Ref,Alt\n')
+        for row in np.flatnonzero(np.isin(snps, list(db_snps))):
+            loci_file.write(f"{snps[row]},{CHROMOSOMES[chromosomes[row]]},{positions[row]},{refs[row]},{alts[row]}\n")
+    return file_name
+
+# Write polygenic score database (csv) with given number of variants drawn from the markers of a synthetic SNP or VCF file
+# (same marker count and seed), some variants not in the file, random effect alleles, weights and effect allele frequencies
+def write_polygenic_db(db_file_name, snp_file_name, marker_count, variant_count, seed=0, db_file_pattern=DB_FILE_PATTERN):
+
+    rng = np.random.default_rng(seed)
+    if snp_file_name.endswith('.zip'):
+        _, _, snps, refs, alts = get_markers(marker_count, rng, internal_id_rate=INTERNAL_ID_RATE, db_file_pattern=db_file_pattern)
+    else:
+        _, _, snps, refs, alts = get_markers(marker_count, rng, 22, db_file_pattern=db_file_pattern)
+
+    rng = np.random.default_rng(seed + 1)
+    rows = np.flatnonzero(np.char.startswith(snps.astype(str), 'rs'))
+    missing_count = min(int(variant_count * POLYGENIC_MISSING_RATE), variant_count)
+    rows = np.sort(rng.choice(rows, size=min(variant_count - missing_count, len(rows)), replace=False))
+    missing_snps = np.char.add('rs', (rng.choice(10 ** 6, size=missing_count, replace=False) + 10 ** 9).astype(str))
+    effect_first = rng.random(len(rows)) < 0.5
+    missing_effect = rng.integers(0, 4, size=missing_count)
+    missing_other = (missing_effect + rng.integers(1, 4, size=missing_count)) % 4
+    effect_alleles = np.concatenate([np.where(effect_first, alts[rows], refs[rows]), ALLELES[missing_effect]])
+    other_alleles = np.concatenate([np.where(effect_first, refs[rows], alts[rows]), ALLELES[missing_other]])
+    db_snps = np.concatenate([snps[rows].astype(str), missing_snps])
+    weights = rng.normal(0.0, POLYGENIC_WEIGHT_SD, size=len(db_snps))
+    frequencies = rng.uniform(0.05, 0.95, size=len(db_snps))
+
+    with open(db_file_name, 'w') as db_file:
+        db_file.write('Condition,Application,SNP,Effect allele,Other allele,Weight,Effect allele frequency\n')
+        db_file.writelines(f"Synthetic polygenic score,{V_POLYGENIC_APPLICATION},{snp},{effect_allele},{other_allele},{weight:.6g},{frequency:.4f}\n"
+                           for snp, effect_allele, other_allele, weight, frequency in zip(db_snps, effect_alleles, other_alleles, weights, frequencies))
+    return db_file_name
+
+if __name__ == '__main__':
+
+    # Check command line arguments
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('file', help="output file (.zip: 23andMe, .vcf: VCF, .vcf.gz: bgzip-compressed VCF with tabix index)")
+    parser.add_argument('--markers', type=int, default=600000, help="number of markers (SNP file) or records (VCF file)")
+    parser.add_argument('--samples', type=int, default=1, help="number of samples (VCF file)")
+    parser.add_argument('--seed', type=int, default=0, help="random seed")
+    parser.add_argument('--no-ids', action='store_true', help="write VCF records without SNP IDs (.)")
+    parser.add_argument('--polygenic-db', help="also write a polygenic score database (csv) of variants drawn from the markers of the file")
+    parser.add_argument('--variants', type=int, default=100000, help="number of variants of the polygenic score database")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.file)), exist_ok=True)
+    if args.file.endswith('.zip'):
+        write_23andme_zip(args.file, args.markers, args.seed)
+    else:
+        write_vcf(args.file, args.markers, args.samples, args.seed, with_ids=not args.no_ids)
+    print(f"Wrote {args.file}")
+    if args.polygenic_db is not None:
+        write_polygenic_db(args.polygenic_db, args.file, args.markers, args.variants, args.seed)
+        print(f"Wrote {args.polygenic_db}")
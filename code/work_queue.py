@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Work queue of SNP files on a shared filesystem (plan of work units, atomic lease files and checkpoints per SNP file)
+"""
+__author__ = "Melanie Senn"
+__copyright__ = "Copyright 2025"
+__license__ = "GPL"
+__version__ = "1.0.0"
+__maintainer__ = "Melanie Senn"
+__email__ = "melanie.senn@gmail.com"
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import uuid
+
+# Queue settings
+PLAN_VERSION = 1
+PLAN_FILE_NAME = 'plan.json'
+LEASE_DIR = 'leases'
+CHECKPOINT_DIR = 'checkpoints'
+STAGING_DIR = 'staging'
+LEASE_EXTENSION = '.lease'
+CHECKPOINT_EXTENSION = '.json'
+DONE_EXTENSION = '.done'
+UNIT_SIZE = 100 # SNP files per work unit
+LEASE_TIMEOUT = 600 # seconds without renewal until a lease expires
+
+# Get unique owner of leases (host, process and random suffix)
+def get_owner():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+# Write json file (written to temporary file and moved into place)
+def write_json(file_name, data):
+
+    temp_file_descriptor, temp_file_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_name)), prefix='.tmp_')
+    with os.fdopen(temp_file_descriptor, 'w') as temp_file:
+        json.dump(data, temp_file)
+    os.replace(temp_file_name, file_name)
+
+# Get name of work unit
+def get_unit_name(unit):
+    return f"unit-{unit:05d}"
+
+# Work units of SNP files in a work directory shared by all workers (on one or several hosts)
+# plan.json: SNP files and sample names split into units (created once by the first worker, checked by all others)
+# leases/<name>.lease: owner of a unit (created exclusively, renewed while held, reclaimed once expired)
+# checkpoints/<index>.json: summary and results of a finished SNP file (finished SNP files are skipped on resume)
+# staging/<index>/: files of a SNP file written before its checkpoint (replaced if scanned again, published once its unit is done)
+# checkpoints/<name>.done: unit with all SNP files finished and staged files published (or task done, e.g. saving the cohort tables)
+class WorkQueue:
+    def __init__(self, work_dir, lease_timeout=LEASE_TIMEOUT):
+        self.work_dir = work_dir
+        self.lease_timeout = lease_timeout
+        self.owner = get_owner()
+        self.units = []
+        self.settings = {}
+        self.data = {}
+        self.leases = set()
+        self.lost_leases = set()
+        self.lock = threading.Lock()
+        self.heartbeat = None
+        self.stopped = threading.Event()
+        os.makedirs(os.path.join(work_dir, LEASE_DIR), exist_ok=True)
+        os.makedirs(os.path.join(work_dir, CHECKPOINT_DIR), exist_ok=True)
+
+    # Create plan of SNP files or load existing plan (ValueError if the SNP files or settings differ, settings of None are not checked)
+    # Data of the plan (e.g. defaults of the first worker) is kept as created and not checked
+    # Returns True if the plan was created
+    def plan(self, snp_file_names, sample_names, unit_size=UNIT_SIZE, settings=None, data=None):
+
+        settings = settings if settings is not None else {}
+        files = [[index, snp_file_name, sample_name] for index, (snp_file_name, sample_name) in enumerate(zip(snp_file_names, sample_names))]
+        plan = {'version': PLAN_VERSION, 'units': [files[start:start + unit_size] for start in range(0, len(files), unit_size)],
+                'settings': settings, 'data': data if data is not None else {}}
+
+        # Plan is linked into place (fails if another worker created it first)
+        plan_file_name = os.path.join(self.work_dir, PLAN_FILE_NAME)
+        temp_file_descriptor, temp_file_name = tempfile.mkstemp(dir=self.work_dir, prefix='.tmp_')
+        with os.fdopen(temp_file_descriptor, 'w') as temp_file:
+            json.dump(plan, temp_file)
+        try:
+            os.link(temp_file_name, plan_file_name)
+            created = True
+        except FileExistsError:
+            created = False
+        finally:
+            os.remove(temp_file_name)
+
+        with open(plan_file_name, 'r') as plan_file:
+            plan = json.load(plan_file)
+        if plan.get('version') != PLAN_VERSION:
+            raise ValueError(f"{plan_file_name} is not a work plan of version {PLAN_VERSION}")
+        if [file[1:] for unit in plan['units'] for file in unit] != [file[1:] for file in files]:
+            raise ValueError(f"SNP files differ from the work plan {plan_file_name}")
+        for key, value in settings.items():
+            if (key in plan['settings']) and (value is not None) and (value != plan['settings'][key]):
+                raise ValueError(f"Setting {key} ({value}) differs from the work plan {plan_file_name} ({plan['settings'][key]})")
+        self.units = plan['units']
+        self.settings = plan['settings']
+        self.data = plan['data']
+        return created
+
+    # Get lease file of unit (or of another task like saving the cohort tables)
+    def get_lease_file_name(self, name):
+        return os.path.join(self.work_dir, LEASE_DIR, name + LEASE_EXTENSION)
+
+    # Get checkpoint file of SNP file
+    def get_checkpoint_file_name(self, index):
+        return os.path.join(self.work_dir, CHECKPOINT_DIR, f"{index:06d}{CHECKPOINT_EXTENSION}")
+
+    # Get indices of finished SNP files
+    def get_finished(self):
+        return {int(file_name[:-len(CHECKPOINT_EXTENSION)]) for file_name in os.listdir(os.path.join(self.work_dir, CHECKPOINT_DIR))
+                if file_name.endswith(CHECKPOINT_EXTENSION)}
+
+    # Get units not done (unfinished SNP files or staged files not published)
+    def get_unfinished_units(self):
+
+        file_names = set(os.listdir(os.path.join(self.work_dir, CHECKPOINT_DIR)))
+        return [unit for unit in range(len(self.units)) if get_unit_name(unit) + DONE_EXTENSION not in file_names]
+
+    # Get done marker of unit or task
+    def get_done_file_name(self, name):
+        return os.path.join(self.work_dir, CHECKPOINT_DIR, name + DONE_EXTENSION)
+
+    # Check if unit or task is done
+    def is_done(self, name):
+        return os.path.exists(self.get_done_file_name(name))
+
+    # Mark unit or task as done
+    def mark_done(self, name):
+        with open(self.get_done_file_name(name), 'w'):
+            pass
+
+    # Mark unit as done (all SNP files finished and staged files published) and remove its staged files
+    def finish_unit(self, unit):
+
+        self.mark_done(get_unit_name(unit))
+        for index, _, _ in self.units[unit]:
+            shutil.rmtree(self.get_staging_dir(index), ignore_errors=True)
+
+    # Get unfinished SNP files of unit (index, SNP file, sample name)
+    def get_unfinished_files(self, unit):
+
+        finished = self.get_finished()
+        return [(index, snp_file_name, sample_name) for index, snp_file_name, sample_name in self.units[unit] if index not in finished]
+
+    # Get staging directory of SNP file (files of a previous scan removed if cleared)
+    def get_staging_dir(self, index, clear=False):
+
+        staging_dir = os.path.join(self.work_dir, STAGING_DIR, f"{index:06d}")
+        if clear:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return staging_dir
+
+    # Get staged files of unit per file relative to the staging directories (in plan order of the SNP files)
+    def get_staged_files(self, unit):
+
+        staged_files = {}
+        for index, _, _ in self.units[unit]:
+            staging_dir = self.get_staging_dir(index)
+            for dir_path, _, file_names in os.walk(staging_dir):
+                for file_name in sorted(file_names):
+                    staged_file_name = os.path.join(dir_path, file_name)
+                    staged_files.setdefault(os.path.relpath(staged_file_name, staging_dir), []).append(staged_file_name)
+        return staged_files
+
+    # Save checkpoint of finished SNP file (json object)
+    def save_checkpoint(self, index, checkpoint):
+        write_json(self.get_checkpoint_file_name(index), checkpoint)
+
+    # Load checkpoints of all SNP files in plan order
+    def load_checkpoints(self):
+
+        for files in self.units:
+            for index, _, _ in files:
+                with open(self.get_checkpoint_file_name(index), 'r') as checkpoint_file:
+                    yield json.load(checkpoint_file)
+
+    # Get owner of lease (None if not leased)
+    def get_lease_owner(self, lease_file_name):
+        try:
+            with open(lease_file_name, 'r') as lease_file:
+                return lease_file.read()
+        except FileNotFoundError:
+            return None
+
+    # Check if lease was not renewed within the lease timeout
+    def is_expired(self, lease_file_name):
+        try:
+            return os.path.getmtime(lease_file_name) + self.lease_timeout < time.time()
+        except FileNotFoundError:
+            return False
+
+    # Create lease file exclusively (fails if it exists)
+    def create_lease(self, lease_file_name):
+        try:
+            lease_file_descriptor = os.open(lease_file_name, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(lease_file_descriptor, 'w') as lease_file:
+            lease_file.write(self.owner)
+        return True
+
+    # Claim lease of unit or task (expired leases of stopped workers are reclaimed)
+    # Returns True if the lease is held
+    def claim(self, name):
+
+        lease_file_name = self.get_lease_file_name(name)
+        if not self.create_lease(lease_file_name):
+            if not self.is_expired(lease_file_name):
+                return False
+
+            # Expired lease is moved away (only one worker succeeds) and restored if it was renewed in the meantime
+            expired_file_name = f"{lease_file_name}.{self.owner}.expired"
+            try:
+                os.rename(lease_file_name, expired_file_name)
+            except FileNotFoundError:
+                return False
+            if not self.is_expired(expired_file_name):
+                try:
+                    os.link(expired_file_name, lease_file_name)
+                except FileExistsError:
+                    pass
+                os.remove(expired_file_name)
+                return False
+            os.remove(expired_file_name)
+            if not self.create_lease(lease_file_name):
+                return False
+
+        with self.lock:
+            self.leases.add(name)
+            self.lost_leases.discard(name)
+        self.start_heartbeat()
+        return True
+
+    # Check if lease is still held (not reclaimed by another worker)
+    def is_held(self, name):
+        with self.lock:
+            return (name in self.leases) and (name not in self.lost_leases)
+
+    # Release lease (removed if still owned)
+    def release(self, name):
+
+        with self.lock:
+            self.leases.discard(name)
+            self.lost_leases.discard(name)
+        lease_file_name = self.get_lease_file_name(name)
+        if self.get_lease_owner(lease_file_name) == self.owner:
+            os.remove(lease_file_name)
+
+    # Renew held leases (leases owned by another worker are lost)
+    def renew(self):
+
+        with self.lock:
+            names = self.leases - self.lost_leases
+        for name in names:
+            lease_file_name = self.get_lease_file_name(name)
+            if self.get_lease_owner(lease_file_name) == self.owner:
+                os.utime(lease_file_name)
+            else:
+                with self.lock:
+                    self.lost_leases.add(name)
+
+    # Start thread renewing held leases three times per lease timeout
+    def start_heartbeat(self):
+
+        if self.heartbeat is None:
+            def renew_leases():
+                while not self.stopped.wait(self.lease_timeout / 3):
+                    self.renew()
+            self.heartbeat = threading.Thread(target=renew_leases, daemon=True)
+            self.heartbeat.start()
+
+    # Stop renewing and release held leases
+    def close(self):
+
+        self.stopped.set()
+        with self.lock:
+            names = list(self.leases)
+        for name in names:
+            self.release(name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
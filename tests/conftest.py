@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Modules of the scanner are imported by name from the code directory (as by the scripts run there)
+CODE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code')
+sys.path.insert(0, os.path.abspath(CODE_DIR))
@@ -0,0 +1,48 @@
+import importlib.util
+import os
+import pytest
+from conftest import CODE_DIR
+from condition import C_RISK_ALLELE
+from synthetic_data import write_23andme_zip
+
+# Batch scan script (module name with hyphen) imported from its file
+spec = importlib.util.spec_from_file_location('genome_scanner_batch', os.path.join(CODE_DIR, 'genome-scanner_batch.py'))
+batch = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(batch)
+
+# Worker of the mthfr condition scanning a synthetic SNP file (paths of configs relative to the code directory)
+@pytest.fixture
+def snp_file_name(tmp_path, monkeypatch):
+
+    monkeypatch.chdir(CODE_DIR)
+    batch.init_worker([os.path.join('..', 'config', 'config_mthfr.json')], None, 0, None, 0)
+    snp_file_name = str(tmp_path / 'sample.zip')
+    write_23andme_zip(snp_file_name, 2000)
+    return snp_file_name
+
+def test_scan_file_aggregated(snp_file_name):
+
+    summary, results, aggregate = batch.scan_file(snp_file_name, 'sample', None, False, {'mthfr': C_RISK_ALLELE})
+    assert summary[0][batch.C_STATUS] == batch.V_OK
+    assert aggregate.scans == {'mthfr': 1}
+    assert len(aggregate.get_allele_table().index) > 0
+
+def test_scan_file_failed_if_not_aggregated(snp_file_name):
+
+    summary, results, aggregate = batch.scan_file(snp_file_name, 'sample', None, False, {'mthfr': 'Effect allele'})
+    assert summary[0][batch.C_STATUS] == batch.V_FAILED
+    assert 'Effect allele' in summary[0][batch.C_ERROR]
+    assert (results, aggregate) == ([], None)
+
+def test_cohort_tables_saved_once(tmp_path):
+
+    from work_queue import WorkQueue
+    with WorkQueue(str(tmp_path)) as queue, WorkQueue(str(tmp_path)) as other_queue:
+        assert batch.claim_finalize(queue)
+        assert not batch.claim_finalize(other_queue)
+
+        # Worker claiming the released lease after the tables were saved does not save them again
+        queue.mark_done(batch.FINALIZE_LEASE)
+        queue.release(batch.FINALIZE_LEASE)
+        assert not batch.claim_finalize(other_queue)
+        assert not os.path.exists(other_queue.get_lease_file_name(batch.FINALIZE_LEASE))
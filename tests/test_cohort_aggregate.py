@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+import cohort_aggregate
+from cohort_aggregate import CohortAggregate, check_allele_column, load_aggregate, C_ALLELE_COUNT, C_CALLED_ALLELES, C_COUNT, C_FREQUENCY, \
+    C_SUMMARY_KEY, C_MEAN, C_STD, C_MIN, C_MAX
+from condition import C_CONDITION, C_SNP, C_GENOTYPE, C_RISK_ALLELE, C_SAMPLE
+
+# Get results of scans (sample, SNP, genotype, risk allele)
+def get_results(rows):
+    return pd.DataFrame(rows, columns=[C_SAMPLE, C_SNP, C_GENOTYPE, C_RISK_ALLELE])
+
+def get_summaries(samples):
+    return pd.DataFrame({C_SAMPLE: samples, 'Score': [float(index) for index in range(len(samples))]})
+
+def test_single_base_rule_counted_per_base_and_genotype_rule_not_counted():
+
+    aggregate = CohortAggregate()
+    aggregate.add('condition', get_summaries(['s1', 's2']), get_results([
+        ['s1', 'rs1', 'TT', 'T'], ['s1', 'rs1', 'TT', 'TT'],
+        ['s2', 'rs1', 'CT', 'T'], ['s2', 'rs1', 'CT', 'TT']]))
+
+    alleles = aggregate.get_allele_table().set_index([C_SNP, C_RISK_ALLELE])
+    assert list(alleles.index) == [('rs1', 'T')]
+    assert alleles.loc[('rs1', 'T'), C_ALLELE_COUNT] == 3
+    assert alleles.loc[('rs1', 'T'), C_CALLED_ALLELES] == 4
+    assert alleles.loc[('rs1', 'T'), C_FREQUENCY] == 0.75
+
+    # Carriers of a two-letter rule are in the genotype counts (SNP counted once per scan)
+    genotypes = aggregate.get_genotype_table().set_index([C_SNP, C_GENOTYPE])
+    assert genotypes.loc[('rs1', 'TT'), C_COUNT] == 1
+    assert genotypes.loc[('rs1', 'CT'), C_COUNT] == 1
+
+def test_polygenic_results_counted_for_effect_allele():
+
+    from polygenic import PolygenicScore, C_EFFECT_ALLELE
+    results = pd.DataFrame([['s1', 'rs1', 'AG', 'G'], ['s2', 'rs1', 'GG', 'G']], columns=[C_SAMPLE, C_SNP, C_GENOTYPE, C_EFFECT_ALLELE])
+    aggregate = CohortAggregate()
+    aggregate.add('polygenic', get_summaries(['s1', 's2']), results, PolygenicScore.ALLELE_COLUMN)
+
+    alleles = aggregate.get_allele_table()
+    assert alleles[[C_SNP, C_RISK_ALLELE, C_ALLELE_COUNT, C_CALLED_ALLELES]].values.tolist() == [['rs1', 'G', 3, 4]]
+
+def test_results_without_alleles_in_allele_column_rejected():
+
+    aggregate = CohortAggregate()
+    with pytest.raises(ValueError):
+        aggregate.add('condition', get_summaries(['s1']), get_results([['s1', 'rs1', 'TT', None]]))
+    with pytest.raises(ValueError):
+        aggregate.add('condition', get_summaries(['s1']), get_results([['s1', 'rs1', 'TT', 'T']]), 'Effect allele')
+    assert aggregate.scans == {}
+
+def test_allele_column_checked_against_result_columns():
+
+    from condition import Condition
+    from polygenic import PolygenicScore
+    check_allele_column('condition', Condition.RESULT_COLUMNS, Condition.ALLELE_COLUMN)
+    check_allele_column('polygenic', PolygenicScore.RESULT_COLUMNS, PolygenicScore.ALLELE_COLUMN)
+    with pytest.raises(ValueError):
+        check_allele_column('condition', Condition.RESULT_COLUMNS, PolygenicScore.ALLELE_COLUMN)
+
+# Get aggregate of scans (condition, samples and results rows per scan)
+def get_aggregate(scans):
+
+    aggregate = CohortAggregate()
+    for condition_name, samples, rows in scans:
+        aggregate.add(condition_name, get_summaries(samples).assign(Status=['OK'] * len(samples)), get_results(rows))
+    return aggregate
+
+# Cohort tables of aggregate (numeric columns of summary statistics compared approximately)
+def assert_same_tables(aggregate, other_aggregate):
+
+    pd.testing.assert_frame_equal(aggregate.get_genotype_table(), other_aggregate.get_genotype_table())
+    pd.testing.assert_frame_equal(aggregate.get_allele_table(), other_aggregate.get_allele_table())
+    pd.testing.assert_frame_equal(aggregate.get_summary_count_table(), other_aggregate.get_summary_count_table())
+    pd.testing.assert_frame_equal(aggregate.get_summary_stats_table(), other_aggregate.get_summary_stats_table(), rtol=1e-12)
+
+SCANS = [
+    ('a', ['s1', 's2'], [['s1', 'rs1', 'AG', 'G'], ['s1', 'rs2', 'CC', 'T'], ['s2', 'rs1', 'GG', 'G'], ['s2', 'rs2', '--', 'T']]),
+    ('b', ['s1'], [['s1', 'rs3', 'AT', 'A'], ['s1', 'rs3', 'AT', 'T']]),
+    ('a', ['s3'], [['s3', 'rs1', 'AA', 'G'], ['s3', 'rs4', 'CT', 'C']]),
+    ('a', ['s4', 's5'], [['s4', 'rs2', 'TT', 'T'], ['s5', 'rs2', 'CT', 'T'], ['s5', 'rs5', 'GG', 'G']])
+]
+
+def test_merge_same_as_single_aggregate_in_any_order():
+
+    single = get_aggregate(SCANS)
+    left = get_aggregate(SCANS[:2])
+    left.merge(get_aggregate(SCANS[2:3]))
+    left.merge(get_aggregate(SCANS[3:]))
+    right = get_aggregate(SCANS[2:3])
+    right.merge(get_aggregate(SCANS[3:]))
+    merged = get_aggregate(SCANS[:2])
+    merged.merge(right)
+    reversed_merged = get_aggregate(SCANS[3:])
+    reversed_merged.merge(get_aggregate(SCANS[:3]))
+
+    assert_same_tables(single, left)
+    assert_same_tables(single, merged)
+    assert_same_tables(single, reversed_merged)
+    assert single.scans == {'a': 5, 'b': 1}
+
+def test_counts_of_scans():
+
+    aggregate = get_aggregate(SCANS)
+    genotypes = aggregate.get_genotype_table().set_index([C_CONDITION, C_SNP, C_GENOTYPE])
+    assert genotypes.loc[('a', 'rs1', 'AG'), C_COUNT] == 1
+    assert genotypes.loc[('a', 'rs1', 'AG'), C_FREQUENCY] == 1 / 3
+    alleles = aggregate.get_allele_table().set_index([C_CONDITION, C_SNP, C_RISK_ALLELE])
+    assert alleles.loc[('a', 'rs2', 'T'), [C_ALLELE_COUNT, C_CALLED_ALLELES]].tolist() == [3, 6] # no call not counted
+    assert alleles.loc[('b', 'rs3', 'A'), [C_ALLELE_COUNT, C_CALLED_ALLELES]].tolist() == [1, 2]
+    stats = aggregate.get_summary_stats_table().set_index([C_CONDITION, C_SUMMARY_KEY])
+    assert stats.loc[('a', 'Score'), [C_COUNT, C_MEAN, C_MIN, C_MAX]].tolist() == [5, 0.4, 0.0, 1.0]
+    assert stats.loc[('a', 'Score'), C_STD] == pytest.approx(np.std([0.0, 1.0, 0.0, 0.0, 1.0], ddof=1))
+
+def test_folded_counts_same_as_pending_counts(monkeypatch):
+
+    pending = get_aggregate(SCANS)
+    monkeypatch.setattr(cohort_aggregate, 'FOLD_ROWS', 1)
+    folded = get_aggregate(SCANS)
+    assert len(folded.pending) <= 1
+    assert_same_tables(pending, folded)
+
+def test_saved_aggregate_loaded_and_updated(tmp_path):
+
+    aggregate_file_name = str(tmp_path / 'aggregate.json')
+    assert load_aggregate(aggregate_file_name).scans == {}
+    get_aggregate(SCANS[:2]).save(aggregate_file_name)
+    loaded = load_aggregate(aggregate_file_name)
+    loaded.merge(get_aggregate(SCANS[2:]))
+    assert_same_tables(get_aggregate(SCANS), loaded)
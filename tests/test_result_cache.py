@@ -0,0 +1,25 @@
+import importlib
+import sys
+from mthfr import MTHFR
+from polygenic import PolygenicScore
+from result_cache import get_module_hash
+
+def test_module_hash_of_condition_and_base_classes(tmp_path, monkeypatch):
+
+    # Condition class derived from a base class of another module
+    (tmp_path / 'scoring_base.py').write_text("class Base:\n    RISK = 1\n")
+    (tmp_path / 'scoring_condition.py').write_text("from scoring_base import Base\nclass Scored(Base):\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'scoring_base', raising=False)
+    monkeypatch.delitem(sys.modules, 'scoring_condition', raising=False)
+    condition_class = importlib.import_module('scoring_condition').Scored
+
+    module_hash = get_module_hash(condition_class)
+    assert get_module_hash(condition_class) == module_hash
+
+    # Changed scoring of the base class changes the hash of the condition
+    (tmp_path / 'scoring_base.py').write_text("class Base:\n    RISK = 2\n")
+    assert get_module_hash(condition_class) != module_hash
+
+def test_module_hash_differs_per_condition_class():
+    assert get_module_hash(MTHFR) != get_module_hash(PolygenicScore)
@@ -0,0 +1,67 @@
+import glob
+import json
+import os
+import numpy as np
+import pandas as pd
+from condition import C_SAMPLE
+from result_sink import ColumnarSink, NdjsonSink, read_columnar, read_columnar_blocks
+
+# Get results of sample (text with missing values, integer, float with NaN and boolean columns)
+def get_results(sample_count, row_count=3):
+    return pd.DataFrame({'SNP': [f"rs{sample_count}{row}" for row in range(row_count)],
+                         'Genotype': ['AG', None, 'TT'][:row_count],
+                         'Position': np.arange(row_count, dtype=np.int64) + sample_count,
+                         'Risk': [0.5, np.nan, 2.0][:row_count],
+                         'Found': [True, False, True][:row_count]})
+
+def get_summary(sample_count):
+    return {'Score': float(sample_count), 'Status': 'OK'}
+
+# Get single partition file of sink output
+def get_file_name(output_dir, pattern):
+
+    file_names = glob.glob(os.path.join(str(output_dir), 'condition=c', 'batch=B', pattern))
+    assert len(file_names) == 1
+    return file_names[0]
+
+def test_columnar_blocks_read_as_written(tmp_path):
+
+    with ColumnarSink(str(tmp_path), 'B', 'part', block_rows=4) as sink:
+        for sample_count in range(5):
+            sink.write(f"s{sample_count}", 'c', get_summary(sample_count), get_results(sample_count))
+
+    # Blocks are written once the buffered rows reach the block size (rest on close)
+    results_file_name = get_file_name(tmp_path, 'part.results.gcol')
+    assert [len(block.index) for block in read_columnar_blocks(results_file_name)] == [6, 6, 3]
+    assert [len(block.index) for block in read_columnar_blocks(get_file_name(tmp_path, 'part.summary.gcol'))] == [4, 1]
+
+    results = read_columnar(results_file_name)
+    expected = pd.concat([get_results(sample_count).assign(**{C_SAMPLE: f"s{sample_count}"}) for sample_count in range(5)], ignore_index=True)
+    expected = expected[[C_SAMPLE, *get_results(0).columns]]
+    assert results[C_SAMPLE].tolist() == expected[C_SAMPLE].tolist()
+    assert results['Genotype'].tolist() == expected['Genotype'].tolist()
+    assert results['Position'].dtype == np.int64
+    assert results['Position'].tolist() == expected['Position'].tolist()
+    np.testing.assert_array_equal(results['Risk'].to_numpy(), expected['Risk'].to_numpy())
+    assert results['Found'].tolist() == expected['Found'].tolist()
+
+    summary = read_columnar(get_file_name(tmp_path, 'part.summary.gcol'))
+    assert summary.values.tolist() == [[f"s{sample_count}", float(sample_count), 'OK'] for sample_count in range(5)]
+
+def test_columnar_files_appended_by_sinks(tmp_path):
+
+    for sample_count in range(2):
+        with ColumnarSink(str(tmp_path), 'B', 'part') as sink:
+            sink.write(f"s{sample_count}", 'c', get_summary(sample_count), get_results(sample_count))
+    assert read_columnar(get_file_name(tmp_path, 'part.results.gcol'))[C_SAMPLE].tolist() == ['s0'] * 3 + ['s1'] * 3
+
+def test_ndjson_line_per_sample(tmp_path):
+
+    with NdjsonSink(str(tmp_path), 'B') as sink:
+        for sample_count in range(2):
+            sink.write(f"s{sample_count}", 'c', get_summary(sample_count), get_results(sample_count, 2))
+    with open(get_file_name(tmp_path, 'part-*.ndjson'), 'r') as ndjson_file:
+        lines = [json.loads(line) for line in ndjson_file]
+    assert [(line[C_SAMPLE], line['Score']) for line in lines] == [('s0', 0.0), ('s1', 1.0)]
+    assert lines[1]['data'] == [{'SNP': 'rs10', 'Genotype': 'AG', 'Position': 1, 'Risk': 0.5, 'Found': True},
+                                {'SNP': 'rs11', 'Genotype': None, 'Position': 2, 'Risk': None, 'Found': False}]
@@ -0,0 +1,78 @@
+import http.client
+import importlib.util
+import json
+import os
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+from conftest import CODE_DIR
+
+# Scan service script (module name with hyphen) imported from its file
+spec = importlib.util.spec_from_file_location('genome_scanner_service', os.path.join(CODE_DIR, 'genome-scanner_service.py'))
+service_module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(service_module)
+
+MAX_UPLOAD_SIZE = 4 * 1024 ** 2
+
+# Service without worker processes (scan reports the size of the uploaded SNP file)
+class StubService:
+    condition_names = ['mthfr']
+    max_upload_size = MAX_UPLOAD_SIZE
+
+    def __init__(self):
+        self.accepting = True
+
+    def reserve(self):
+        return self.accepting
+
+    def release(self, latency, succeeded):
+        pass
+
+    def scan(self, snp_file_name, condition_names):
+        return {"size": os.path.getsize(snp_file_name)}
+
+@pytest.fixture
+def server():
+
+    handler = type('StubRequestHandler', (service_module.ScanRequestHandler,), {'service': StubService()})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+# Post request (headers given as sent, body without Content-Length unless in headers) and get status and json response
+def post(server, path, headers, body=b''):
+
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    connection.putrequest('POST', path)
+    for name, value in headers.items():
+        connection.putheader(name, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    status, content = response.status, json.loads(response.read())
+    connection.close()
+    return status, content
+
+def test_upload_copied_in_chunks(server):
+
+    body = os.urandom(2 * service_module.UPLOAD_CHUNK_SIZE + 1)
+    assert post(server, '/scan?format=zip', {'Content-Length': str(len(body))}, body) == (200, {"size": len(body)})
+
+def test_upload_without_valid_length_rejected(server):
+
+    assert post(server, '/scan?format=zip', {})[0] == 411
+    assert post(server, '/scan?format=zip', {'Content-Length': '-1'})[0] == 400
+    assert post(server, '/scan?format=zip', {'Content-Length': 'many'})[0] == 400
+
+def test_upload_larger_than_maximum_rejected(server):
+    assert post(server, '/scan?format=zip', {'Content-Length': str(MAX_UPLOAD_SIZE + 1)})[0] == 413
+
+def test_rejected_upload_drained_before_response(server):
+
+    server.RequestHandlerClass.service.accepting = False
+    body = bytes(MAX_UPLOAD_SIZE)
+    status, content = post(server, '/scan?format=zip', {'Content-Length': str(len(body))}, body)
+    assert (status, content) == (503, {"error": "Too many requests"})
+    assert post(server, '/scan?format=zip&conditions=other', {'Content-Length': str(len(body))}, body)[0] == 400
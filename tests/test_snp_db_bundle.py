@@ -0,0 +1,92 @@
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pytest
+from conftest import CODE_DIR
+from mthfr import MTHFR
+from neuropsych import Neuropsych
+from condition import RiskRules
+from snp_db_bundle import SnpDbBundle, compile_bundle
+
+SNP_DB_FILE_NAME = os.path.join(CODE_DIR, '..', 'db', 'snpdb_mthfr.csv')
+
+# SNP database of mthfr with numeric columns (integers, floats with empty values and booleans) next to the bundle
+@pytest.fixture
+def snp_db_file_name(tmp_path):
+
+    snp_db = pd.read_csv(SNP_DB_FILE_NAME)
+    snp_db['Chromosome'] = np.arange(len(snp_db.index), dtype=np.int64) + 1
+    snp_db['Weight'] = [0.5 if row % 2 else np.nan for row in range(len(snp_db.index))]
+    snp_db['Reviewed'] = [row % 2 == 0 for row in range(len(snp_db.index))]
+    snp_db_file_name = str(tmp_path / 'snpdb_mthfr.csv')
+    snp_db.to_csv(snp_db_file_name, index=False)
+    return snp_db_file_name
+
+def get_config(snp_db_file_name, python_module='mthfr', class_constructor='MTHFR'):
+    return {"snp_database": snp_db_file_name, "python_module": python_module, "class_constructor": class_constructor}
+
+# Compile bundle next to the SNP database and open it
+def get_bundle(configs, bundle_dir):
+
+    bundle_file_name = os.path.join(str(bundle_dir), 'snpdb.bundle')
+    compile_bundle(configs, bundle_file_name)
+    return SnpDbBundle(bundle_file_name)
+
+def test_snp_db_same_as_csv_file(snp_db_file_name, tmp_path):
+
+    bundle = get_bundle([get_config(snp_db_file_name)], tmp_path)
+    snp_db = pd.read_csv(snp_db_file_name)
+    pd.testing.assert_frame_equal(bundle.get_snp_db(snp_db_file_name, MTHFR), snp_db)
+    rows = bundle.get_rows(snp_db_file_name, MTHFR)
+    assert [row['Chromosome'] for row in rows] == snp_db['Chromosome'].tolist()
+    assert [row['Reviewed'] for row in rows] == snp_db['Reviewed'].tolist()
+    assert np.isnan(rows[0]['Weight']) and (rows[1]['Weight'] == 0.5)
+    bundle.close()
+
+def test_risk_rules_same_as_compiled(snp_db_file_name, tmp_path):
+
+    bundle = get_bundle([get_config(snp_db_file_name)], tmp_path)
+    condition = MTHFR(None, snp_db_file_name)
+    risk_rules = bundle.get_risk_rules(snp_db_file_name, MTHFR, condition.get_risk_association)
+    compiled_rules = RiskRules(pd.read_csv(snp_db_file_name), condition.get_risk_association)
+    assert risk_rules.rules == compiled_rules.rules
+    assert risk_rules.genotype_codes == compiled_rules.genotype_codes
+    np.testing.assert_array_equal(risk_rules.rule_index, compiled_rules.rule_index)
+    np.testing.assert_array_equal(risk_rules.risks, compiled_rules.risks)
+    np.testing.assert_array_equal(risk_rules.associations, compiled_rules.associations)
+
+def test_entry_keyed_by_path_and_condition_class(snp_db_file_name, tmp_path):
+
+    bundle = get_bundle([get_config(snp_db_file_name)], tmp_path)
+    other_dir = tmp_path / 'other'
+    other_dir.mkdir()
+    shutil.copy(snp_db_file_name, other_dir / 'snpdb_mthfr.csv')
+    assert bundle.contains(snp_db_file_name, MTHFR)
+    assert not bundle.contains(str(other_dir / 'snpdb_mthfr.csv'), MTHFR)
+    assert not bundle.contains(snp_db_file_name, Neuropsych)
+    bundle.close()
+
+def test_conflicting_condition_classes_rejected(snp_db_file_name, tmp_path):
+
+    with pytest.raises(ValueError, match='also configured for neuropsych.Neuropsych'):
+        get_bundle([get_config(snp_db_file_name), get_config(snp_db_file_name, 'neuropsych', 'Neuropsych')], tmp_path)
+    assert not os.path.exists(tmp_path / 'snpdb.bundle')
+
+    # Same condition class configured twice is compiled once
+    bundle = get_bundle([get_config(snp_db_file_name), get_config(snp_db_file_name)], tmp_path)
+    assert list(bundle.header["entries"]) == ['snpdb_mthfr.csv']
+    bundle.close()
+
+def test_changed_snp_db_out_of_date(snp_db_file_name, tmp_path):
+
+    bundle = get_bundle([get_config(snp_db_file_name)], tmp_path)
+
+    # Modification time changed without changing the content (same hash)
+    os.utime(snp_db_file_name, (0, 0))
+    assert SnpDbBundle(bundle.bundle_file_name).contains(snp_db_file_name, MTHFR)
+
+    with open(snp_db_file_name, 'a') as snp_db_file:
+        snp_db_file.write('MTHFR,Diagnosis,rs1801133,C677T,T,C,Reference,1,0.5,True\n')
+    assert not SnpDbBundle(bundle.bundle_file_name).contains(snp_db_file_name, MTHFR)
+    bundle.close()
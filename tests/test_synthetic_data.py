@@ -0,0 +1,22 @@
+import os
+from conftest import CODE_DIR
+from synthetic_data import write_vcf
+
+DB_FILE_PATTERN = os.path.join(CODE_DIR, '..', 'db', 'snpdb_*.csv')
+
+def test_compressed_vcf_keeps_file_of_uncompressed_name(tmp_path):
+
+    import pysam
+    with open(tmp_path / 'sample.vcf', 'w') as vcf_file:
+        vcf_file.write('kept')
+    write_vcf(str(tmp_path / 'sample.vcf.gz'), 500, 2, db_file_pattern=DB_FILE_PATTERN)
+    write_vcf(str(tmp_path / 'plain.vcf'), 500, 2, db_file_pattern=DB_FILE_PATTERN)
+
+    with open(tmp_path / 'sample.vcf', 'r') as vcf_file:
+        assert vcf_file.read() == 'kept'
+    assert sorted(file_name for file_name in os.listdir(tmp_path) if file_name.startswith('sample')) == \
+        ['sample.vcf', 'sample.vcf.gz', 'sample.vcf.gz.loci.csv', 'sample.vcf.gz.tbi']
+
+    # Compressed and indexed file has the records of the uncompressed file
+    with pysam.VariantFile(str(tmp_path / 'sample.vcf.gz')) as compressed_file, pysam.VariantFile(str(tmp_path / 'plain.vcf')) as plain_file:
+        assert [str(record) for record in compressed_file.fetch()] == [str(record) for record in plain_file]
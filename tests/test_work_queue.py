@@ -0,0 +1,103 @@
+import os
+import time
+import pytest
+from work_queue import WorkQueue, get_unit_name
+
+SNP_FILE_NAMES = [f"sample{index}.zip" for index in range(5)]
+SAMPLE_NAMES = [f"sample{index}" for index in range(5)]
+
+# Get queue of a work directory with a plan of 5 SNP files in units of 2
+def get_queue(work_dir, lease_timeout=60, settings=None):
+
+    queue = WorkQueue(str(work_dir), lease_timeout)
+    queue.plan(SNP_FILE_NAMES, SAMPLE_NAMES, 2, settings=settings)
+    return queue
+
+# Let lease expire (not renewed within the lease timeout)
+def expire_lease(queue, name):
+
+    expired_time = time.time() - 2 * queue.lease_timeout
+    os.utime(queue.get_lease_file_name(name), (expired_time, expired_time))
+
+def test_plan_created_once_and_joined(tmp_path):
+
+    queue = WorkQueue(str(tmp_path))
+    assert queue.plan(SNP_FILE_NAMES, SAMPLE_NAMES, 2, settings={'batch': 'B'}, data={'batch': 'first'})
+    other_queue = WorkQueue(str(tmp_path))
+    assert not other_queue.plan(SNP_FILE_NAMES, SAMPLE_NAMES, 3, settings={'batch': None}, data={'batch': 'second'})
+    assert [[index for index, _, _ in files] for files in other_queue.units] == [[0, 1], [2, 3], [4]]
+    assert other_queue.data == {'batch': 'first'}
+
+def test_plan_with_other_files_or_settings_rejected(tmp_path):
+
+    get_queue(tmp_path, settings={'batch': 'B'})
+    with pytest.raises(ValueError):
+        get_queue(tmp_path, settings={'batch': 'C'})
+    with pytest.raises(ValueError):
+        WorkQueue(str(tmp_path)).plan(SNP_FILE_NAMES[:4], SAMPLE_NAMES[:4], 2)
+
+def test_lease_held_by_one_worker(tmp_path):
+
+    with get_queue(tmp_path) as queue, get_queue(tmp_path) as other_queue:
+        assert queue.claim(get_unit_name(0))
+        assert not other_queue.claim(get_unit_name(0))
+        assert other_queue.claim(get_unit_name(1))
+        queue.release(get_unit_name(0))
+        assert other_queue.claim(get_unit_name(0))
+
+def test_expired_lease_reclaimed_and_lost(tmp_path):
+
+    with get_queue(tmp_path) as queue, get_queue(tmp_path) as other_queue:
+        name = get_unit_name(0)
+        assert queue.claim(name)
+        expire_lease(queue, name)
+        assert other_queue.claim(name)
+        assert other_queue.get_lease_owner(other_queue.get_lease_file_name(name)) == other_queue.owner
+
+        # Stopped worker finds its lease lost when renewing (and does not remove the lease of the other worker on release)
+        queue.renew()
+        assert not queue.is_held(name)
+        queue.release(name)
+        assert other_queue.is_held(name)
+        assert os.path.exists(other_queue.get_lease_file_name(name))
+
+def test_renewed_lease_not_reclaimed(tmp_path):
+
+    with get_queue(tmp_path) as queue, get_queue(tmp_path) as other_queue:
+        name = get_unit_name(0)
+        assert queue.claim(name)
+        queue.renew()
+        assert not other_queue.claim(name)
+        assert queue.is_held(name)
+
+def test_checkpointed_files_skipped_and_units_done(tmp_path):
+
+    queue = get_queue(tmp_path)
+    queue.save_checkpoint(0, {'summary': [0]})
+    assert queue.get_finished() == {0}
+    assert queue.get_unfinished_files(0) == [(1, SNP_FILE_NAMES[1], SAMPLE_NAMES[1])]
+
+    # Unit is done once marked (not once its SNP files are finished)
+    queue.save_checkpoint(1, {'summary': [1]})
+    assert queue.get_unfinished_units() == [0, 1, 2]
+    queue.finish_unit(0)
+    assert queue.get_unfinished_units() == [1, 2]
+    assert queue.is_done(get_unit_name(0))
+    assert not queue.is_done('finalize')
+
+def test_staged_files_replaced_and_removed_when_unit_done(tmp_path):
+
+    queue = get_queue(tmp_path)
+    for index, content in [(1, 'first'), (1, 'second'), (0, 'zero')]:
+        staging_dir = queue.get_staging_dir(index, clear=True)
+        os.makedirs(os.path.join(staging_dir, 'condition=c'), exist_ok=True)
+        with open(os.path.join(staging_dir, 'condition=c', 'part.ndjson'), 'w') as staged_file:
+            staged_file.write(content)
+
+    # Staged files of a SNP file scanned again are replaced, files of the unit are in plan order
+    staged_files = queue.get_staged_files(0)
+    assert list(staged_files) == [os.path.join('condition=c', 'part.ndjson')]
+    assert [open(file_name).read() for file_name in staged_files[os.path.join('condition=c', 'part.ndjson')]] == ['zero', 'second']
+
+    queue.finish_unit(0)
+    assert queue.get_staged_files(0) == {}